@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Microbenchmarks for the KeyManager hot paths.
+
+Measures get_key, record_request_result, release_key, get_all_keys and
+get_usage_stats on pools of 10, 1k and 10k keys, single-threaded and with
+several threads contending for the manager lock. Every call is timed
+individually, so besides throughput (ops/sec over wall time) the report shows
+the p50 and p99 latency of a single call.
+
+The manager runs against a temporary JSON file in write-behind mode with a long
+flush interval, so storage I/O stays out of the measurements.
+
+Usage:
+    python benchmarks/bench_key_manager.py
+    python benchmarks/bench_key_manager.py --sizes 10,1000 --threads 4 --duration 0.5
+    python benchmarks/bench_key_manager.py --save baseline.json
+    python benchmarks/bench_key_manager.py --compare baseline.json --tolerance 0.25
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from typing import Dict, List, Any, Callable, Optional
+
+# Keep the global KeyManager created on import away from the real key file
+_TMP_DIR = tempfile.mkdtemp(prefix="sora-api-bench-")
+os.environ["KEYS_STORAGE_FILE"] = os.path.join(_TMP_DIR, "global_keys.json")
+os.environ.setdefault("API_KEYS", "")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+logging.disable(logging.WARNING)
+
+from src.key_manager import KeyManager, PERSIST_MODE_WRITE_BEHIND, STRATEGY_P2C_EWMA
+
+OPERATIONS = ("get_key", "record_request_result", "release_key", "get_all_keys", "get_usage_stats")
+DEFAULT_SIZES = (10, 1000, 10000)
+
+def build_manager(size: int, strategy: str) -> KeyManager:
+    """Create a manager with `size` keys that never hit their rate or concurrency limits."""
+    manager = KeyManager(
+        storage_file=os.path.join(_TMP_DIR, f"keys_{size}.json"),
+        persist_mode=PERSIST_MODE_WRITE_BEHIND,
+        flush_interval=3600,
+        flush_batch_size=10 ** 9,
+        selection_strategy=strategy
+    )
+    manager.batch_import_keys([{
+        "key": f"sk-bench-{i:06d}-{random.getrandbits(64):016x}",
+        "name": f"bench-{i}",
+        "rate_limit": 10 ** 9,
+        "max_concurrent": 10 ** 6
+    } for i in range(size)])
+
+    # Give every key some history so stats and selection have data to work with
+    for key in manager.keys:
+        for _ in range(3):
+            manager.record_request_result(key["key"], random.random() > 0.1, random.uniform(0.5, 30))
+            manager.record_generation_result(key["key"], True, random.uniform(5, 60))
+    return manager
+
+def make_operation(manager: KeyManager, name: str) -> Callable[[], Callable[[], Any]]:
+    """
+    Build a per-thread factory of the timed call.
+
+    Returns:
+        A function that, called once per thread, returns the zero-argument callable to time
+    """
+    key_values = [key["key"] for key in manager.keys]
+
+    if name == "get_key":
+        return lambda: manager.get_key
+
+    if name == "record_request_result":
+        def factory():
+            rng = random.Random()
+            def op():
+                manager.record_request_result(rng.choice(key_values), rng.random() > 0.1, rng.uniform(0.5, 30))
+            return op
+        return factory
+
+    if name == "release_key":
+        def factory():
+            rng = random.Random()
+            counter = iter(range(10 ** 12))
+            pending = []
+            def op():
+                # Claiming the slot is part of setup; only the release is timed
+                return manager.release_key(*pending.pop())
+            def prepare():
+                key = rng.choice(key_values)
+                task_id = f"bench-{threading.get_ident()}-{next(counter)}"
+                manager.mark_key_as_working(key, task_id)
+                pending.append((key, task_id))
+            op.prepare = prepare
+            return op
+        return factory
+
+    if name == "get_all_keys":
+        return lambda: manager.get_all_keys
+
+    if name == "get_usage_stats":
+        return lambda: manager.get_usage_stats
+
+    raise ValueError(f"Unknown operation: {name}")
+
+def percentile(sorted_values: List[int], q: float) -> float:
+    """Nearest-rank percentile of pre-sorted values."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def run_case(manager: KeyManager, name: str, threads: int, duration: float, max_ops: int) -> Dict[str, Any]:
+    """Run one operation on `threads` threads for `duration` seconds and summarize the latencies."""
+    factory = make_operation(manager, name)
+    barrier = threading.Barrier(threads + 1)
+    samples: List[List[int]] = [[] for _ in range(threads)]
+    per_thread_ops = max(1, max_ops // threads)
+
+    def worker(index: int) -> None:
+        op = factory()
+        prepare = getattr(op, "prepare", None)
+        latencies = samples[index]
+        clock = time.perf_counter_ns
+        barrier.wait()
+        deadline = clock() + int(duration * 1e9)
+        while len(latencies) < per_thread_ops:
+            if prepare is not None:
+                prepare()
+            start = clock()
+            op()
+            end = clock()
+            latencies.append(end - start)
+            if end >= deadline:
+                break
+
+    workers = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(value for thread_samples in samples for value in thread_samples)
+    total_ops = len(latencies)
+    return {
+        "operation": name,
+        "threads": threads,
+        "ops": total_ops,
+        # With setup work (release_key) the wall clock also covers untimed calls, so use busy time
+        "ops_per_sec": total_ops / (sum(latencies) / 1e9 / threads) if name == "release_key" and latencies else total_ops / elapsed,
+        "p50_us": percentile(latencies, 50) / 1000.0,
+        "p99_us": percentile(latencies, 99) / 1000.0
+    }
+
+def run(sizes: List[int], operations: List[str], thread_counts: List[int], duration: float,
+        max_ops: int, strategy: str) -> List[Dict[str, Any]]:
+    """Run every (size, operation, threads) combination and print a result row per case."""
+    results = []
+    print(f"{'keys':>6} {'operation':<22} {'threads':>7} {'ops':>9} {'ops/sec':>12} {'p50 (us)':>10} {'p99 (us)':>10}")
+    for size in sizes:
+        manager = build_manager(size, strategy)
+        try:
+            for name in operations:
+                for threads in thread_counts:
+                    result = run_case(manager, name, threads, duration, max_ops)
+                    result["keys"] = size
+                    results.append(result)
+                    print(f"{size:>6} {name:<22} {threads:>7} {result['ops']:>9} {result['ops_per_sec']:>12,.0f} "
+                          f"{result['p50_us']:>10.1f} {result['p99_us']:>10.1f}")
+        finally:
+            manager.close()
+    return results
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, tolerance: float) -> int:
+    """
+    Compare throughput with a saved run.
+
+    Returns:
+        Number of cases whose ops/sec dropped by more than `tolerance`
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {(r["keys"], r["operation"], r["threads"]): r for r in json.load(f)["results"]}
+
+    regressions = 0
+    for result in results:
+        previous: Optional[Dict[str, Any]] = baseline.get((result["keys"], result["operation"], result["threads"]))
+        if not previous or not previous["ops_per_sec"]:
+            continue
+        change = result["ops_per_sec"] / previous["ops_per_sec"] - 1
+        if change < -tolerance:
+            regressions += 1
+            print(f"REGRESSION {result['keys']} keys / {result['operation']} / {result['threads']} threads: "
+                  f"{previous['ops_per_sec']:,.0f} -> {result['ops_per_sec']:,.0f} ops/sec ({change:+.0%})")
+    print(f"{regressions} regression(s) beyond {tolerance:.0%} compared with {baseline_path}")
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the KeyManager hot paths")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES), help="Comma-separated key pool sizes")
+    parser.add_argument("--ops", default=",".join(OPERATIONS), help="Comma-separated operations to run")
+    parser.add_argument("--threads", type=int, default=8, help="Thread count of the contended runs")
+    parser.add_argument("--duration", type=float, default=1.0, help="Seconds per case")
+    parser.add_argument("--max-ops", type=int, default=200000, help="Max calls per case")
+    parser.add_argument("--strategy", default=STRATEGY_P2C_EWMA, help="Key selection strategy")
+    parser.add_argument("--seed", type=int, default=1234, help="Random seed of the generated pools")
+    parser.add_argument("--save", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON from --save; exit 1 on throughput regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed ops/sec drop for --compare")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    operations = [op for op in args.ops.split(",") if op]
+    for op in operations:
+        if op not in OPERATIONS:
+            parser.error(f"unknown operation '{op}' (choose from {', '.join(OPERATIONS)})")
+    thread_counts = [1] if args.threads <= 1 else [1, args.threads]
+
+    results = run(sizes, operations, thread_counts, args.duration, args.max_ops, args.strategy)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({
+                "python": sys.version.split()[0],
+                "created_at": time.time(),
+                "results": results
+            }, f, indent=2)
+        print(f"Results saved to {args.save}")
+
+    if args.compare:
+        return 1 if compare(results, args.compare, args.tolerance) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,7 @@ from fastapi import APIRouter
 from .admin import router as admin_router
 from .generation import router as generation_router
 from .chat import router as chat_router
+from .batch import router as batch_router
 from .health import router as health_router
 # Add auth routes
 from .auth import router as auth_router
@@ -19,6 +20,7 @@ main_router = APIRouter()
 # Register feature routes under v1
 v1_router.include_router(generation_router)
 v1_router.include_router(chat_router)
+v1_router.include_router(batch_router)
 
 # Register all routers
 main_router.include_router(v1_router) # Keep v1 prefix for OpenAI API compatibility
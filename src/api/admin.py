@@ -3,13 +3,14 @@ import logging
 import dotenv
 from typing import Dict, Any, List
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 
 from ..models.schemas import ApiKeyCreate, ApiKeyUpdate, ConfigUpdate, LogLevelUpdate, BatchOperation, BatchImportOperation
 from ..api.dependencies import verify_admin, verify_admin_jwt
 from ..config import Config
 from ..key_manager import key_manager
 from ..sora_integration import SoraClient
+from ..poll_schedule import poll_schedule
 
 # Configure logging
 logger = logging.getLogger("sora-api.admin")
@@ -28,6 +29,14 @@ async def get_all_keys(admin_token = Depends(verify_admin_jwt)):
     """Get all API keys"""
     return key_manager.get_all_keys()
 
+@router.get("/keys/export")
+async def export_keys(admin_token = Depends(verify_admin_jwt)):
+    """Export all API keys and usage data as a JSON document (the KEYS_STORAGE_FILE format)"""
+    return JSONResponse(
+        content=key_manager.export_state(),
+        headers={"Content-Disposition": 'attachment; filename="api_keys.json"'}
+    )
+
 @router.get("/keys/{key_id}")
 async def get_key(key_id: str, admin_token = Depends(verify_admin_jwt)):
     """Get details of a single API key"""
@@ -51,12 +60,10 @@ async def create_key(key_data: ApiKeyCreate, admin_token = Depends(verify_admin_
             weight=key_data.weight,
             rate_limit=key_data.rate_limit,
             is_enabled=key_data.is_enabled,
-            notes=key_data.notes
+            notes=key_data.notes,
+            max_concurrent=key_data.max_concurrent
         )
         
-        # Persist all keys via Config
-        Config.save_api_keys(key_manager.keys)
-        
         return new_key
     except Exception as e:
         logger.error(f"Failed to create API key: {str(e)}", exc_info=True)
@@ -78,15 +85,13 @@ async def update_key(key_id: str, key_data: ApiKeyUpdate, admin_token = Depends(
             name=key_data.name,
             weight=key_data.weight,
             rate_limit=key_data.rate_limit,
+            max_concurrent=key_data.max_concurrent,
             is_enabled=key_data.is_enabled,
             notes=key_data.notes
         )
         if not updated_key:
             raise HTTPException(status_code=404, detail="API key not found")
         
-        # Persist all keys via Config
-        Config.save_api_keys(key_manager.keys)
-        
         return updated_key
     except HTTPException:
         raise
@@ -101,9 +106,6 @@ async def delete_key(key_id: str, admin_token = Depends(verify_admin_jwt)):
     if not success:
         raise HTTPException(status_code=404, detail="API key not found")
     
-    # Persist all keys via Config
-    Config.save_api_keys(key_manager.keys)
-    
     return {"status": "success", "message": "API key deleted"}
 
 @router.get("/stats")
@@ -119,18 +121,13 @@ async def get_usage_stats(admin_token = Depends(verify_admin_jwt)):
     for date, counts in stats.get("past_7_days", {}).items():
         daily_usage[date] = counts.get("successful", 0) + counts.get("failed", 0)
     
-    # Build per-key usage
-    for key in key_manager.keys:
-        key_id = key.get("id")
-        key_name = key.get("name") or f"Key_{key_id[:6]}"
+    # Build per-key usage from the per-key stats (counts and latency percentiles)
+    for key_id, key_stats in stats.get("keys", {}).items():
+        key_name = key_stats.get("name") or f"Key_{key_id[:6]}"
+        total_requests = key_stats.get("total_requests", 0)
         
-        # Get usage stats for this key
-        if key_id in key_manager.usage_stats:
-            key_stats = key_manager.usage_stats[key_id]
-            total_requests = key_stats.get("total_requests", 0)
-            
-            if total_requests > 0:
-                keys_usage[key_name] = total_requests
+        if total_requests > 0:
+            keys_usage[key_name] = total_requests
     
     # Add to return payload
     stats["daily_usage"] = daily_usage
@@ -138,6 +135,11 @@ async def get_usage_stats(admin_token = Depends(verify_admin_jwt)):
     
     return stats
 
+@router.get("/poll-schedule")
+async def get_poll_schedule(admin_token = Depends(verify_admin_jwt)):
+    """Get the learned task completion times and poll checkpoints per operation"""
+    return poll_schedule.to_dict()
+
 @router.post("/keys/test")
 async def test_key(key_data: ApiKeyCreate, admin_token = Depends(verify_admin_jwt)):
     """Test whether an API key is valid"""
@@ -226,9 +228,6 @@ async def batch_operation(operation: Dict[str, Any], admin_token = Depends(verif
                 result = key_manager.batch_import_keys(keys_data)
                 logger.info(f"Import result: imported={result['imported']}, skipped={result['skipped']}")
                 
-                # Persist all keys via Config
-                Config.save_api_keys(key_manager.keys)
-                
                 return {
                     "success": True,
                     "message": f"Imported {result['imported']} keys, skipped {result['skipped']} duplicate keys",
@@ -263,9 +262,6 @@ async def batch_operation(operation: Dict[str, Any], admin_token = Depends(verif
                 if updated:
                     success_count += 1
             
-            # Persist all keys via Config
-            Config.save_api_keys(key_manager.keys)
-            
             logger.info(f"Enabled {success_count} keys")
             return {
                 "success": True,
@@ -280,9 +276,6 @@ async def batch_operation(operation: Dict[str, Any], admin_token = Depends(verif
                 if updated:
                     success_count += 1
             
-            # Persist all keys via Config
-            Config.save_api_keys(key_manager.keys)
-            
             logger.info(f"Disabled {success_count} keys")
             return {
                 "success": True,
@@ -291,13 +284,7 @@ async def batch_operation(operation: Dict[str, Any], admin_token = Depends(verif
             }
         elif action == "delete":
             # Batch delete
-            success_count = 0
-            for key_id in key_ids:
-                if key_manager.delete_key(key_id):
-                    success_count += 1
-            
-            # Persist all keys via Config
-            Config.save_api_keys(key_manager.keys)
+            success_count = key_manager.delete_keys(key_ids)
             
             logger.info(f"Deleted {success_count} keys")
             return {
@@ -1,4 +1,5 @@
 import jwt
+import hmac
 import time
 import uuid
 import logging
@@ -29,6 +30,10 @@ class TokenResponse(BaseModel):
     expires_in: int
     token_type: str = "bearer"
 
+# Compare secrets without leaking the matching prefix length through timing
+def secure_compare(provided: str, expected: str) -> bool:
+    return hmac.compare_digest(provided.encode("utf-8"), expected.encode("utf-8"))
+
 # Create JWT token
 def create_jwt_token(data: Dict[str, Any], expires_delta: int = JWT_EXPIRATION) -> str:
     payload = data.copy()
@@ -60,7 +65,7 @@ def verify_jwt_token(token: str) -> Dict[str, Any]:
 async def login(request: LoginRequest):
     """Admin login, returns a JWT token"""
     # Validate admin key
-    if request.admin_key != Config.ADMIN_KEY:
+    if not secure_compare(request.admin_key, Config.ADMIN_KEY):
         logger.warning("Attempt to log in with an invalid admin key")
         # Fixed delay to mitigate timing attacks
         time.sleep(1)
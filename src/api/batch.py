@@ -0,0 +1,114 @@
+import json
+import logging
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Header
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import ValidationError
+
+from ..models.schemas import BatchRequest, BatchItemRequest
+from ..api.dependencies import verify_api_key, get_sora_client
+from ..services.batch_service import batch_service, Batch, BatchItem
+from ..services.result_cache import cache_allowed
+
+# Configure logging
+logger = logging.getLogger("sora-api.batch")
+
+# Create router
+router = APIRouter()
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def _parse_ndjson(body: bytes) -> BatchRequest:
+    """Parse an NDJSON upload: one prompt string or item object per line."""
+    items = []
+    for line_number, line in enumerate(body.decode("utf-8").splitlines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            value = json.loads(line)
+            items.append(BatchItemRequest(prompt=value) if isinstance(value, str) else BatchItemRequest(**value))
+        except (ValueError, TypeError, ValidationError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid batch item on line {line_number}: {str(e)}")
+    return BatchRequest(items=items)
+
+def _build_items(batch_request: BatchRequest) -> List[BatchItem]:
+    """Expand a batch request into items, applying the batch-level defaults to plain prompts."""
+    items = [
+        BatchItem(index, prompt, batch_request.n, batch_request.width, batch_request.height)
+        for index, prompt in enumerate(batch_request.prompts or [])
+    ]
+    for item in batch_request.items or []:
+        items.append(BatchItem(
+            len(items), item.prompt,
+            item.n or batch_request.n,
+            item.width or batch_request.width,
+            item.height or batch_request.height,
+            custom_id=item.custom_id
+        ))
+    return items
+
+def _ndjson_stream(batch: Batch):
+    async def stream():
+        yield json.dumps(batch.summary()) + "\n"
+        async for record in batch.stream_results():
+            yield json.dumps(record) + "\n"
+    return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE)
+
+def _get_batch(batch_id: str) -> Batch:
+    batch = batch_service.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail=f"Batch not found: {batch_id}")
+    return batch
+
+@router.post("/batches")
+async def create_batch(
+    request: Request,
+    stream: bool = False,
+    api_key: str = Depends(verify_api_key),
+    cache_control: Optional[str] = Header(None)
+):
+    """
+    Submit many text-to-image prompts at once.
+
+    The body is either JSON ({"prompts": [...]} and/or {"items": [{"prompt": ..., "n": ...}]},
+    with batch-wide n, width, height, concurrency and cache) or an NDJSON upload
+    (Content-Type: application/x-ndjson) with one prompt string or item object per line.
+
+    Returns the batch ID and per-item status right away. With ?stream=true the response
+    instead streams NDJSON: the batch summary, then each item as it finishes, then the
+    final summary.
+    """
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        batch_request = _parse_ndjson(body)
+    else:
+        try:
+            batch_request = BatchRequest(**json.loads(body or b"{}"))
+        except (ValueError, TypeError, ValidationError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid batch request: {str(e)}")
+
+    try:
+        batch = batch_service.submit(
+            _build_items(batch_request),
+            get_sora_client,
+            concurrency=batch_request.concurrency,
+            use_cache=cache_allowed(batch_request.cache, cache_control)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if stream:
+        return _ndjson_stream(batch)
+    return JSONResponse(status_code=202, content=batch.to_dict())
+
+@router.get("/batches/{batch_id}")
+async def get_batch(batch_id: str, api_key: str = Depends(verify_api_key)):
+    """Get the status of a batch and of each of its items."""
+    return JSONResponse(content=_get_batch(batch_id).to_dict())
+
+@router.get("/batches/{batch_id}/results")
+async def stream_batch_results(batch_id: str, api_key: str = Depends(verify_api_key)):
+    """Stream a batch's items as NDJSON as they finish (finished items first), ending with the batch summary."""
+    return _ndjson_stream(_get_batch(batch_id))
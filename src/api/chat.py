@@ -3,13 +3,16 @@ import time
 import re
 import logging
 from typing import Dict, Any, List, Optional
-from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException
+from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException, Header
 from fastapi.responses import StreamingResponse, JSONResponse
 
 from ..models.schemas import ChatCompletionRequest
-from ..api.dependencies import verify_api_key, get_sora_client_dep
+from ..config import Config
+from ..api.dependencies import verify_api_key, get_sora_client, acquire_sora_auth_token, acquire_sora_client
 from ..services.image_service import process_image_task, format_think_block
 from ..services.streaming import generate_streaming_response, generate_streaming_remix_response
+from ..services.single_flight import generation_flight, generation_key
+from ..services.result_cache import cache_allowed, result_cache_key, get_cached_result
 from ..key_manager import key_manager
 
 # Configure logging
@@ -22,15 +25,17 @@ router = APIRouter()
 async def chat_completions(
     request: ChatCompletionRequest,
     background_tasks: BackgroundTasks,
-    client_info = Depends(get_sora_client_dep()),
-    api_key: str = Depends(verify_api_key)
+    api_key: str = Depends(verify_api_key),
+    cache_control: Optional[str] = Header(None)
 ):
     """
     Chat completions endpoint - handles text-to-image and image-to-image requests.
     Compatible with OpenAI API format.
+    Repeated requests may be answered from the result cache unless the request sets
+    "cache": false or sends Cache-Control: no-cache.
     """
-    # Parse client info
-    sora_client, sora_auth_token = client_info
+    sora_client = None
+    sora_auth_token = None
     
     # Record start time
     start_time = time.time()
@@ -78,24 +83,46 @@ async def chat_completions(
             
             prompt = " ".join(text_parts)
         
+        use_cache = cache_allowed(request.cache, cache_control)
+        
+        # A repeated request is answered from the result cache without taking a key
+        cached_urls = None
+        if use_cache:
+            if image_data:
+                cached_urls = get_cached_result(result_cache_key("remix", prompt, request.n, image_data=image_data))
+            else:
+                cached_urls = get_cached_result(result_cache_key("generation", prompt, request.n, 720, 480))
+        
+        # An identical generation in flight is joined without taking a key; otherwise acquire one
+        # now, so that a request no key can serve gets a 429 rather than a failed task
+        joining = (not image_data and Config.SINGLE_FLIGHT_ENABLED
+                   and generation_flight.in_flight(generation_key(prompt, request.n, 720, 480)))
+        if cached_urls is None and not joining:
+            sora_auth_token = await acquire_sora_auth_token()
+            sora_client = get_sora_client(sora_auth_token)
+        
         # Streaming vs non-streaming response
         if request.stream:
             # Streaming response handling
             if image_data:
                 response = StreamingResponse(
-                    generate_streaming_remix_response(sora_client, prompt, image_data, request.n),
+                    generate_streaming_remix_response(sora_client, prompt, image_data, request.n, use_cache, cached_urls=cached_urls),
                     media_type="text/event-stream"
                 )
             else:
                 response = StreamingResponse(
-                    generate_streaming_response(sora_client, prompt, request.n),
+                    generate_streaming_response(
+                        sora_client, prompt, request.n, use_cache,
+                        cached_urls=cached_urls, acquire_client=acquire_sora_client
+                    ),
                     media_type="text/event-stream"
                 )
             success = True
             
             # Record request result
             response_time = time.time() - start_time
-            key_manager.record_request_result(sora_auth_token, success, response_time)
+            if sora_auth_token:
+                key_manager.record_request_result(sora_auth_token, success, response_time)
             
             return response
         else:
@@ -110,6 +137,8 @@ async def chat_completions(
                     sora_client,
                     "remix",
                     prompt,
+                    use_cache=use_cache,
+                    cached_urls=cached_urls,
                     image_data=image_data,
                     num_images=request.n
                 )
@@ -120,6 +149,9 @@ async def chat_completions(
                     sora_client,
                     "generation",
                     prompt,
+                    use_cache=use_cache,
+                    cached_urls=cached_urls,
+                    acquire_client=acquire_sora_client,
                     num_images=request.n,
                     width=720,
                     height=480
@@ -153,16 +185,20 @@ async def chat_completions(
             
             # Record request result
             response_time = time.time() - start_time
-            key_manager.record_request_result(sora_auth_token, success, response_time)
+            if sora_auth_token:
+                key_manager.record_request_result(sora_auth_token, success, response_time)
             
             return JSONResponse(content=response)
             
+    except HTTPException:
+        raise
     except Exception as e:
         success = False
         logger.error(f"Failed to process chat completion request: {str(e)}", exc_info=True)
         
         # Record request result
         response_time = time.time() - start_time
-        key_manager.record_request_result(sora_auth_token, success, response_time)
+        if sora_auth_token:
+            key_manager.record_request_result(sora_auth_token, success, response_time)
         
         raise HTTPException(status_code=500, detail=f"Image generation failed: {str(e)}")
\ No newline at end of file
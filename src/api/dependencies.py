@@ -1,9 +1,10 @@
+import math
 from typing import Optional, Tuple, Dict, Any
 from fastapi import Request, HTTPException, Depends, Header
 import aiohttp
 import logging
 from ..config import Config
-from .auth import verify_jwt_token
+from .auth import verify_jwt_token, secure_compare
 
 logger = logging.getLogger("sora-api.dependencies")
 
@@ -12,27 +13,28 @@ session_pool: Optional[aiohttp.ClientSession] = None
 
 # Get Sora client
 def get_sora_client(auth_token: str):
+    """
+    Create the Sora client of one request.
+    
+    A client switches keys when it retries and tracks the key its task runs on, so it
+    is never shared between requests (concurrent tasks on one key would otherwise all
+    move to the key one of them switched to). The Cloudflare session and transport
+    underneath are shared per proxy, so a client is cheap to create.
+    """
     from ..sora_integration import SoraClient
     
-    # Cache client instances in a dict
-    if not hasattr(get_sora_client, "clients"):
-        get_sora_client.clients = {}
-        
-    if auth_token not in get_sora_client.clients:
-        proxy_host = Config.PROXY_HOST if Config.PROXY_HOST and Config.PROXY_HOST.strip() else None
-        proxy_port = Config.PROXY_PORT if Config.PROXY_PORT and Config.PROXY_PORT.strip() else None
-        proxy_user = Config.PROXY_USER if Config.PROXY_USER and Config.PROXY_USER.strip() else None
-        proxy_pass = Config.PROXY_PASS if Config.PROXY_PASS and Config.PROXY_PASS.strip() else None
-        
-        get_sora_client.clients[auth_token] = SoraClient(
-            proxy_host=proxy_host, 
-            proxy_port=proxy_port,
-            proxy_user=proxy_user,
-            proxy_pass=proxy_pass,
-            auth_token=auth_token
-        )
-    
-    return get_sora_client.clients[auth_token]
+    proxy_host = Config.PROXY_HOST if Config.PROXY_HOST and Config.PROXY_HOST.strip() else None
+    proxy_port = Config.PROXY_PORT if Config.PROXY_PORT and Config.PROXY_PORT.strip() else None
+    proxy_user = Config.PROXY_USER if Config.PROXY_USER and Config.PROXY_USER.strip() else None
+    proxy_pass = Config.PROXY_PASS if Config.PROXY_PASS and Config.PROXY_PASS.strip() else None
+    
+    return SoraClient(
+        proxy_host=proxy_host, 
+        proxy_port=proxy_port,
+        proxy_user=proxy_user,
+        proxy_pass=proxy_pass,
+        auth_token=auth_token
+    )
 
 # Extract and validate auth token from request header
 async def get_token_from_header(authorization: Optional[str] = Header(None)) -> str:
@@ -57,42 +59,40 @@ async def verify_api_key(request: Request):
     # Validate API auth token
     if Config.API_AUTH_TOKEN:
         # If API_AUTH_TOKEN env var is set, validate against it
-        if api_key != Config.API_AUTH_TOKEN:
+        if not secure_compare(api_key, Config.API_AUTH_TOKEN):
             logger.warning("API authentication failed: provided token does not match")
             raise HTTPException(status_code=401, detail="API authentication failed: invalid token")
     else:
         # If API_AUTH_TOKEN not set, validate against enabled admin panel keys
         from ..key_manager import key_manager
-        valid_keys = [k.get("key") for k in key_manager.get_all_keys() if k.get("is_enabled", False)]
-        if api_key not in valid_keys and api_key != Config.ADMIN_KEY:
+        if not key_manager.is_valid_inbound_key(api_key) and not secure_compare(api_key, Config.ADMIN_KEY):
             logger.warning("API authentication failed: key not in the valid list")
             raise HTTPException(status_code=401, detail="API authentication failed: invalid key")
     
     return api_key
 
-# Dependency to get Sora client
-def get_sora_client_dep(specific_key=None):
-    """Return a dependency function to obtain a Sora client.
+async def acquire_sora_auth_token() -> str:
+    """
+    Obtain an available API key from the key manager, queueing briefly if all are busy.
     
-    Args:
-        specific_key: If provided, use this specific API key instead of selecting automatically.
+    Endpoints that may answer without contacting Sora (result cache, joining an identical
+    request in flight) call this only once they know a key is needed.
+    
+    Raises:
+        HTTPException: 429 with Retry-After if no key became available in time
     """
-    async def _get_client(auth_token: str = Depends(verify_api_key)):
-        from ..key_manager import key_manager
-        
-        # Use the specific key if provided
-        if specific_key:
-            sora_auth_token = specific_key
-        else:
-            # Use key manager to obtain an available API key
-            sora_auth_token = key_manager.get_key()
-            if not sora_auth_token:
-                raise HTTPException(status_code=429, detail="All API keys have reached the rate limit")
-            
-        # Get Sora client
-        return get_sora_client(sora_auth_token), sora_auth_token
-    
-    return _get_client
+    from ..key_manager import key_manager
+    
+    sora_auth_token = await key_manager.acquire_key(timeout=Config.KEY_WAIT_MAX_SECONDS)
+    if not sora_auth_token:
+        retry_after = key_manager.get_retry_after()
+        headers = {"Retry-After": str(max(1, math.ceil(retry_after)))} if retry_after is not None else None
+        raise HTTPException(status_code=429, detail="All API keys have reached the rate limit", headers=headers)
+    return sora_auth_token
+
+async def acquire_sora_client():
+    """Get a Sora client for a newly acquired API key (see acquire_sora_auth_token)."""
+    return get_sora_client(await acquire_sora_auth_token())
 
 # Verify JWT token and admin privileges
 async def verify_admin_jwt(token: str = Depends(get_token_from_header)) -> Dict[str, Any]:
@@ -125,7 +125,7 @@ async def verify_admin(request: Request):
         pass
     
     # Legacy validation (directly compare with admin key)
-    if token != Config.ADMIN_KEY:
+    if not secure_compare(token, Config.ADMIN_KEY):
         raise HTTPException(status_code=403, detail="Admin privileges required")
     
     return token
\ No newline at end of file
@@ -4,7 +4,7 @@ from typing import Dict, Any
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import JSONResponse
 
-from ..api.dependencies import verify_api_key, get_sora_client_dep
+from ..api.dependencies import verify_api_key
 from ..services.image_service import get_generation_result, get_task_api_key
 from ..key_manager import key_manager
 
@@ -17,31 +17,23 @@ router = APIRouter()
 @router.get("/generation/{request_id}")
 async def check_generation_status(
     request_id: str,
-    client_info = Depends(get_sora_client_dep()),
     api_key: str = Depends(verify_api_key)
 ):
     """
     Check the status of an image generation task.
     
+    Only reads the stored task result, so no Sora key is acquired; the check is
+    recorded against the key the task itself used, if any.
+    
     Args:
         request_id: The request ID to query.
-        client_info: Sora client info (provided by dependency).
         api_key: API key (provided by dependency).
     
     Returns:
         A JSON response containing task status and result.
     """
     # Get the original API key used for this task
-    task_api_key = get_task_api_key(request_id)
-    
-    # If found, use that key to get the client
-    if task_api_key:
-        # Get a client using the specific API key
-        specific_client_dep = get_sora_client_dep(specific_key=task_api_key)
-        client_info = await specific_client_dep(api_key)
-    
-    # Parse client info
-    _, sora_auth_token = client_info
+    sora_auth_token = get_task_api_key(request_id)
     
     # Record start time
     start_time = time.time()
@@ -139,7 +131,8 @@ async def check_generation_status(
             
         # Record request result
         response_time = time.time() - start_time
-        key_manager.record_request_result(sora_auth_token, success, response_time)
+        if sora_auth_token:
+            key_manager.record_request_result(sora_auth_token, success, response_time)
         
         # Return response
         return JSONResponse(content=response)
@@ -154,6 +147,7 @@ async def check_generation_status(
         
         # Record request result
         response_time = time.time() - start_time
-        key_manager.record_request_result(sora_auth_token, success, response_time)
+        if sora_auth_token:
+            key_manager.record_request_result(sora_auth_token, success, response_time)
         
         raise HTTPException(status_code=500, detail=f"Failed to check task status: {str(e)}")
\ No newline at end of file
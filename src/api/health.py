@@ -41,11 +41,13 @@ async def extended_health_check():
         "disk_usage": psutil.disk_usage('/').percent
     }
     
-    # Get service information
+    # Get service information from the published key snapshot (no lock, no copy)
+    keys_snapshot = key_manager.snapshot()
     service_info = {
         "uptime": time.time() - psutil.Process(os.getpid()).create_time(),
-        "active_keys": sum(1 for k in key_manager.keys if k.get("is_enabled", False)),
-        "total_keys": len(key_manager.keys),
+        "active_keys": keys_snapshot.active_keys,
+        "available_keys": keys_snapshot.available_keys,
+        "total_keys": keys_snapshot.total_keys,
     }
     
     return {
@@ -9,8 +9,10 @@ from fastapi.exceptions import RequestValidationError
 
 from .config import Config
 from .key_manager import key_manager
+from .key_prober import key_prober
+from .cf_session_pool import cf_session_pool
 from .api import main_router
-from .api.dependencies import session_pool 
+from .api.dependencies import session_pool
 
 # Configure logging
 logging.basicConfig(
@@ -104,6 +106,13 @@ async def startup_event():
     
     # Print configuration information
     Config.print_config()
+    
+    # Periodically re-test temporarily disabled keys
+    if Config.KEY_PROBE_ENABLED:
+        key_prober.start()
+    
+    # Refresh Cloudflare clearance before it expires
+    cf_session_pool.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
@@ -112,6 +121,14 @@ async def shutdown_event():
     if session_pool:
         await session_pool.close()
     logger.info("Application shut down, cleaned up global session pool")
+    
+    await key_prober.stop()
+    
+    # Persist Cloudflare clearance for the next start and close the upstream sessions
+    await cf_session_pool.close()
+    
+    # Flush pending key state to disk
+    key_manager.close()
 
 # Add root path route
 @app.get("/")
@@ -0,0 +1,87 @@
+import time
+import threading
+import collections
+from typing import Any, Callable, Dict, Hashable, Optional
+
+class TTLCache:
+    """
+    Thread-safe in-memory cache with a per-entry time to live and LRU eviction.
+
+    Entries expire `ttl` seconds after they were stored. Once `max_entries` is
+    reached, storing a new entry evicts the least recently used one.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600.0):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Max number of entries kept
+            ttl: Seconds an entry stays valid after it was stored
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self._entries: "collections.OrderedDict[Hashable, tuple]" = collections.OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, now: Optional[float] = None) -> Optional[Any]:
+        """Cached value of a key, None if absent or expired."""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, now: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entry if the cache is full."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._entries[key] = (now + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        """Remove a key and return its value, None if it was not cached."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return entry[1] if entry is not None else None
+
+    def remove_if(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """
+        Remove every entry for which predicate(key, value) is true.
+
+        Returns:
+            Number of entries removed
+        """
+        with self._lock:
+            matching = [key for key, (_, value) in self._entries.items() if predicate(key, value)]
+            for key in matching:
+                del self._entries[key]
+            return len(matching)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Size and hit counters, for the admin API."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses
+            }
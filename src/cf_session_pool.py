@@ -0,0 +1,277 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Any, Optional
+
+import cloudscraper
+
+from .config import Config
+from .sora_transport import SoraTransport, is_cloudflare_cookie
+
+# Initialize logger
+logger = logging.getLogger("sora-api.cf_session_pool")
+
+# Page requested to obtain fresh clearance cookies
+CF_WARMUP_URL = "https://sora.chatgpt.com/"
+# Browser profile the scrapers emulate
+SCRAPER_BROWSER = {
+    'browser': 'chrome',
+    'platform': 'windows',
+    'mobile': False
+}
+
+def _proxy_key(proxies: Optional[Dict[str, str]]) -> str:
+    """Pool key of an egress proxy; hashed so proxy credentials never reach the state file."""
+    proxy_url = proxies.get("https") if proxies else None
+    if not proxy_url:
+        return "direct"
+    return hashlib.sha256(proxy_url.encode()).hexdigest()[:16]
+
+class CloudflareSession:
+    """Cloudflare clearance of one egress proxy: a cloudscraper session and the async transport built on it."""
+
+    def __init__(self, key: str, proxies: Optional[Dict[str, str]]):
+        self.key = key
+        self.proxies = proxies
+        self.scraper = cloudscraper.create_scraper(browser=SCRAPER_BROWSER)
+        self.transport = SoraTransport(self.scraper, proxies)
+        self.refreshed_at: Optional[float] = None
+        self._saved_state: Optional[Dict[str, Any]] = None  # State as last written to disk
+
+    def clearance_expires(self) -> Optional[float]:
+        """Expiry timestamp of the cf_clearance cookie, None if there is none or it has no expiry."""
+        expires = [cookie.expires for cookie in self.scraper.cookies
+                   if cookie.name == "cf_clearance" and cookie.expires]
+        return min(expires) if expires else None
+
+    def export_state(self) -> Dict[str, Any]:
+        """User-Agent and Cloudflare cookies, in the form persisted to disk."""
+        cookies = [
+            {
+                "name": cookie.name,
+                "value": cookie.value,
+                "domain": cookie.domain,
+                "path": cookie.path,
+                "expires": cookie.expires,
+                "secure": cookie.secure
+            }
+            for cookie in self.scraper.cookies if is_cloudflare_cookie(cookie.name)
+        ]
+        cookies.sort(key=lambda c: (c["domain"], c["name"]))
+        return {"user_agent": self.scraper.headers.get("User-Agent"), "cookies": cookies}
+
+    def import_state(self, state: Dict[str, Any], now: Optional[float] = None) -> int:
+        """
+        Load persisted clearance into the scraper, skipping expired cookies.
+
+        Returns:
+            Number of cookies loaded
+        """
+        now = time.time() if now is None else now
+        loaded = 0
+        for cookie in state.get("cookies", []):
+            if cookie.get("expires") and cookie["expires"] <= now:
+                continue
+            self.scraper.cookies.set(
+                cookie["name"], cookie["value"],
+                domain=cookie.get("domain", ""), path=cookie.get("path", "/"),
+                expires=cookie.get("expires"), secure=cookie.get("secure", False)
+            )
+            loaded += 1
+        # The clearance cookie is only honoured together with the User-Agent that obtained it
+        if loaded and state.get("user_agent"):
+            self.scraper.headers["User-Agent"] = state["user_agent"]
+        return loaded
+
+    def adopt(self, scraper) -> None:
+        """Take over the clearance obtained by another scraper (used by refresh)."""
+        user_agent = scraper.headers.get("User-Agent")
+        if user_agent:
+            self.scraper.headers["User-Agent"] = user_agent
+        for cookie in scraper.cookies:
+            if is_cloudflare_cookie(cookie.name):
+                self.scraper.cookies.set_cookie(cookie)
+
+class CloudflareSessionPool:
+    """
+    Cloudflare sessions shared by all keys, one per egress proxy.
+
+    Clearance is tied to the client IP and User-Agent, not to the Sora key, so
+    every generator going out through the same proxy shares one cloudscraper
+    session and one transport (and with it the aiohttp connection pool); the
+    transport keeps each key's other cookies in a jar of its own. The
+    Cloudflare cookies are written to `state_file` so a restart picks up where
+    the previous process left off instead of solving a challenge on its first
+    request. A background loop checks every `check_interval` seconds and
+    re-solves the challenge with a fresh scraper when cf_clearance expires
+    within `refresh_margin` seconds, then swaps the new cookies in.
+    """
+
+    def __init__(self, state_file: Optional[str] = None, refresh_margin: float = 300.0,
+                 check_interval: float = 60.0):
+        """
+        Initialize the pool.
+
+        Args:
+            state_file: JSON file the clearance state is persisted to; None disables persistence
+            refresh_margin: Seconds before cf_clearance expiry at which it is refreshed
+            check_interval: Seconds between expiry checks (and state saves) of the refresh loop
+        """
+        self.state_file = state_file
+        self.refresh_margin = refresh_margin
+        self.check_interval = max(1.0, check_interval)
+        self._sessions: Dict[str, CloudflareSession] = {}
+        self._persisted: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def get(self, proxies: Optional[Dict[str, str]] = None) -> CloudflareSession:
+        """
+        Get the shared session of an egress proxy, creating it on first use.
+
+        Args:
+            proxies: requests-style proxy mapping, None for direct connections
+
+        Returns:
+            The proxy's session
+        """
+        key = _proxy_key(proxies)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = CloudflareSession(key, proxies)
+                state = self._load_state().get(key)
+                if state:
+                    loaded = session.import_state(state)
+                    session._saved_state = state
+                    if loaded:
+                        logger.info(f"Restored {loaded} Cloudflare cookies for proxy {key}")
+                self._sessions[key] = session
+            return session
+
+    def _load_state(self) -> Dict[str, Any]:
+        """Persisted state per proxy key, read once."""
+        if self._persisted is None:
+            self._persisted = {}
+            if self.state_file and os.path.exists(self.state_file):
+                try:
+                    with open(self.state_file, "r", encoding="utf-8") as f:
+                        self._persisted = json.load(f)
+                except Exception as e:
+                    logger.warning(f"Failed to load Cloudflare session state: {str(e)}")
+        return self._persisted
+
+    def save(self, force: bool = False) -> bool:
+        """
+        Write the clearance state of all sessions to disk if it changed.
+
+        Returns:
+            True if the file was written
+        """
+        if not self.state_file:
+            return False
+        with self._lock:
+            changed = False
+            states = dict(self._load_state())
+            for key, session in self._sessions.items():
+                state = session.export_state()
+                if state != session._saved_state:
+                    states[key] = state
+                    changed = True
+            if not changed and not force:
+                return False
+            try:
+                temp_file = f"{self.state_file}.tmp"
+                with open(temp_file, "w", encoding="utf-8") as f:
+                    json.dump(states, f, indent=2)
+                os.replace(temp_file, self.state_file)
+            except Exception as e:
+                logger.warning(f"Failed to save Cloudflare session state: {str(e)}")
+                return False
+            for key, session in self._sessions.items():
+                session._saved_state = states[key]
+            self._persisted = states
+            return True
+
+    def sessions_to_refresh(self, now: Optional[float] = None) -> List[CloudflareSession]:
+        """Sessions whose clearance expires within the refresh margin."""
+        now = time.time() if now is None else now
+        with self._lock:
+            sessions = list(self._sessions.values())
+        due = []
+        for session in sessions:
+            expires = session.clearance_expires()
+            if expires is not None and expires - now <= self.refresh_margin:
+                due.append(session)
+        return due
+
+    async def refresh(self, session: CloudflareSession) -> bool:
+        """
+        Obtain new clearance for a session with a fresh scraper and swap it in.
+
+        The session keeps serving requests with its current cookies meanwhile, and
+        keeps them if the refresh fails.
+
+        Returns:
+            True if new clearance was obtained
+        """
+        def solve():
+            scraper = cloudscraper.create_scraper(browser=SCRAPER_BROWSER)
+            response = scraper.get(CF_WARMUP_URL, proxies=session.proxies, timeout=30)
+            return scraper, response.status_code
+
+        loop = asyncio.get_running_loop()
+        try:
+            scraper, status_code = await loop.run_in_executor(None, solve)
+        except Exception as e:
+            logger.warning(f"Cloudflare clearance refresh for proxy {session.key} failed: {str(e)}")
+            return False
+        if not any(cookie.name == "cf_clearance" for cookie in scraper.cookies):
+            logger.warning(f"Cloudflare clearance refresh for proxy {session.key} got no cf_clearance (status {status_code})")
+            return False
+        session.adopt(scraper)
+        session.refreshed_at = time.time()
+        logger.info(f"Refreshed Cloudflare clearance for proxy {session.key}")
+        return True
+
+    def start(self) -> None:
+        """Start the refresh loop on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(f"Cloudflare session refresh started (margin={self.refresh_margin}s, interval={self.check_interval}s)")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                for session in self.sessions_to_refresh():
+                    await self.refresh(session)
+                self.save()
+            except Exception as e:
+                logger.error(f"Cloudflare session refresh failed: {str(e)}", exc_info=True)
+
+    async def close(self) -> None:
+        """Stop the refresh loop, persist the clearance state and close the transports."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.save()
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            await session.transport.close()
+
+# Global pool shared by all generators
+cf_session_pool = CloudflareSessionPool(
+    state_file=Config.CF_SESSION_STATE_FILE if Config.CF_SESSION_PERSIST else None,
+    refresh_margin=Config.CF_REFRESH_MARGIN,
+    check_interval=Config.CF_REFRESH_CHECK_INTERVAL
+)
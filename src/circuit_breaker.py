@@ -0,0 +1,145 @@
+import time
+import collections
+from typing import Dict, Any, Optional
+
+# Circuit states
+STATE_CLOSED = "closed"  # Normal operation, outcomes are counted
+STATE_OPEN = "open"  # Key is out of the pool until its cooldown ends
+STATE_HALF_OPEN = "half_open"  # Cooldown over, one trial request decides whether to close or reopen
+
+# Doublings after which the cooldown stops growing; 2 ** 64 times any base exceeds any max_cooldown,
+# and a larger exponent would overflow the float multiplication
+MAX_COOLDOWN_DOUBLINGS = 64
+
+class CircuitBreaker:
+    """
+    Per-key circuit breaker driven by the recent failure rate.
+
+    While closed, request outcomes of the last `window` seconds are kept; once at
+    least `min_requests` of them are in the window and the share of failures reaches
+    `failure_ratio`, the circuit opens. Definite failures (e.g. rejected credentials)
+    open it immediately via trip().
+
+    Each consecutive opening doubles the cooldown, starting at `base_cooldown` and
+    capped at `max_cooldown`, so a transient blip costs a short pause while a broken
+    key stays out for longer and longer. After the cooldown the circuit is half-open
+    and lets exactly one trial request through: success closes it and resets the
+    cooldown, failure reopens it with the next cooldown step.
+    """
+
+    __slots__ = ("failure_ratio", "min_requests", "window", "base_cooldown", "max_cooldown",
+                 "trial_timeout", "state", "outcomes", "trips", "open_until", "trial_started_at")
+
+    def __init__(self, failure_ratio: float = 0.5, min_requests: int = 5, window: float = 300.0,
+                 base_cooldown: float = 60.0, max_cooldown: float = 21600.0, trial_timeout: float = 600.0):
+        """
+        Initialize the breaker.
+
+        Args:
+            failure_ratio: Share of failed requests in the window that opens the circuit
+            min_requests: Requests needed in the window before the failure ratio is evaluated
+            window: Seconds of outcomes considered while closed
+            base_cooldown: Seconds the circuit stays open after the first trip
+            max_cooldown: Upper bound of the exponentially growing cooldown
+            trial_timeout: Seconds after which an unreported trial request no longer blocks a new one
+        """
+        self.failure_ratio = failure_ratio
+        self.min_requests = max(1, int(min_requests))
+        self.window = window
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max(base_cooldown, max_cooldown)
+        self.trial_timeout = trial_timeout
+        self.state = STATE_CLOSED
+        self.outcomes = collections.deque()  # (timestamp, success) of requests while closed
+        self.trips = 0  # Consecutive openings without a successful trial in between
+        self.open_until: Optional[float] = None
+        self.trial_started_at: Optional[float] = None
+
+    def allows_request(self, now: Optional[float] = None) -> bool:
+        """Whether a new request may be sent to the key."""
+        if self.state == STATE_CLOSED:
+            return True
+        if self.state == STATE_OPEN:
+            return False
+        now = time.time() if now is None else now
+        return self.trial_started_at is None or now - self.trial_started_at >= self.trial_timeout
+
+    def on_dispatch(self, now: Optional[float] = None) -> None:
+        """Note that a request was handed to the key (starts the trial when half-open)."""
+        if self.state == STATE_HALF_OPEN:
+            self.trial_started_at = time.time() if now is None else now
+
+    def record(self, success: bool, now: Optional[float] = None) -> bool:
+        """
+        Record a request outcome.
+
+        Returns:
+            True if the circuit has just opened and the key must leave the pool
+        """
+        now = time.time() if now is None else now
+        if self.state == STATE_HALF_OPEN:
+            if success:
+                self.reset()
+                return False
+            self.trip(now)
+            return True
+
+        if self.state == STATE_OPEN:
+            # Late result of a request sent before the circuit opened
+            return False
+
+        self.outcomes.append((now, success))
+        while self.outcomes and self.outcomes[0][0] < now - self.window:
+            self.outcomes.popleft()
+        if success or len(self.outcomes) < self.min_requests:
+            return False
+        failures = sum(1 for _, ok in self.outcomes if not ok)
+        if failures / len(self.outcomes) >= self.failure_ratio:
+            self.trip(now)
+            return True
+        return False
+
+    def cooldown(self) -> float:
+        """Cooldown of the current (or next) opening, in seconds."""
+        doublings = min(max(0, self.trips - 1), MAX_COOLDOWN_DOUBLINGS)
+        return min(self.max_cooldown, self.base_cooldown * (2 ** doublings))
+
+    def trip(self, now: Optional[float] = None) -> float:
+        """
+        Open the circuit.
+
+        Returns:
+            Timestamp at which the cooldown ends
+        """
+        now = time.time() if now is None else now
+        if self.state == STATE_OPEN and self.open_until and self.open_until > now:
+            # Already open: failures reported by other in-flight requests do not escalate the cooldown
+            return self.open_until
+        self.trips += 1
+        self.state = STATE_OPEN
+        self.open_until = now + self.cooldown()
+        self.outcomes.clear()
+        self.trial_started_at = None
+        return self.open_until
+
+    def half_open(self) -> None:
+        """End the cooldown and wait for a trial request."""
+        self.state = STATE_HALF_OPEN
+        self.open_until = None
+        self.trial_started_at = None
+
+    def reset(self) -> None:
+        """Close the circuit and forget past trips."""
+        self.state = STATE_CLOSED
+        self.outcomes.clear()
+        self.trips = 0
+        self.open_until = None
+        self.trial_started_at = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Summary used by the admin API."""
+        return {
+            "circuit_state": self.state,
+            "circuit_trips": self.trips,
+            "circuit_open_until": self.open_until
+        }
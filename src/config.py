@@ -48,6 +48,85 @@ class Config:
     # API authentication token
     API_AUTH_TOKEN = os.getenv("API_AUTH_TOKEN", "")
     
+    # Key pool rate limiting
+    # When every key is rate-limited or busy, requests queue for up to this many seconds before returning 429
+    KEY_WAIT_MAX_SECONDS = float(os.getenv("KEY_WAIT_MAX_SECONDS", "10"))
+    KEY_RATE_BURST_SECONDS = float(os.getenv("KEY_RATE_BURST_SECONDS", "10"))  # Token bucket burst, in seconds of max_rpm
+    
+    # Key storage and persistence
+    KEYS_STORAGE_BACKEND = os.getenv("KEYS_STORAGE_BACKEND", "json").lower()  # "json" or "sqlite"
+    KEYS_SQLITE_FILE = os.getenv("KEYS_SQLITE_FILE", "api_keys.db")  # Relative to the key file's directory
+    KEYS_PERSIST_MODE = os.getenv("KEYS_PERSIST_MODE", "sync").lower()  # "sync" or "write_behind"
+    KEYS_FLUSH_INTERVAL = float(os.getenv("KEYS_FLUSH_INTERVAL", "2.0"))  # Seconds between background flushes (write_behind)
+    KEYS_FLUSH_BATCH_SIZE = int(os.getenv("KEYS_FLUSH_BATCH_SIZE", "100"))  # Pending changes that trigger an early flush
+    KEY_SNAPSHOT_MAX_AGE = float(os.getenv("KEY_SNAPSHOT_MAX_AGE", "1.0"))  # Max seconds the published key list may lag
+    
+    # Key-pool state shared between worker processes
+    KEY_COORDINATION = os.getenv("KEY_COORDINATION", "local").lower()  # "local" or "sqlite"
+    KEY_COORDINATION_FILE = os.getenv("KEY_COORDINATION_FILE", "key_coordination.db")  # Relative to the key file's directory
+    KEY_SLOT_TTL = float(os.getenv("KEY_SLOT_TTL", "1800"))  # Seconds before a crashed worker's task slot is reclaimed
+    
+    # Key selection
+    KEY_SELECTION_STRATEGY = os.getenv("KEY_SELECTION_STRATEGY", "weighted").lower()  # "weighted" or "p2c_ewma"
+    KEY_EWMA_ALPHA = float(os.getenv("KEY_EWMA_ALPHA", "0.2"))  # Smoothing of per-key latency and failure averages
+    
+    # Per-key circuit breaker
+    KEY_BREAKER_FAILURE_RATIO = float(os.getenv("KEY_BREAKER_FAILURE_RATIO", "0.5"))  # Failure share that opens the circuit
+    KEY_BREAKER_MIN_REQUESTS = int(os.getenv("KEY_BREAKER_MIN_REQUESTS", "5"))  # Requests in the window before the ratio counts
+    KEY_BREAKER_WINDOW = float(os.getenv("KEY_BREAKER_WINDOW", "300"))  # Seconds of outcomes considered
+    KEY_BREAKER_BASE_COOLDOWN = float(os.getenv("KEY_BREAKER_BASE_COOLDOWN", "60"))  # First cooldown, doubled per consecutive opening
+    KEY_BREAKER_MAX_COOLDOWN = float(os.getenv("KEY_BREAKER_MAX_COOLDOWN", "21600"))  # Cooldown upper bound
+    KEY_BREAKER_TRIAL_TIMEOUT = float(os.getenv("KEY_BREAKER_TRIAL_TIMEOUT", "600"))  # Seconds before an unanswered trial stops blocking
+    
+    # Background health probing of temporarily disabled keys
+    KEY_PROBE_ENABLED = os.getenv("KEY_PROBE_ENABLED", "True").lower() in ("true", "1", "yes")
+    KEY_PROBE_INTERVAL = float(os.getenv("KEY_PROBE_INTERVAL", "300"))  # Seconds between probe rounds
+    KEY_PROBE_CONCURRENCY = int(os.getenv("KEY_PROBE_CONCURRENCY", "3"))  # Max keys probed at the same time
+    KEY_PROBE_JITTER = float(os.getenv("KEY_PROBE_JITTER", "30"))  # Max random delay before each probe (seconds)
+    
+    # Shared task-status polling (one list request per key and tick)
+    TASK_POLL_INTERVAL = float(os.getenv("TASK_POLL_INTERVAL", "5"))  # Seconds between checks until completion times are learned
+    TASK_POLL_MIN_GAP = float(os.getenv("TASK_POLL_MIN_GAP", "1"))  # Min seconds between checks of a task and list requests of a key
+    TASK_POLL_MAX_GAP = float(os.getenv("TASK_POLL_MAX_GAP", "10"))  # Max seconds between learned checks of a task
+    TASK_POLL_MIN_SAMPLES = int(os.getenv("TASK_POLL_MIN_SAMPLES", "10"))  # Completions per operation before its schedule is learned
+    TASK_POLL_TIMEOUT = float(os.getenv("TASK_POLL_TIMEOUT", "200"))  # Seconds before polling a task gives up
+    TASK_POLL_PAGE_SIZE = int(os.getenv("TASK_POLL_PAGE_SIZE", "20"))  # Tasks per list page
+    TASK_POLL_MAX_PAGES = int(os.getenv("TASK_POLL_MAX_PAGES", "5"))  # Pages fetched per tick to find older tasks
+    
+    # Upstream retries (task submit, status polling, upload)
+    RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))  # Attempts per request, including the first
+    RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))  # Backoff cap of the first retry (seconds)
+    RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "8"))  # Max backoff cap (seconds)
+    RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))  # Retries allowed per request across the process
+    RETRY_BUDGET_MIN = int(os.getenv("RETRY_BUDGET_MIN", "10"))  # Retries allowed per window regardless of traffic
+    RETRY_BUDGET_WINDOW = float(os.getenv("RETRY_BUDGET_WINDOW", "60"))  # Seconds over which the budget is counted
+    
+    # Share one upstream task between identical text-to-image requests in flight (opt-in)
+    SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "False").lower() in ("true", "1", "yes")
+    
+    # Result cache: repeated requests (same prompt, n, size, operation and source image) reuse earlier images
+    RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "False").lower() in ("true", "1", "yes")
+    RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "3600"))  # Seconds a result is reused
+    RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "500"))  # LRU-evicted beyond this
+    
+    # Batch generation
+    BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "5000"))  # Max prompts per batch
+    BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))  # Default prompts of a batch running at the same time
+    BATCH_KEY_WAIT = float(os.getenv("BATCH_KEY_WAIT", "300"))  # Seconds an item waits for a key before failing
+    BATCH_RETENTION = float(os.getenv("BATCH_RETENTION", "21600"))  # Seconds a finished batch stays queryable
+    
+    # Upload deduplication (remix source images already uploaded with the same key)
+    UPLOAD_CACHE_ENABLED = os.getenv("UPLOAD_CACHE_ENABLED", "True").lower() in ("true", "1", "yes")
+    UPLOAD_CACHE_TTL = float(os.getenv("UPLOAD_CACHE_TTL", "3600"))  # Seconds an uploaded media ID is reused
+    UPLOAD_CACHE_MAX_ENTRIES = int(os.getenv("UPLOAD_CACHE_MAX_ENTRIES", "1000"))  # LRU-evicted beyond this
+    
+    # Cloudflare sessions (shared per egress proxy)
+    CF_SESSION_PERSIST = os.getenv("CF_SESSION_PERSIST", "True").lower() in ("true", "1", "yes")
+    # Clearance cookies kept across restarts; a relative path is resolved against BASE_DIR
+    CF_SESSION_STATE_FILE = os.path.join(BASE_DIR, os.getenv("CF_SESSION_STATE_FILE", "cf_sessions.json"))
+    CF_REFRESH_MARGIN = float(os.getenv("CF_REFRESH_MARGIN", "300"))  # Seconds before cf_clearance expiry to refresh it
+    CF_REFRESH_CHECK_INTERVAL = float(os.getenv("CF_REFRESH_CHECK_INTERVAL", "60"))  # Seconds between expiry checks
+    
     # Logging configuration
     VERBOSE_LOGGING = os.getenv("VERBOSE_LOGGING", "False").lower() in ("true", "1", "yes")
     
@@ -142,29 +221,6 @@ class Config:
         except Exception as e:
             logger.error(f"Failed to load API keys from file: {e}") 
     
-    @classmethod
-    def save_api_keys(cls, keys_data):
-        """Save API keys to file"""
-        try:
-            keys_storage_file = os.path.join(cls.BASE_DIR, cls.KEYS_STORAGE_FILE)
-            
-            with open(keys_storage_file, "w", encoding="utf-8") as f:
-                if isinstance(keys_data, list):
-                    json.dump({"keys": keys_data}, f, ensure_ascii=False, indent=2)
-                else:
-                    json.dump(keys_data, f, ensure_ascii=False, indent=2)
-            
-            # Update in-memory keys
-            if isinstance(keys_data, dict) and "keys" in keys_data:
-                cls.API_KEYS = [k for k in keys_data["keys"] if k.get("key")]
-            else:
-                cls.API_KEYS = keys_data
-                
-            if cls.VERBOSE_LOGGING:
-                logger.info(f"API keys saved to {keys_storage_file}")
-        except Exception as e:
-            logger.error(f"Failed to save API keys: {e}")
-    
     @classmethod
     def save_admin_key(cls):
         """Save admin key to file"""
@@ -0,0 +1,194 @@
+import time
+import sqlite3
+import logging
+import threading
+from typing import Optional
+
+# Initialize logger
+logger = logging.getLogger("sora-api.key_coordination")
+
+# Supported coordination backends
+COORDINATION_LOCAL = "local"  # Single process: the KeyManager's in-memory state is authoritative
+COORDINATION_SQLITE = "sqlite"  # Several worker processes on one host share a SQLite database
+
+# How long a caller should wait before retrying a key whose slots are all taken by other
+# processes (their releases do not wake our waiters, so we poll)
+SLOT_RETRY_SECONDS = 0.5
+
+class KeyCoordinator:
+    """
+    Key-pool state shared between worker processes.
+
+    The KeyManager keeps its own in-memory rate buckets, concurrency slots and
+    disable flags and asks the coordinator before handing out a key. This base
+    class is the single-process coordinator: the in-memory state already covers
+    every caller, so every request is granted.
+    """
+
+    # Whether the state is shared with other processes
+    shared = False
+
+    def acquire(self, key_id: str, rate_per_minute: float, capacity: float,
+                max_concurrent: int, now: Optional[float] = None, slot_id: Optional[str] = None) -> float:
+        """
+        Try to take a rate token for a key across all processes.
+
+        Fails if the key is disabled or all its slots are taken in any process.
+        If granted and slot_id is given, a slot is claimed under that ID in the
+        same step, so processes cannot pass the slot check together.
+
+        Returns:
+            0 if granted, otherwise the seconds to wait before trying again
+        """
+        return 0.0
+
+    def claim_slot(self, key_id: str, task_id: str, now: Optional[float] = None) -> None:
+        """Record that a task is running on a key."""
+        pass
+
+    def release_slot(self, key_id: str, task_id: str) -> None:
+        """Record that a task no longer runs on a key."""
+        pass
+
+    def set_disabled(self, key_id: str, until: Optional[float]) -> None:
+        """Disable a key for all processes until a timestamp (inf = indefinitely, None = enable)."""
+        pass
+
+    def forget(self, key_id: str) -> None:
+        """Drop all shared state of a deleted key."""
+        pass
+
+    def close(self) -> None:
+        """Release backend resources."""
+        pass
+
+class SqliteKeyCoordinator(KeyCoordinator):
+    """
+    Shared key-pool state in a SQLite database for workers on the same host.
+
+    Token buckets, task slots and disable flags are rows keyed by key ID. Each
+    acquire runs in a BEGIN IMMEDIATE transaction, so checking and consuming a
+    token is atomic across processes. Slots of workers that died without
+    releasing them expire after slot_ttl seconds.
+    """
+
+    shared = True
+
+    def __init__(self, path: str, slot_ttl: float = 1800.0, busy_timeout: float = 5.0):
+        self.path = path
+        self.slot_ttl = slot_ttl
+        self._busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS key_buckets (
+                key_id TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS key_slots (
+                key_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                claimed_at REAL NOT NULL,
+                PRIMARY KEY (key_id, task_id)
+            );
+            CREATE TABLE IF NOT EXISTS key_disabled (
+                key_id TEXT PRIMARY KEY,
+                until REAL NOT NULL
+            );
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Per-thread connection (sqlite3 connections must not be shared across threads)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self._busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def acquire(self, key_id: str, rate_per_minute: float, capacity: float,
+                max_concurrent: int, now: Optional[float] = None, slot_id: Optional[str] = None) -> float:
+        now = time.time() if now is None else now
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT until FROM key_disabled WHERE key_id = ?", (key_id,)).fetchone()
+            if row and row[0] > now:
+                conn.execute("COMMIT")
+                return row[0] - now
+
+            conn.execute("DELETE FROM key_slots WHERE key_id = ? AND claimed_at < ?", (key_id, now - self.slot_ttl))
+            in_flight = conn.execute("SELECT COUNT(*) FROM key_slots WHERE key_id = ?", (key_id,)).fetchone()[0]
+            if in_flight >= max(1, max_concurrent):
+                conn.execute("COMMIT")
+                return SLOT_RETRY_SECONDS
+
+            # Refill the shared bucket for the time elapsed since any process last used it
+            refill_rate = rate_per_minute / 60.0
+            row = conn.execute("SELECT tokens, updated_at FROM key_buckets WHERE key_id = ?", (key_id,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * refill_rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / refill_rate if refill_rate > 0 else float("inf")
+            conn.execute("INSERT OR REPLACE INTO key_buckets (key_id, tokens, updated_at) VALUES (?, ?, ?)",
+                         (key_id, tokens, now))
+            if wait == 0.0 and slot_id is not None:
+                conn.execute("INSERT OR REPLACE INTO key_slots (key_id, task_id, claimed_at) VALUES (?, ?, ?)",
+                             (key_id, slot_id, now))
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def claim_slot(self, key_id: str, task_id: str, now: Optional[float] = None) -> None:
+        self._connect().execute("INSERT OR REPLACE INTO key_slots (key_id, task_id, claimed_at) VALUES (?, ?, ?)",
+                                (key_id, task_id, time.time() if now is None else now))
+
+    def release_slot(self, key_id: str, task_id: str) -> None:
+        self._connect().execute("DELETE FROM key_slots WHERE key_id = ? AND task_id = ?", (key_id, task_id))
+
+    def set_disabled(self, key_id: str, until: Optional[float]) -> None:
+        conn = self._connect()
+        if until is None:
+            conn.execute("DELETE FROM key_disabled WHERE key_id = ?", (key_id,))
+        else:
+            conn.execute("INSERT OR REPLACE INTO key_disabled (key_id, until) VALUES (?, ?)", (key_id, until))
+
+    def forget(self, key_id: str) -> None:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table in ("key_buckets", "key_slots", "key_disabled"):
+                conn.execute(f"DELETE FROM {table} WHERE key_id = ?", (key_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def close(self) -> None:
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.ProgrammingError:
+                    # Closed from a thread other than its owner; the process is exiting anyway
+                    pass
+            self._connections = []
+        self._local = threading.local()
+
+def create_coordinator(backend: str, sqlite_file: str, slot_ttl: float = 1800.0) -> KeyCoordinator:
+    """Create the configured coordination backend."""
+    if backend == COORDINATION_SQLITE:
+        logger.info(f"Sharing key-pool state between processes via {sqlite_file}")
+        return SqliteKeyCoordinator(sqlite_file, slot_ttl=slot_ttl)
+    if backend != COORDINATION_LOCAL:
+        logger.warning(f"Unknown key coordination backend '{backend}', falling back to '{COORDINATION_LOCAL}'")
+    return KeyCoordinator()
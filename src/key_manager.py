@@ -1,32 +1,161 @@
 import time
-import random
+import asyncio
+import collections
 import uuid
 import json
 import os
+import hashlib
+import heapq
 import logging
 import threading
+import atexit
 from typing import Dict, List, Optional, Any, Union, Tuple, Callable
 
+from .config import Config
+from .rate_limiter import TokenBucket
+from .key_selection import KeyHealth, EligibleKeys, STRATEGY_WEIGHTED, STRATEGY_P2C_EWMA, select_weighted, select_p2c
+from .usage_stats import UsageSeries, LATENCY_BUCKETS, percentile_from_histogram
+from .key_storage import KeyStorage, JsonKeyStorage, create_storage
+from .key_coordination import KeyCoordinator, create_coordinator
+from .circuit_breaker import CircuitBreaker, STATE_OPEN, STATE_HALF_OPEN
+
 # Initialize logger
 logger = logging.getLogger("sora-api.key_manager")
 
+# Supported persistence modes
+PERSIST_MODE_SYNC = "sync"  # Rewrite the storage file on every change
+PERSIST_MODE_WRITE_BEHIND = "write_behind"  # Mark dirty and let a background thread flush
+
+# Longest time a key refused by the cross-process coordinator is skipped before asking again
+SHARED_RECHECK_SECONDS = 30.0
+
+# Slots claimed by get_key are held under a reservation ID until the caller submits its task
+# (mark_key_as_working takes the slot over) or gives the key back (release_reservation).
+# Reservations of callers that did neither are reclaimed after this many seconds.
+RESERVATION_PREFIX = "reserved_"
+RESERVATION_TTL_SECONDS = 120.0
+
+class _KeyWaiter:
+    """A caller parked in KeyManager.acquire_key, woken from any thread."""
+    
+    __slots__ = ("loop", "event")
+    
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.event = asyncio.Event()
+    
+    def wake(self) -> None:
+        """Wake the waiter; safe to call from threads other than its event loop."""
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            # Event loop already closed
+            pass
+
+class KeySnapshot:
+    """
+    Immutable, published view of the key pool for read-heavy paths.
+    
+    Built under the KeyManager lock and then swapped in with a single assignment,
+    so readers (admin list, health checks) never take the lock or copy. The
+    contained dicts are shared between readers and must not be modified.
+    """
+    
+    __slots__ = ("version", "built_at", "keys", "total_keys", "active_keys", "available_keys", "has_timers")
+    
+    def __init__(self, version: int, built_at: float, keys: Tuple[Dict[str, Any], ...]):
+        self.version = version  # KeyManager._snapshot_version this snapshot reflects
+        self.built_at = built_at
+        self.keys = keys  # Masked key records with runtime fields (active_tasks, health, ...)
+        self.total_keys = len(keys)
+        self.active_keys = sum(1 for k in keys if k.get("is_enabled", False))
+        self.available_keys = sum(1 for k in keys if k.get("available", False))
+        # Countdown fields (temp_disabled_remaining) go stale even without changes
+        self.has_timers = any(k.get("temp_disabled_until") for k in keys)
+
 class KeyManager: 
-    def __init__(self, storage_file: str = "api_keys.json"):
+    def __init__(self, storage_file: str = "api_keys.json", persist_mode: str = PERSIST_MODE_SYNC,
+                 flush_interval: float = 2.0, flush_batch_size: int = 100, rate_burst_seconds: float = 10.0,
+                 selection_strategy: str = STRATEGY_WEIGHTED, ewma_alpha: float = 0.2,
+                 storage: Optional[KeyStorage] = None, coordinator: Optional[KeyCoordinator] = None,
+                 snapshot_max_age: float = 1.0, breaker_options: Optional[Dict[str, float]] = None):
         """
         Initialize the API key manager.
         
         Args:
-            storage_file: Path to the key storage file
+            storage_file: Path to the JSON key file (storage, or import source for other backends)
+            persist_mode: "sync" to write on every change, "write_behind" to flush in the background
+            flush_interval: Seconds between background flushes (write_behind mode)
+            flush_batch_size: Number of pending changes that triggers an early flush (write_behind mode)
+            rate_burst_seconds: Burst allowance of each key's token bucket, in seconds of max_rpm
+            selection_strategy: "weighted" (random by weight) or "p2c_ewma" (latency/error aware)
+            ewma_alpha: Smoothing factor of the per-key latency and failure moving averages
+            storage: Storage backend (defaults to the JSON file at storage_file)
+            coordinator: Key-pool state shared with other worker processes (defaults to in-process only)
+            snapshot_max_age: Max seconds the published snapshot may lag behind runtime fields (tasks, health)
+            breaker_options: Keyword arguments of each key's CircuitBreaker (failure_ratio, base_cooldown, ...)
         """
         self.keys = []  # List of API keys
         self.storage_file = storage_file
+        self._storage = storage or JsonKeyStorage(storage_file)
         self.usage_stats = {}  # Usage statistics
         self._lock = threading.RLock()  # Reentrant lock to support concurrent access
-        self._working_keys = {}  # Track keys currently in use {key_value: task_id}
+        self._working_keys = {}  # Track keys currently in use {key_value: set of task_ids}
+        self._reservations = {}  # Normalized key value -> {reservation ID: claimed at} of slots taken by get_key
+        self._key_index = {}  # Normalized key value (without Bearer prefix) -> key record
+        self._id_index = {}  # Key ID -> key record
+        self._eligible = EligibleKeys()  # Records of keys with available=True (selection only looks at these)
+        self._expiry_heap = []  # Min-heap of (temp_disabled_until, key ID)
+        self._expiry_event = threading.Event()  # Wakes the expiry thread when an earlier deadline is added
+        self._buckets = {}  # Key ID -> TokenBucket enforcing max_rpm
+        self._waiters = collections.deque()  # FIFO of callers waiting in acquire_key
+        self._health = {}  # Key ID -> KeyHealth (EWMA latency and failure rate)
+        self._breakers = {}  # Key ID -> CircuitBreaker (closed / open / half-open)
+        self._breaker_options = dict(breaker_options or {})
+        self._coordinator = coordinator or KeyCoordinator()
+        self._shared_wait_until = {}  # Key ID -> time before which other processes hold the key's tokens or slots
+        self.snapshot_max_age = max(0.0, float(snapshot_max_age))
+        self._snapshot_version = 0  # Bumped on every key record change
+        self._snapshot_volatile = False  # Runtime fields changed since the snapshot was built
+        self._snapshot = KeySnapshot(-1, 0.0, ())
+        self._auth_index = (-1, frozenset())  # (snapshot version, SHA-256 digests of enabled key values)
+        self._series = {}  # Key ID -> UsageSeries (per-minute/per-day counts and latency histograms)
+        if selection_strategy not in (STRATEGY_WEIGHTED, STRATEGY_P2C_EWMA):
+            logger.warning(f"Unknown key selection strategy '{selection_strategy}', falling back to '{STRATEGY_WEIGHTED}'")
+            selection_strategy = STRATEGY_WEIGHTED
+        self.selection_strategy = selection_strategy
+        self.ewma_alpha = ewma_alpha
+        self.rate_burst_seconds = max(0.0, float(rate_burst_seconds))
+        
+        # Persistence state
+        if persist_mode not in (PERSIST_MODE_SYNC, PERSIST_MODE_WRITE_BEHIND):
+            logger.warning(f"Unknown persist mode '{persist_mode}', falling back to '{PERSIST_MODE_SYNC}'")
+            persist_mode = PERSIST_MODE_SYNC
+        self.persist_mode = persist_mode
+        self.flush_interval = max(0.1, float(flush_interval))
+        self.flush_batch_size = max(1, int(flush_batch_size))
+        self._dirty = False  # Whether in-memory state differs from the storage
+        self._dirty_all = False  # Whether the next flush must rewrite the whole state
+        self._dirty_ids = set()  # Key IDs changed since the last flush
+        self._deleted_ids = set()  # Key IDs deleted since the last flush
+        self._pending_changes = 0  # Number of changes since the last flush
+        self._storage_version = 0  # Newest storage version already reflected in memory
+        self._own_versions = set()  # Storage versions written by this process
+        self._flush_lock = threading.Lock()  # Serializes file writes
+        self._flush_event = threading.Event()  # Wakes the flusher early
+        self._stop_event = threading.Event()
+        self._flusher = None
+        
         self._load_keys()
         
+        if self.persist_mode == PERSIST_MODE_WRITE_BEHIND:
+            self._start_flusher()
+        self._lift_expired()
+        self._expiry_thread = threading.Thread(target=self._expiry_loop, name="key-manager-expiry", daemon=True)
+        self._expiry_thread.start()
+        
     def _load_keys(self) -> None:
-        """Load API keys from environment variables or a file."""
+        """Load API keys from environment variables or the storage backend."""
         keys_loaded = False
         
         # Try environment variable first
@@ -43,24 +172,30 @@ class KeyManager:
             except json.JSONDecodeError as e:
                 logger.error(f"Failed to parse API_KEYS from environment: {str(e)}")
         
-            # If env var is not set, parsing failed, or no keys loaded, load from file
+        # If env var is not set, parsing failed, or no keys loaded, load from storage
         if not keys_loaded:
             try:
-                if os.path.exists(self.storage_file):
-                    logger.info(f"Attempting to load keys from file: {self.storage_file}")
-                    with open(self.storage_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        keys_before = len(self.keys)
-                        self._process_keys_data(data)
-                        keys_loaded = len(self.keys) > keys_before
-                        logger.info(f"Loaded {len(self.keys) - keys_before} keys from file")
-                else:
-                    logger.warning(f"Key storage file does not exist: {self.storage_file}")
+                self._storage_version = self._storage.current_version()
+                data = self._storage.load()
+                if data is None and not isinstance(self._storage, JsonKeyStorage) and os.path.exists(self.storage_file):
+                    # First start on a new backend: import the JSON file once
+                    data = JsonKeyStorage(self.storage_file).load()
+                    if data:
+                        logger.info(f"Importing keys from {self.storage_file} into the key storage backend")
+                        self._dirty_all = True
+                        self._dirty = True
+                if data is not None:
+                    keys_before = len(self.keys)
+                    self._process_keys_data(data)
+                    keys_loaded = len(self.keys) > keys_before
+                    logger.info(f"Loaded {len(self.keys) - keys_before} keys from storage")
             except Exception as e:
                 logger.error(f"Failed to load keys: {str(e)}")
+            if self._dirty_all:
+                self.flush()
                 
         if len(self.keys) == 0:
-            logger.warning("No API keys were loaded from environment or file")
+            logger.warning("No API keys were loaded from environment or storage")
 
         
     def _process_keys_data(self, data):
@@ -71,6 +206,7 @@ class KeyManager:
             raw_keys = data
             self.keys = []
             self.usage_stats = {}
+            self._series = {}
             
             # Create a complete record for each key
             for key_info in raw_keys:
@@ -90,8 +226,7 @@ class KeyManager:
                         "key": key_value,
                         "weight": key_info.get("weight", 1),
                         "max_rpm": key_info.get("max_rpm", 60),
-                        "requests": 0,
-                        "last_reset": time.time(),
+                        "max_concurrent": key_info.get("max_concurrent", 1),
                         "available": key_info.get("is_enabled", True),
                         "is_enabled": key_info.get("is_enabled", True),
                         "created_at": key_info.get("created_at", time.time()),
@@ -102,13 +237,7 @@ class KeyManager:
                     self.keys.append(key_record)
                     
                     # Initialize usage stats
-                    self.usage_stats[key_id] = {
-                        "total_requests": 0,
-                        "successful_requests": 0,
-                        "failed_requests": 0,
-                        "daily_usage": {},
-                        "average_response_time": 0
-                    }
+                    self.usage_stats[key_id] = self._empty_usage_stats()
                 elif isinstance(key_info, str):
                     # If it's a string, use directly as the key value
                     key_id = str(uuid.uuid4())
@@ -118,8 +247,7 @@ class KeyManager:
                         "key": key_info,
                         "weight": 1,
                         "max_rpm": 60,
-                        "requests": 0,
-                        "last_reset": time.time(),
+                        "max_concurrent": 1,
                         "available": True,
                         "is_enabled": True,
                         "created_at": time.time(),
@@ -128,38 +256,549 @@ class KeyManager:
                     })
                     
                     # Initialize usage stats
-                    self.usage_stats[key_id] = {
-                        "total_requests": 0,
-                        "successful_requests": 0,
-                        "failed_requests": 0,
-                        "daily_usage": {},
-                        "average_response_time": 0
-                    }
+                    self.usage_stats[key_id] = self._empty_usage_stats()
         else:
             # New format: dict with 'keys' and 'usage_stats'
             self.keys = data.get('keys', [])
             self.usage_stats = data.get('usage_stats', {})
+            self._load_usage_series(data.get('usage_series', {}))
+            
+            # Rate limiting is tracked by token buckets now; 'available' only reflects enable state
+            for key in self.keys:
+                if not key.get("temp_disabled_until"):
+                    key["available"] = key.get("is_enabled", True)
+        
+        self._rebuild_indexes()
+    
+    def _load_usage_series(self, series_data: Dict[str, Any]) -> None:
+        """Restore per-key usage series, migrating the legacy per-date 'daily_usage' dicts."""
+        self._series = {}
+        for key_id, data in series_data.items():
+            try:
+                self._series[key_id] = UsageSeries.from_dict(data)
+            except (TypeError, ValueError, IndexError) as e:
+                logger.warning(f"Ignoring malformed usage series for key {key_id}: {str(e)}")
+        for key_id, stats in self.usage_stats.items():
+            daily_usage = stats.pop("daily_usage", None)
+            if daily_usage and key_id not in self._series:
+                self._series[key_id] = UsageSeries.from_daily_usage(daily_usage)
+    
+    @staticmethod
+    def _empty_usage_stats() -> Dict[str, Any]:
+        """Counters of a key that has not been used yet."""
+        return {
+            "total_requests": 0,
+            "successful_requests": 0,
+            "failed_requests": 0,
+            "average_response_time": 0
+        }
+    
+    @staticmethod
+    def _normalize_key(key: str) -> str:
+        """Strip the optional Bearer prefix from a key value."""
+        if not key:
+            return ""
+        return key[7:] if key.startswith("Bearer ") else key
+    
+    def _rebuild_indexes(self) -> None:
+        """Rebuild the key value and ID lookup indexes from self.keys."""
+        with self._lock:
+            self._key_index = {}
+            self._id_index = {}
+            self._eligible = EligibleKeys()
+            self._expiry_heap = []
+            for key in self.keys:
+                self._index_key(key)
+            self._invalidate_snapshot()
+    
+    def _index_key(self, key: Dict[str, Any]) -> None:
+        """Add a key record to the lookup indexes, the eligible set and the expiry heap."""
+        clean_key = self._normalize_key(key.get("key", ""))
+        if clean_key:
+            self._key_index[clean_key] = key
+        if key.get("id"):
+            self._id_index[key["id"]] = key
+            self._update_eligibility(key)
+            if key.get("temp_disabled_until"):
+                self._schedule_expiry(key)
+    
+    def _unindex_key(self, key: Dict[str, Any]) -> None:
+        """Remove a key record from the lookup indexes and the eligible set."""
+        clean_key = self._normalize_key(key.get("key", ""))
+        if self._key_index.get(clean_key) is key:
+            del self._key_index[clean_key]
+        if self._id_index.get(key.get("id")) is key:
+            del self._id_index[key["id"]]
+            self._eligible.discard(key["id"])
+    
+    def _update_eligibility(self, key: Dict[str, Any]) -> None:
+        """Add a key to or remove it from the eligible set after 'available' changed (caller holds the lock)."""
+        if key.get("available", False):
+            self._eligible.add(key)
+        else:
+            self._eligible.discard(key["id"])
+    
+    def _schedule_expiry(self, key: Dict[str, Any]) -> None:
+        """Queue the lift of a key's temporary disable (caller holds the lock)."""
+        deadline = key["temp_disabled_until"]
+        if not self._expiry_heap or deadline < self._expiry_heap[0][0]:
+            # New earliest deadline: wake the expiry thread to shorten its sleep
+            self._expiry_event.set()
+        heapq.heappush(self._expiry_heap, (deadline, key["id"]))
+    
+    def _lift_expired(self, now: Optional[float] = None) -> List[str]:
+        """
+        Lift every temporary disable whose deadline has passed.
+        
+        Heap entries are not removed when a key is re-enabled, deleted or disabled
+        again; they are checked against the record here and dropped if outdated.
+        
+        Returns:
+            IDs of the keys whose temporary disable was lifted
+        """
+        now = time.time() if now is None else now
+        lifted_ids = []
+        with self._lock:
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                deadline, key_id = heapq.heappop(self._expiry_heap)
+                key = self._id_index.get(key_id)
+                if key is None or key.get("temp_disabled_until") != deadline:
+                    continue
+                lifted_ids.append(key_id)
+                if not self._lift_temp_disable(key):
+                    continue
+                breaker = self._breakers.get(key_id)
+                if breaker is not None and breaker.state == STATE_OPEN:
+                    # Back in the pool, but only for a single trial request
+                    breaker.half_open()
+                    logger.info(f"Circuit of key {key.get('name') or key_id} is half-open, waiting for a trial request")
+                else:
+                    logger.info(f"Temporary disable lifted for key {key.get('name') or key_id}")
+            
+            if lifted_ids:
+                self._invalidate_snapshot()
+                self._save_keys(*lifted_ids)
+                self._notify_waiters()
+        return lifted_ids
+    
+    def _lift_temp_disable(self, key: Dict[str, Any]) -> bool:
+        """
+        End a key's temporary disable (caller holds the lock and persists).
+        
+        Only the temporary disable is lifted: a key an administrator disabled stays out of the pool.
+        
+        Returns:
+            True if the key is back in the pool
+        """
+        key["temp_disabled_until"] = None
+        if not key.get("is_enabled", True):
+            return False
+        key["available"] = True
+        self._update_eligibility(key)
+        self._coordinate("set_disabled", key["id"], None)
+        return True
+    
+    def get_probe_candidates(self) -> List[str]:
+        """
+        Key values of temporarily disabled keys, for the background health prober.
+        
+        Keys disabled by an administrator (is_enabled=False without a deadline) are
+        not included; only an administrator re-enables those.
+        """
+        with self._lock:
+            return [key["key"] for key in self.keys if key.get("temp_disabled_until") and key.get("is_enabled", True)]
+    
+    def restore_key(self, key: str) -> bool:
+        """
+        Lift a key's temporary disable early, e.g. after it passed a health probe.
+        
+        Args:
+            key: API key value (may include Bearer prefix)
+            
+        Returns:
+            True if the key was temporarily disabled and is back in the pool
+        """
+        with self._lock:
+            key_info = self._find_key(key)
+            if not key_info or not key_info.get("temp_disabled_until"):
+                return False
+            if not self._lift_temp_disable(key_info):
+                self._save_keys(key_info["id"])
+                return False
+            self._breakers.pop(key_info["id"], None)
+            self._invalidate_snapshot()
+            self._save_keys(key_info["id"])
+            self._notify_waiters()
+            logger.info(f"Key {key_info.get('name') or key_info['id']} passed its health probe and is back in the pool")
+            return True
+    
+    def _expiry_loop(self) -> None:
+        """Sleep until the earliest temp-disable deadline, then lift the expired ones."""
+        while not self._stop_event.is_set():
+            self._lift_expired()
+            with self._lock:
+                timeout = self._expiry_heap[0][0] - time.time() if self._expiry_heap else None
+            # Cap the sleep so wall-clock jumps are picked up
+            timeout = 60.0 if timeout is None else min(max(timeout, 0.0), 60.0)
+            self._expiry_event.wait(timeout)
+            self._expiry_event.clear()
+    
+    def _find_key(self, key: str) -> Optional[Dict[str, Any]]:
+        """Find a key record by key value (with or without Bearer prefix)."""
+        return self._key_index.get(self._normalize_key(key))
+    
+    def _has_free_slot(self, key: Dict[str, Any], clean_key: Optional[str] = None, now: Optional[float] = None) -> bool:
+        """Check whether a key has a free concurrency slot (caller holds the lock)."""
+        if clean_key is None:
+            clean_key = self._normalize_key(key.get("key", ""))
+        limit = max(1, key.get("max_concurrent", 1))
+        in_flight = len(self._working_keys.get(clean_key, ()))
+        if in_flight >= limit and clean_key in self._reservations:
+            in_flight -= self._reclaim_reservations(clean_key, time.time() if now is None else now)
+        return in_flight < limit
+    
+    def _reserve_slot(self, key: Dict[str, Any], reservation_id: str, now: float) -> None:
+        """Hold one of a key's slots for the caller of get_key (caller holds the lock)."""
+        clean_key = self._normalize_key(key.get("key", ""))
+        self._working_keys.setdefault(clean_key, set()).add(reservation_id)
+        self._reservations.setdefault(clean_key, {})[reservation_id] = now
+    
+    def _pop_reservation(self, clean_key: str) -> Optional[str]:
+        """Free a key's oldest reservation and return its ID, None if it has none (caller holds the lock)."""
+        reservations = self._reservations.get(clean_key)
+        if not reservations:
+            return None
+        reservation_id = next(iter(reservations))
+        self._drop_reservation(clean_key, reservation_id)
+        return reservation_id
+    
+    def _drop_reservation(self, clean_key: str, reservation_id: str) -> None:
+        """Remove a reservation and free its slot (caller holds the lock)."""
+        reservations = self._reservations.get(clean_key)
+        if reservations is not None:
+            reservations.pop(reservation_id, None)
+            if not reservations:
+                del self._reservations[clean_key]
+        tasks = self._working_keys.get(clean_key)
+        if tasks is not None:
+            tasks.discard(reservation_id)
+            if not tasks:
+                del self._working_keys[clean_key]
+        key_info = self._key_index.get(clean_key)
+        if key_info:
+            self._coordinate("release_slot", key_info["id"], reservation_id)
+    
+    def _reclaim_reservations(self, clean_key: str, now: float) -> int:
+        """
+        Free reservations older than RESERVATION_TTL_SECONDS (caller holds the lock).
+        
+        Returns:
+            Number of slots freed
+        """
+        expired = [reservation_id for reservation_id, claimed_at in self._reservations.get(clean_key, {}).items()
+                   if now - claimed_at > RESERVATION_TTL_SECONDS]
+        for reservation_id in expired:
+            self._drop_reservation(clean_key, reservation_id)
+        if expired:
+            logger.warning(f"Reclaimed {len(expired)} key slot(s) reserved by callers that never submitted a task")
+            self._snapshot_volatile = True
+        return len(expired)
+    
+    def _get_health(self, key_id: str) -> KeyHealth:
+        """Get the health tracker of a key, creating it on first use."""
+        health = self._health.get(key_id)
+        if health is None:
+            health = KeyHealth(alpha=self.ewma_alpha)
+            self._health[key_id] = health
+        return health
+    
+    def _get_breaker(self, key_id: str) -> CircuitBreaker:
+        """Get the circuit breaker of a key, creating it on first use."""
+        breaker = self._breakers.get(key_id)
+        if breaker is None:
+            breaker = CircuitBreaker(**self._breaker_options)
+            self._breakers[key_id] = breaker
+        return breaker
+    
+    def _open_circuit(self, key: Dict[str, Any], open_until: float) -> None:
+        """Take a key whose circuit opened out of the pool until the cooldown ends (caller holds the lock)."""
+        key["available"] = False
+        key["temp_disabled_until"] = open_until
+        self._update_eligibility(key)
+        self._schedule_expiry(key)
+        self._coordinate("set_disabled", key["id"], open_until)
+        self._invalidate_snapshot()
+        self._save_keys(key["id"])
+        logger.warning(f"Circuit of key {key.get('name') or key.get('id')} opened for {int(open_until - time.time())} seconds")
+    
+    def _trip_circuit(self, key: Dict[str, Any]) -> None:
+        """Open a key's circuit right away after a definite failure (caller holds the lock)."""
+        self._open_circuit(key, self._get_breaker(key["id"]).trip())
+    
+    def _get_series(self, key_id: str) -> UsageSeries:
+        """Get the usage series of a key, creating it on first use."""
+        series = self._series.get(key_id)
+        if series is None:
+            series = UsageSeries()
+            self._series[key_id] = series
+        return series
     
-    def _save_keys(self) -> None:
-        """Persist keys and usage stats to file."""
+    def _selection_cost(self, key: Dict[str, Any]) -> float:
+        """Expected cost of routing one more task to a key (caller holds the lock)."""
+        in_flight = len(self._working_keys.get(self._normalize_key(key.get("key", "")), ()))
+        return self._get_health(key.get("id")).cost(weight=key.get("weight", 1), in_flight=in_flight)
+    
+    def _get_bucket(self, key: Dict[str, Any], now: float) -> TokenBucket:
+        """Get the token bucket of a key, creating or reconfiguring it from max_rpm."""
+        max_rpm = key.get("max_rpm", 60)
+        capacity = max(1.0, max_rpm * self.rate_burst_seconds / 60.0)
+        bucket = self._buckets.get(key.get("id"))
+        if bucket is None:
+            bucket = TokenBucket(max_rpm, capacity=capacity, now=now)
+            self._buckets[key.get("id")] = bucket
+        elif bucket.rate_per_minute != max_rpm or bucket.capacity != capacity:
+            bucket.reconfigure(max_rpm, capacity=capacity, now=now)
+        return bucket
+    
+    def _acquire_shared(self, key: Dict[str, Any], now: float, slot_id: Optional[str] = None) -> float:
+        """
+        Ask the coordinator for a key, claiming a slot under slot_id if granted (caller holds the lock).
+        
+        Returns:
+            0 if granted, otherwise seconds until the key is worth trying again
+        """
+        if not self._coordinator.shared:
+            return 0.0
+        max_rpm = key.get("max_rpm", 60)
         try:
-            with open(self.storage_file, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'keys': self.keys,
-                    'usage_stats': self.usage_stats
-                }, f, ensure_ascii=False, indent=2)
-                
-            # Also update Config.API_KEYS
+            return self._coordinator.acquire(
+                key["id"], max_rpm, max(1.0, max_rpm * self.rate_burst_seconds / 60.0),
+                key.get("max_concurrent", 1), now, slot_id
+            )
+        except Exception as e:
+            # Fall back to local accounting rather than failing the request
+            logger.error(f"Key coordination failed, using local state only: {str(e)}")
+            return 0.0
+    
+    def _coordinate(self, method: str, *args) -> None:
+        """Forward a state change to the coordinator, logging instead of raising on failure."""
+        if not self._coordinator.shared:
+            return
+        try:
+            getattr(self._coordinator, method)(*args)
+        except Exception as e:
+            logger.error(f"Key coordination {method} failed: {str(e)}")
+    
+    def _save_keys(self, *key_ids: str) -> None:
+        """
+        Persist keys and usage stats.
+        
+        In sync mode the change is written immediately. In write-behind mode the state
+        is only marked dirty and the background flusher writes it later.
+        
+        Args:
+            *key_ids: IDs of the keys that changed; none means the whole state changed
+        """
+        with self._lock:
+            self._dirty = True
+            self._pending_changes += 1
+            if key_ids:
+                self._dirty_ids.update(key_ids)
+            else:
+                self._dirty_all = True
+        self._schedule_flush()
+    
+    def _mark_deleted(self, key_id: str) -> None:
+        """Record a deleted key for the next flush (caller holds the lock)."""
+        self._dirty_ids.discard(key_id)
+        self._deleted_ids.add(key_id)
+        self._dirty = True
+        self._pending_changes += 1
+    
+    def _schedule_flush(self) -> None:
+        """Flush now in sync mode, or wake the flusher early once the batch size is reached."""
+        # Keep Config.API_KEYS in sync with the in-memory list
+        try:
+            from .config import Config
+            Config.API_KEYS = self.keys
+        except (ImportError, AttributeError):
+            logger.debug("Unable to update API_KEYS in Config")
+        
+        if self.persist_mode == PERSIST_MODE_WRITE_BEHIND:
+            if self._pending_changes >= self.flush_batch_size:
+                self._flush_event.set()
+            return
+        self.flush()
+    
+    def _storage_row(self, key: Dict[str, Any]) -> Dict[str, Any]:
+        """Snapshot of one key's record and usage data (caller holds the lock)."""
+        key_id = key.get("id")
+        stats = self.usage_stats.get(key_id)
+        series = self._series.get(key_id)
+        return {
+            "id": key_id,
+            "key": dict(key),
+            "usage_stats": dict(stats) if stats else None,
+            "usage_series": series.to_dict() if series else None
+        }
+    
+    def export_state(self) -> Dict[str, Any]:
+        """
+        Snapshot of the full state in the JSON storage format.
+        
+        Also used as the import/export format of non-JSON backends.
+        """
+        with self._lock:
+            rows = [self._storage_row(key) for key in self.keys]
+        return {
+            'keys': [row["key"] for row in rows],
+            'usage_stats': {row["id"]: row["usage_stats"] for row in rows if row["usage_stats"]},
+            'usage_series': {row["id"]: row["usage_series"] for row in rows if row["usage_series"]}
+        }
+    
+    def flush(self) -> bool:
+        """
+        Write pending changes to the storage backend.
+        
+        The changes are snapshotted under the key lock, but the I/O happens outside it
+        so request handlers are not blocked behind the disk. Incremental backends only
+        receive the rows of keys that changed.
+        
+        Returns:
+            True if a write happened, False if there was nothing to flush or it failed
+        """
+        # Writes are serialized so snapshots reach storage in the order they were taken
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return False
+                full = self._dirty_all or not self._storage.incremental
+                if full:
+                    document = self.export_state()
+                else:
+                    rows = [self._storage_row(self._id_index[key_id]) for key_id in self._dirty_ids if key_id in self._id_index]
+                    deleted_ids = list(self._deleted_ids)
+                pending = self._pending_changes
+                dirty_ids, removed_ids = self._dirty_ids, self._deleted_ids
+                self._dirty = False
+                self._dirty_all = False
+                self._dirty_ids = set()
+                self._deleted_ids = set()
+                self._pending_changes = 0
+            
             try:
-                from .config import Config
-                Config.API_KEYS = self.keys
-            except (ImportError, AttributeError):
-                logger.debug("Unable to update API_KEYS in Config")
+                if full:
+                    version = self._storage.write_full(document)
+                else:
+                    version = self._storage.write_changes(rows, deleted_ids)
+                self._own_versions.add(version)
+                logger.debug(f"Flushed key storage ({pending} pending changes)")
+                return True
+            except Exception as e:
+                logger.error(f"Failed to save keys: {str(e)}")
+                # Keep the changes pending so the next flush retries
+                with self._lock:
+                    self._dirty = True
+                    self._dirty_all = self._dirty_all or full
+                    self._dirty_ids |= dirty_ids - self._deleted_ids
+                    self._deleted_ids |= removed_ids - self._dirty_ids
+                    self._pending_changes += pending
+                return False
+    
+    def refresh_from_storage(self) -> int:
+        """
+        Apply changes other processes wrote to a shared storage backend.
+        
+        Only rows newer than the last seen version are read. Keys with local changes
+        that are not flushed yet keep their local state.
+        
+        Returns:
+            Number of keys added, updated or removed
+        """
+        if not self._storage.incremental:
+            return 0
+        try:
+            # Hold the flush lock so versions written by in-flight flushes are already in _own_versions
+            with self._flush_lock:
+                rows, deleted_ids, version = self._storage.load_changes(self._storage_version)
         except Exception as e:
-            logger.error(f"Failed to save keys: {str(e)}")
+            logger.error(f"Failed to read key storage changes: {str(e)}")
+            return 0
+        
+        applied = 0
+        with self._lock:
+            for row in rows:
+                key_id = row["id"]
+                if row.get("version") in self._own_versions or key_id in self._dirty_ids or self._dirty_all:
+                    continue
+                key = self._id_index.get(key_id)
+                if key is None:
+                    key = {}
+                    self.keys.append(key)
+                else:
+                    self._unindex_key(key)
+                    key.clear()
+                key.update(row["key"])
+                self._index_key(key)
+                self.usage_stats[key_id] = row.get("usage_stats") or self._empty_usage_stats()
+                if row.get("usage_series"):
+                    self._series[key_id] = UsageSeries.from_dict(row["usage_series"])
+                applied += 1
+            
+            for key_id in deleted_ids:
+                key = self._id_index.get(key_id)
+                if key is None or key_id in self._dirty_ids:
+                    continue
+                self._unindex_key(key)
+                self.keys = [k for k in self.keys if k is not key]
+                self._buckets.pop(key_id, None)
+                self._health.pop(key_id, None)
+                self._breakers.pop(key_id, None)
+                self._series.pop(key_id, None)
+                applied += 1
+            
+            self._storage_version = max(self._storage_version, version)
+            self._own_versions = {v for v in self._own_versions if v > self._storage_version}
+            if applied:
+                self._invalidate_snapshot()
+                logger.info(f"Applied {applied} key changes from shared storage")
+                self._notify_waiters()
+        return applied
+    
+    def _start_flusher(self) -> None:
+        """Start the background flusher thread used in write-behind mode."""
+        self._flusher = threading.Thread(target=self._flush_loop, name="key-manager-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+        logger.info(f"Write-behind key persistence enabled (interval={self.flush_interval}s, batch={self.flush_batch_size})")
+    
+    def _flush_loop(self) -> None:
+        """
+        Flush dirty state every flush_interval seconds or when the batch size is reached,
+        and pick up changes other processes wrote to shared storage.
+        """
+        while not self._stop_event.is_set():
+            self._flush_event.wait(self.flush_interval)
+            self._flush_event.clear()
+            self.flush()
+            self.refresh_from_storage()
+    
+    def close(self) -> None:
+        """Stop the background flusher and force a final flush."""
+        self._stop_event.set()
+        self._flush_event.set()
+        self._expiry_event.set()
+        flusher = self._flusher
+        if flusher and flusher.is_alive() and flusher is not threading.current_thread():
+            flusher.join(timeout=5)
+        self._flusher = None
+        self.flush()
+        self._storage.close()
+        self._coordinator.close()
             
     def add_key(self, key_value: str, name: str = "", weight: int = 1, 
-                rate_limit: int = 60, is_enabled: bool = True, notes: str = None) -> Dict[str, Any]:
+                rate_limit: int = 60, is_enabled: bool = True, notes: str = None,
+                max_concurrent: int = 1) -> Dict[str, Any]:
         """
         Add a new API key.
         
@@ -170,15 +809,16 @@ class KeyManager:
             rate_limit: Requests per minute
             is_enabled: Whether the key is enabled
             notes: Notes
+            max_concurrent: Max number of tasks the key may run at the same time
             
         Returns:
             The added key record
         """
         with self._lock:  # Protect add with lock
             # Check if key already exists
-            for key in self.keys:
-                if key.get("key") == key_value:
-                    return key
+            existing = self._find_key(key_value)
+            if existing:
+                return existing
             
             key_id = str(uuid.uuid4())
             new_key = {
@@ -187,8 +827,7 @@ class KeyManager:
                 "key": key_value,
                 "weight": weight,
                 "max_rpm": rate_limit,
-                "requests": 0,
-                "last_reset": time.time(),
+                "max_concurrent": max_concurrent,
                 "available": is_enabled,
                 "is_enabled": is_enabled,
                 "created_at": time.time(),
@@ -196,52 +835,106 @@ class KeyManager:
                 "notes": notes
             }
             self.keys.append(new_key)
+            self._index_key(new_key)
             
             # Initialize usage stats
-            self.usage_stats[key_id] = {
-                "total_requests": 0,
-                "successful_requests": 0,
-                "failed_requests": 0,
-                "daily_usage": {},
-                "average_response_time": 0
-            }
+            self.usage_stats[key_id] = self._empty_usage_stats()
             
-            self._save_keys()
+            self._invalidate_snapshot()
+            self._save_keys(key_id)
+            self._notify_waiters()
             logger.info(f"Added API key: {name or key_id}")
             return new_key
     
-    def get_all_keys(self) -> List[Dict[str, Any]]:
-        """Get all key records (masking the full key value)."""
-        with self._lock:  # Protect read with lock
-            result = []
-            for key in self.keys:
-                key_copy = key.copy()
-                if "key" in key_copy:
-                    # Show only first 6 and last 4 characters
-                    full_key = key_copy["key"]
-                    if len(full_key) > 10:
-                        key_copy["key"] = full_key[:6] + "..." + full_key[-4:]
-                
-                # Enrich with temporary disable information if present
-                if key_copy.get("temp_disabled_until"):
-                    temp_disabled_until = key_copy["temp_disabled_until"]
-                    # Ensure it's a timestamp
-                    if isinstance(temp_disabled_until, (int, float)):
-                        # Add a human-readable copy while keeping the raw timestamp
-                        disabled_until_date = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(temp_disabled_until))
-                        key_copy["temp_disabled_until_formatted"] = disabled_until_date
-                        key_copy["temp_disabled_remaining"] = int(temp_disabled_until - time.time())
-                
-                result.append(key_copy)
-            return result
+    def _invalidate_snapshot(self) -> None:
+        """Force the next snapshot() call to rebuild (key records changed)."""
+        self._snapshot_version += 1
+    
+    def snapshot(self) -> KeySnapshot:
+        """
+        Get the published key snapshot.
+        
+        Rebuilt only when key records changed, or when runtime fields (active tasks,
+        health, countdowns) changed and the snapshot is older than snapshot_max_age.
+        Otherwise this is a lock-free attribute read.
+        """
+        snap = self._snapshot
+        if snap.version == self._snapshot_version:
+            if not (self._snapshot_volatile or snap.has_timers) or time.time() - snap.built_at < self.snapshot_max_age:
+                return snap
+        return self._rebuild_snapshot()
+    
+    def _rebuild_snapshot(self) -> KeySnapshot:
+        """Build and publish a new snapshot."""
+        with self._lock:
+            snap = KeySnapshot(self._snapshot_version, time.time(), tuple(self._build_key_views()))
+            self._snapshot_volatile = False
+            self._snapshot = snap
+            return snap
+    
+    @staticmethod
+    def _key_digest(key: str) -> bytes:
+        """SHA-256 digest of a normalized key value."""
+        return hashlib.sha256(KeyManager._normalize_key(key).encode("utf-8")).digest()
+    
+    def is_valid_inbound_key(self, token: str) -> bool:
+        """
+        Check whether a client-supplied token matches an enabled key.
+        
+        Looks up the token's digest in a set rebuilt only when keys change, so the
+        cost is one hash regardless of pool size, and lookup timing depends on the
+        digest rather than on how much of a real key the token matches.
+        """
+        if not token:
+            return False
+        version, digests = self._auth_index
+        if version != self._snapshot_version:
+            with self._lock:
+                version = self._snapshot_version
+                digests = frozenset(self._key_digest(k["key"]) for k in self.keys if k.get("is_enabled", False) and k.get("key"))
+                self._auth_index = (version, digests)
+        return self._key_digest(token) in digests
+    
+    def get_all_keys(self) -> Tuple[Dict[str, Any], ...]:
+        """Get all key records (masking the full key value) from the published snapshot."""
+        return self.snapshot().keys
+    
+    def _build_key_views(self) -> List[Dict[str, Any]]:
+        """Masked copies of all key records enriched with runtime fields (caller holds the lock)."""
+        result = []
+        for key in self.keys:
+            key_copy = key.copy()
+            key_copy.setdefault("max_concurrent", 1)
+            key_copy["active_tasks"] = len(self._working_keys.get(self._normalize_key(key.get("key", "")), ()))
+            health = self._health.get(key.get("id"))
+            if health:
+                key_copy.update(health.to_dict())
+            breaker = self._breakers.get(key.get("id"))
+            if breaker:
+                key_copy.update(breaker.to_dict())
+            if "key" in key_copy:
+                # Show only first 6 and last 4 characters
+                full_key = key_copy["key"]
+                if len(full_key) > 10:
+                    key_copy["key"] = full_key[:6] + "..." + full_key[-4:]
+            
+            # Enrich with temporary disable information if present
+            if key_copy.get("temp_disabled_until"):
+                temp_disabled_until = key_copy["temp_disabled_until"]
+                # Ensure it's a timestamp
+                if isinstance(temp_disabled_until, (int, float)):
+                    # Add a human-readable copy while keeping the raw timestamp
+                    disabled_until_date = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(temp_disabled_until))
+                    key_copy["temp_disabled_until_formatted"] = disabled_until_date
+                    key_copy["temp_disabled_remaining"] = int(temp_disabled_until - time.time())
+            
+            result.append(key_copy)
+        return result
     
     def get_key_by_id(self, key_id: str) -> Optional[Dict[str, Any]]:
         """Get a key record by its ID."""
         with self._lock:  # Protect read with lock
-            for key in self.keys:
-                if key.get("id") == key_id:
-                    return key
-            return None
+            return self._id_index.get(key_id)
     
     def update_key(self, key_id: str, **kwargs) -> Optional[Dict[str, Any]]:
         """
@@ -255,21 +948,43 @@ class KeyManager:
             Updated key record, or None if not found
         """
         with self._lock:  # Protect update with lock
-            for key in self.keys:
-                if key.get("id") == key_id:
-                    # Apply provided fields
-                    for field, value in kwargs.items():
-                        if value is not None:
-                            if field == "is_enabled":
-                                key["available"] = value  # Keep 'available' in sync
-                            key[field] = value
-                    
-                    self._save_keys()
-                    logger.info(f"Updated API key: {key.get('name') or key_id}")
-                    return key
+            key = self._id_index.get(key_id)
+            if not key:
+                logger.warning(f"Key not found: {key_id}")
+                return None
             
-            logger.warning(f"Key not found: {key_id}")
-            return None
+            # Map API field names onto the stored record fields
+            field_map = {"key_value": "key", "rate_limit": "max_rpm"}
+            updates = {field_map.get(field, field): value for field, value in kwargs.items() if value is not None}
+            
+            # Changing the key value must not collide with another record
+            new_value = updates.get("key")
+            if new_value is not None:
+                other = self._find_key(new_value)
+                if other is not None and other is not key:
+                    raise ValueError("Another API key with the same value already exists")
+            
+            self._unindex_key(key)
+            # Apply provided fields
+            for field, value in updates.items():
+                if field == "is_enabled":
+                    key["available"] = value  # Keep 'available' in sync
+                    # An administrator's decision overrides the circuit breaker: a disabled key is not
+                    # re-enabled when its cooldown ends, an enabled one is back in the pool right away
+                    key["temp_disabled_until"] = None
+                key[field] = value
+            self._index_key(key)
+            
+            if "is_enabled" in updates:
+                self._coordinate("set_disabled", key_id, None if updates["is_enabled"] else float("inf"))
+                self._shared_wait_until.pop(key_id, None)
+                self._breakers.pop(key_id, None)
+            
+            self._invalidate_snapshot()
+            self._save_keys(key_id)
+            self._notify_waiters()
+            logger.info(f"Updated API key: {key.get('name') or key_id}")
+            return key
     
     def delete_key(self, key_id: str) -> bool:
         """
@@ -282,15 +997,46 @@ class KeyManager:
             True if deleted, False otherwise
         """
         with self._lock:  # Protect delete with lock
-            original_length = len(self.keys)
-            self.keys = [key for key in self.keys if key.get("id") != key_id]
+            if not self._remove_key(key_id):
+                return False
+        self._schedule_flush()
+        return True
+    
+    def delete_keys(self, key_ids: List[str]) -> int:
+        """
+        Delete several key records and persist them in one storage transaction.
+        
+        Args:
+            key_ids: Key IDs
             
-            # Persist if deletion happened
-            if len(self.keys) < original_length:
-                self._save_keys()
-                return True
-                
+        Returns:
+            Number of keys deleted
+        """
+        with self._lock:
+            deleted = sum(1 for key_id in key_ids if self._remove_key(key_id))
+        if deleted:
+            self.flush()
+        return deleted
+    
+    def _remove_key(self, key_id: str) -> bool:
+        """Remove a key record and its runtime state (caller holds the lock)."""
+        key = self._id_index.get(key_id)
+        if not key:
             return False
+        
+        self._unindex_key(key)
+        self._buckets.pop(key_id, None)
+        self._health.pop(key_id, None)
+        self._breakers.pop(key_id, None)
+        self._series.pop(key_id, None)
+        self.usage_stats.pop(key_id, None)
+        self._shared_wait_until.pop(key_id, None)
+        self._reservations.pop(self._normalize_key(key.get("key", "")), None)
+        self.keys = [k for k in self.keys if k is not key]
+        self._mark_deleted(key_id)
+        self._coordinate("forget", key_id)
+        self._invalidate_snapshot()
+        return True
     
     def batch_import_keys(self, keys_data: List[Dict[str, Any]]) -> Dict[str, int]:
         """
@@ -303,19 +1049,16 @@ class KeyManager:
             A summary dict with counts imported and skipped
         """
         with self._lock:  # Protect import with lock
-            imported_count = 0
+            imported_ids = []
             skipped_count = 0
             
-            # Gather existing key values
-            existing_keys = {key.get("key") for key in self.keys}
-            
             for key_data in keys_data:
                 key_value = key_data.get("key")
                 if not key_value:
                     continue
                     
                 # Skip if key already exists
-                if key_value in existing_keys:
+                if self._find_key(key_value):
                     skipped_count += 1
                     continue
                     
@@ -327,8 +1070,7 @@ class KeyManager:
                     "key": key_value,
                     "weight": key_data.get("weight", 1),
                     "max_rpm": key_data.get("rate_limit", 60),
-                    "requests": 0,
-                    "last_reset": time.time(),
+                    "max_concurrent": key_data.get("max_concurrent", 1),
                     "available": key_data.get("enabled", True),
                     "is_enabled": key_data.get("enabled", True),
                     "created_at": time.time(),
@@ -336,89 +1078,70 @@ class KeyManager:
                     "notes": key_data.get("notes")
                 }
                 self.keys.append(new_key)
-                existing_keys.add(key_value)  # Track in the existing set
+                self._index_key(new_key)
                 
                 # Initialize usage stats
-                self.usage_stats[key_id] = {
-                    "total_requests": 0,
-                    "successful_requests": 0,
-                    "failed_requests": 0,
-                    "daily_usage": {},
-                    "average_response_time": 0
-                }
+                self.usage_stats[key_id] = self._empty_usage_stats()
                 
-                imported_count += 1
+                imported_ids.append(key_id)
                 
-            # Persist keys
-            if imported_count > 0:
-                self._save_keys()
-                
-            return {
-                "imported": imported_count,
-                "skipped": skipped_count
-            }
+            if imported_ids:
+                self._invalidate_snapshot()
+                self._dirty_ids.update(imported_ids)
+                self._dirty = True
+                self._pending_changes += len(imported_ids)
+                self._notify_waiters()
+        
+        # Persist the whole import in one write
+        if imported_ids:
+            self.flush()
+            
+        return {
+            "imported": len(imported_ids),
+            "skipped": skipped_count
+        }
     
     def get_key(self) -> Optional[str]:
-        """Get the next available API key."""
+        """
+        Get the next available API key.
+        
+        One of the key's concurrency slots is claimed for the caller before the lock
+        is released, so concurrent callers cannot all pass the slot check of the same
+        key. The caller's task takes the slot over (mark_key_as_working); a caller that
+        ends up not submitting a task gives it back with release_reservation.
+        """
         with self._lock:  # Protect entire selection with lock
             if not self.keys:
                 logger.warning("No API keys available")
                 return None
                 
-            # Reset counters if needed
             current_time = time.time()
-            temporary_disabled_updated = False
+            reservation_id = f"{RESERVATION_PREFIX}{uuid.uuid4().hex}"
             
-            for key in self.keys:
-                # Re-enable temporarily disabled keys whose time has passed
-                if key.get("temp_disabled_until") and current_time > key.get("temp_disabled_until"):
-                    key["is_enabled"] = True
-                    key["available"] = True
-                    key["temp_disabled_until"] = None
-                    temporary_disabled_updated = True
-                    logger.info(f"Temporary disable lifted for key {key.get('name') or key.get('id')}")
-                    
-                if current_time - key["last_reset"] >= 60:
-                    key["requests"] = 0
-                    key["last_reset"] = current_time
-                    if not key.get("temp_disabled_until"):  # Only re-activate if not temp-disabled
-                        key["available"] = key.get("is_enabled", True)
-            
-            # Persist if any temp-disabled keys were updated
-            if temporary_disabled_updated:
-                self._save_keys()
-            
-            # Filter available keys, excluding those currently working
-            available_keys = []
-            for k in self.keys:
-                key_value = k.get("key", "")
-                clean_key = key_value.replace("Bearer ", "") if key_value.startswith("Bearer ") else key_value
-                
-                # Check if this key is in working set
-                is_working = clean_key in self._working_keys
-                
-                if k.get("available", False) and not is_working:
-                    available_keys.append(k)
+            # Temporary disables are lifted by the expiry thread; only eligible keys are considered.
+            # Power of two choices only needs two usable keys: check a random pair and scan the
+            # eligible set only if neither of them can take a request right now.
+            selected_key = None
+            if self.selection_strategy == STRATEGY_P2C_EWMA:
+                selected_key = self._select_from(self._eligible.sample(2), current_time, reservation_id)
+            if selected_key is None:
+                selected_key = self._select_from(self._eligible, current_time, reservation_id)
             
-            if not available_keys:
+            if selected_key is None:
                 logger.warning("No available keys (all are rate-limited, disabled, or currently in use)")
                 return None
-                
-            # Weighted random selection
-            weights = [k.get("weight", 1) for k in available_keys]
-            selected_idx = random.choices(range(len(available_keys)), weights=weights, k=1)[0]
-            selected_key = available_keys[selected_idx]
             
-            # Update usage counters
-            selected_key["requests"] += 1
+            # Consume a rate token, claim a slot and update usage
+            self._get_bucket(selected_key, current_time).try_acquire(current_time)
+            self._reserve_slot(selected_key, reservation_id, current_time)
+            breaker = self._breakers.get(selected_key["id"])
+            if breaker is not None:
+                breaker.on_dispatch(current_time)
             selected_key["last_used"] = current_time
+            self._snapshot_volatile = True
             
-            # Check and mark rate limit
-            if selected_key["requests"] >= selected_key.get("max_rpm", 60):
-                selected_key["available"] = False
-            
-            # Persist every time to ensure accuracy in concurrent environments
-            self._save_keys()
+            # Persist (deferred to the background flusher in write-behind mode)
+            self._save_keys(selected_key["id"])
             
             # Ensure returned key has the "Bearer " prefix
             key_value = selected_key["key"]
@@ -427,9 +1150,171 @@ class KeyManager:
             
             return key_value
     
+    def _is_selectable(self, key: Dict[str, Any], now: float) -> bool:
+        """Whether a key can take a request right now (caller holds the lock)."""
+        # Check if all concurrency slots of this key are taken
+        if not self._has_free_slot(key, now=now):
+            return False
+        
+        # Skip keys other worker processes exhausted recently
+        if self._shared_wait_until.get(key.get("id"), 0) > now:
+            return False
+        
+        # A half-open circuit lets a single trial request through
+        breaker = self._breakers.get(key.get("id"))
+        if breaker is not None and not breaker.allows_request(now):
+            return False
+        
+        return self._get_bucket(key, now).available(now) >= 1
+    
+    def _select_from(self, candidates, now: float, reservation_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Pick a usable key among candidates with the configured strategy (caller holds the lock).
+        
+        Args:
+            candidates: Eligible key records to choose from
+            now: Current time
+            reservation_id: Slot ID claimed in the coordinator for the chosen key
+            
+        Returns:
+            The chosen key record, or None if no candidate can be used
+        """
+        available_keys = [k for k in candidates if self._is_selectable(k, now)]
+        while available_keys:
+            # Pick a key with the configured strategy
+            if self.selection_strategy == STRATEGY_P2C_EWMA:
+                candidate = select_p2c(available_keys, self._selection_cost)
+            else:
+                candidate = select_weighted(available_keys)
+            
+            # Take the key's token in the state shared with other workers (always granted in-process)
+            wait = self._acquire_shared(candidate, now, reservation_id)
+            if wait <= 0:
+                return candidate
+            # Re-check at least every SHARED_RECHECK_SECONDS in case another worker re-enables it
+            self._shared_wait_until[candidate["id"]] = now + min(wait, SHARED_RECHECK_SECONDS)
+            available_keys.remove(candidate)
+        return None
+    
+    async def acquire_key(self, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Get an available API key, waiting in a FIFO queue if none is available.
+        
+        Only the caller at the head of the queue tries to take a key, so keys are
+        handed out in arrival order. The head is woken when a key is released or
+        enabled, and otherwise sleeps until the next rate-limit refill.
+        
+        Args:
+            timeout: Max seconds to wait (None waits indefinitely)
+            
+        Returns:
+            Key value with Bearer prefix, or None if the timeout expired
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        
+        with self._lock:
+            # Fast path: nobody is queued ahead of us
+            if not self._waiters:
+                key = self.get_key()
+                if key:
+                    return key
+            waiter = _KeyWaiter(loop)
+            self._waiters.append(waiter)
+            
+        try:
+            while True:
+                # Clear before checking so a wake-up between the check and the wait is not lost
+                waiter.event.clear()
+                wait = None
+                with self._lock:
+                    is_head = self._waiters[0] is waiter
+                    if is_head:
+                        key = self.get_key()
+                        if key:
+                            return key
+                
+                if is_head:
+                    # Sleep until the next rate refill (unless woken earlier)
+                    retry_after = self.get_retry_after()
+                    if retry_after is not None:
+                        wait = max(0.05, retry_after)
+                if deadline is not None:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        logger.warning(f"Timed out waiting for an available key after {timeout} seconds")
+                        return None
+                    wait = remaining if wait is None else min(wait, remaining)
+                
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._lock:
+                was_head = self._waiters and self._waiters[0] is waiter
+                self._waiters.remove(waiter)
+                # Let the next caller try for a key
+                if was_head and self._waiters:
+                    self._waiters[0].wake()
+    
+    def _notify_waiters(self) -> None:
+        """Wake the caller at the head of the acquire_key queue."""
+        with self._lock:
+            if self._waiters:
+                self._waiters[0].wake()
+    
+    def get_next_available_time(self) -> Optional[float]:
+        """
+        Get the earliest timestamp at which any enabled key can be handed out.
+        
+        Considers token bucket refills and temporary disables. Keys whose concurrency
+        slots are all taken are skipped because their release time is unknown.
+        
+        Returns:
+            Unix timestamp (now if a key is available), or None if no key will become available
+        """
+        with self._lock:
+            current_time = time.time()
+            earliest = None
+            for k in self.keys:
+                temp_disabled_until = k.get("temp_disabled_until")
+                if temp_disabled_until and temp_disabled_until > current_time:
+                    candidate = temp_disabled_until
+                elif k.get("is_enabled", True):
+                    if not self._has_free_slot(k, now=current_time):
+                        continue
+                    breaker = self._breakers.get(k.get("id"))
+                    if breaker is not None and not breaker.allows_request(current_time):
+                        # Waiting for the outcome of a half-open trial
+                        continue
+                    candidate = current_time + self._get_bucket(k, current_time).time_until_available(current_time)
+                    candidate = max(candidate, self._shared_wait_until.get(k.get("id"), 0))
+                else:
+                    continue
+                
+                if earliest is None or candidate < earliest:
+                    earliest = candidate
+            return earliest
+    
+    def get_retry_after(self) -> Optional[float]:
+        """
+        Seconds until a key is expected to become available.
+        
+        Returns:
+            Seconds to wait (0 if a key is available now), or None if unknown
+        """
+        next_time = self.get_next_available_time()
+        if next_time is None or next_time == float("inf"):
+            return None
+        return max(0.0, next_time - time.time())
+    
     def record_request_result(self, key: str, success: bool, response_time: float = 0) -> None:
         """
-        Record the result of a request.
+        Record the result of an API request in the key's usage statistics.
+        
+        Upstream outcomes that drive key selection and the circuit breaker are
+        recorded with record_generation_result.
         
         Args:
             key: API key value
@@ -441,18 +1326,10 @@ class KeyManager:
             return
             
         with self._lock:  # Protect recording with lock
-            # Strip optional Bearer prefix
-            key_for_search = key.replace("Bearer ", "") if key.startswith("Bearer ") else key
-            
-            # Find the matching key ID
-            key_id = None
-            key_info = None
-            for k in self.keys:
-                stored_key = k.get("key", "").replace("Bearer ", "") if k.get("key", "").startswith("Bearer ") else k.get("key", "")
-                if stored_key == key_for_search:
-                    key_id = k.get("id")
-                    key_info = k
-                    break
+            # Find the matching key record
+            key_for_search = self._normalize_key(key)
+            key_info = self._key_index.get(key_for_search)
+            key_id = key_info.get("id") if key_info else None
             
             if not key_id:
                 logger.warning(f"Failed to record request result: key not found {key_for_search[:6]}...")
@@ -460,13 +1337,7 @@ class KeyManager:
             
             # Initialize usage_stats if missing
             if key_id not in self.usage_stats:
-                self.usage_stats[key_id] = {
-                    "total_requests": 0,
-                    "successful_requests": 0,
-                    "failed_requests": 0,
-                    "daily_usage": {},
-                    "average_response_time": 0
-                }
+                self.usage_stats[key_id] = self._empty_usage_stats()
             
             # Update request counters
             stats = self.usage_stats[key_id]
@@ -491,31 +1362,54 @@ class KeyManager:
                     else: # Should not happen
                         stats["average_response_time"] = response_time
             
-            # Record daily usage
-            today = time.strftime("%Y-%m-%d")
-            if today not in stats["daily_usage"]:
-                stats["daily_usage"][today] = {"successful": 0, "failed": 0} # Initialize
-            
-            # Update today's counters
-            if success:
-                stats["daily_usage"][today]["successful"] += 1
-            else:
-                stats["daily_usage"][today]["failed"] += 1
-            
-            # Keep the last 30 days
-            if len(stats["daily_usage"]) > 30:
-                # Remove the oldest date
-                sorted_dates = sorted(stats["daily_usage"].keys())
-                if sorted_dates: # Ensure not empty
-                    oldest_date = sorted_dates[0]
-                    del stats["daily_usage"][oldest_date]
+            # Record per-minute/per-day counts and the latency histogram
+            now = time.time()
+            self._get_series(key_id).record(success, response_time, now)
+            self._snapshot_volatile = True
             
             # Update key's last used timestamp
             if key_info and "last_used" in key_info:
-                key_info["last_used"] = time.time()
+                key_info["last_used"] = now
             
-            # Persist every time to ensure accuracy in concurrent environments
-            self._save_keys()
+            # Persist (deferred to the background flusher in write-behind mode)
+            self._save_keys(key_id)
+    
+    def record_generation_result(self, key: str, success: bool, duration: float = 0) -> None:
+        """
+        Record the outcome of an upstream attempt (task, submission or upload) made with a key.
+        
+        Feeds latency-aware key selection and the key's circuit breaker, which opens
+        once the failure rate in its window crosses the threshold or a half-open
+        trial fails.
+        
+        Args:
+            key: API key value (may include Bearer prefix)
+            success: Whether the attempt succeeded
+            duration: Seconds from submission to result (0 if unknown)
+        """
+        if not key:
+            return
+            
+        with self._lock:
+            key_info = self._find_key(key)
+            if not key_info:
+                return
+            now = time.time()
+            self._get_health(key_info.get("id")).observe(success, duration)
+            self._snapshot_volatile = True
+            self._feed_breaker(key_info, success, now)
+    
+    def _feed_breaker(self, key_info: Dict[str, Any], success: bool, now: float) -> None:
+        """Record an upstream outcome in a key's circuit breaker (caller holds the lock)."""
+        key_id = key_info["id"]
+        breaker = self._get_breaker(key_id)
+        was_half_open = breaker.state == STATE_HALF_OPEN
+        if breaker.record(success, now):
+            self._open_circuit(key_info, breaker.open_until)
+        elif was_half_open and success:
+            logger.info(f"Trial request of key {key_info.get('name') or key_id} succeeded, circuit closed")
+            self._invalidate_snapshot()
+            self._notify_waiters()
     
     def get_usage_stats(self) -> Dict[str, Any]:
         """Get aggregated usage statistics."""
@@ -534,20 +1428,33 @@ class KeyManager:
             avg_response_times = [stats.get("average_response_time", 0) for stats in self.usage_stats.values() if stats.get("average_response_time", 0) > 0]
             overall_avg_response_time = sum(avg_response_times) / len(avg_response_times) if avg_response_times else 0
             
-            # Aggregate usage over the past 7 days
+            # Aggregate the ring buffers: past 7 days, last hour and the latency histogram
+            now = time.time()
             past_7_days = {}
-            for key_id, stats in self.usage_stats.items():
-                daily_usage = stats.get("daily_usage", {})
-                for date, count_data in daily_usage.items():
-                    if date not in past_7_days:
-                        past_7_days[date] = {"successful": 0, "failed": 0}
-                    # Sum counts from dict entries
-                    past_7_days[date]["successful"] += count_data.get("successful", 0)
-                    past_7_days[date]["failed"] += count_data.get("failed", 0)
-                    
-            # Keep last 7 days
-            dates = sorted(past_7_days.keys(), reverse=True)[:7]
-            past_7_days = {date: past_7_days[date] for date in dates}
+            past_hour = {}
+            latency_hist = [0] * len(LATENCY_BUCKETS)
+            keys_stats = {}
+            for key in self.keys:
+                key_id = key.get("id")
+                series = self._series.get(key_id)
+                if series is None:
+                    continue
+                for date, count_data in series.daily_counts(7, now).items():
+                    day = past_7_days.setdefault(date, {"successful": 0, "failed": 0})
+                    day["successful"] += count_data["successful"]
+                    day["failed"] += count_data["failed"]
+                for minute, successful, failed in series.minute_counts(60, now):
+                    slot = past_hour.setdefault(minute, {"successful": 0, "failed": 0})
+                    slot["successful"] += successful
+                    slot["failed"] += failed
+                key_hist = series.latency_histogram(now)
+                for i, count in enumerate(key_hist):
+                    latency_hist[i] += count
+                keys_stats[key_id] = {
+                    "name": key.get("name", ""),
+                    **self.usage_stats.get(key_id, {}),
+                    **self._percentiles(key_hist)
+                }
             
             return {
                 "total_keys": total_keys,
@@ -558,34 +1465,97 @@ class KeyManager:
                 "failed_requests": total_requests - successful_requests,
                 "success_rate": success_rate,
                 "average_response_time": overall_avg_response_time,
-                "past_7_days": past_7_days
-            } 
+                **self._percentiles(latency_hist),
+                "past_7_days": dict(sorted(past_7_days.items(), reverse=True)),
+                "past_hour": {
+                    time.strftime("%H:%M", time.localtime(minute * 60)): past_hour[minute]
+                    for minute in sorted(past_hour)
+                },
+                "keys": keys_stats
+            }
+    
+    @staticmethod
+    def _percentiles(hist) -> Dict[str, Optional[float]]:
+        """p50/p95/p99 latency in seconds estimated from a latency histogram."""
+        result = {}
+        for q in (50, 95, 99):
+            value = percentile_from_histogram(hist, q)
+            result[f"p{q}_response_time"] = round(value, 3) if value is not None else None
+        return result
 
     def mark_key_as_working(self, key: str, task_id: str) -> None:
         """
-        Mark a key as currently in use for a task.
+        Mark a key as currently in use for a task, taking one of its concurrency slots.
+        
+        The task takes over a slot get_key reserved on the key, if any; otherwise
+        (e.g. a key chosen by the caller) it claims a new one.
         
         Args:
             key: API key value (may include Bearer prefix)
             task_id: Associated task ID
         """
         with self._lock:
-            clean_key = key.replace("Bearer ", "") if key.startswith("Bearer ") else key
-            self._working_keys[clean_key] = task_id
+            clean_key = self._normalize_key(key)
+            self._pop_reservation(clean_key)
+            self._working_keys.setdefault(clean_key, set()).add(task_id)
+            self._snapshot_volatile = True
+            key_info = self._key_index.get(clean_key)
+            if key_info:
+                self._coordinate("claim_slot", key_info["id"], task_id)
             logger.debug(f"Key marked as working, task ID: {task_id}")
     
-    def release_key(self, key: str) -> None:
+    def release_key(self, key: str, task_id: Optional[str] = None) -> None:
         """
-        Release a key from working state.
+        Release a key's concurrency slot.
         
         Args:
             key: API key value (may include Bearer prefix)
+            task_id: Task whose slot to release; if None, an arbitrary slot is released
         """
         with self._lock:
-            clean_key = key.replace("Bearer ", "") if key.startswith("Bearer ") else key
-            if clean_key in self._working_keys:
+            clean_key = self._normalize_key(key)
+            tasks = self._working_keys.get(clean_key)
+            if not tasks:
+                return
+            
+            if task_id is None:
+                task_id = tasks.pop()
+            elif task_id in tasks:
+                tasks.remove(task_id)
+            else:
+                return
+            
+            if not tasks:
                 del self._working_keys[clean_key]
-                logger.debug(f"Key released")
+            self._snapshot_volatile = True
+            key_info = self._key_index.get(clean_key)
+            if key_info:
+                self._coordinate("release_slot", key_info["id"], task_id)
+            logger.debug(f"Key released")
+            self._notify_waiters()
+    
+    def release_reservation(self, key: str, refund: bool = False) -> None:
+        """
+        Give back a slot get_key reserved, for a caller that will not submit a task with the key.
+        
+        Callers that submit a task need not call this: mark_key_as_working takes the slot over.
+        
+        Args:
+            key: API key value (may include Bearer prefix)
+            refund: Also return the rate token get_key consumed, for a caller that never
+                sent a request with the key
+        """
+        with self._lock:
+            clean_key = self._normalize_key(key)
+            if self._pop_reservation(clean_key) is None:
+                return
+            if refund:
+                key_info = self._key_index.get(clean_key)
+                bucket = self._buckets.get(key_info["id"]) if key_info else None
+                if bucket is not None:
+                    bucket.refund()
+            self._snapshot_volatile = True
+            self._notify_waiters()
     
     def is_key_working(self, key: str) -> bool:
         """
@@ -598,81 +1568,53 @@ class KeyManager:
             bool: Whether the key is working
         """
         with self._lock:
-            clean_key = key.replace("Bearer ", "") if key.startswith("Bearer ") else key
+            clean_key = self._normalize_key(key)
             return clean_key in self._working_keys
 
-    def mark_key_invalid(self, key: str) -> Optional[str]:
+    def trip_key_circuit(self, key: str) -> bool:
         """
-        Mark the given key as invalid (temporarily disabled) and return a new available key.
+        Open a key's circuit right away after a definite failure (e.g. rejected credentials).
         
         Args:
             key: API key value (may include Bearer prefix)
             
         Returns:
-            Optional[str]: A new available key, or None if none available
+            bool: Whether the key was found
         """
-        # Use temporary disable with a 24-hour window
-        return self.mark_key_temp_disabled(key, hours=24.0)
-        
-    def mark_key_temp_disabled(self, key: str, hours: float = 12.0) -> Optional[str]:
+        with self._lock:
+            key_info = self._find_key(key)
+            if not key_info:
+                return False
+            self._trip_circuit(key_info)
+            return True
+    
+    def mark_key_invalid(self, key: str) -> Optional[str]:
         """
-        Temporarily disable the given key for a specified number of hours, and return a new available key.
+        Mark the given key as invalid and return a new available key.
+        
+        Opens the key's circuit right away, so it is meant for definite failures such
+        as rejected credentials; other failures go through record_generation_result
+        and open the circuit only at the configured failure rate. The cooldown starts
+        short and doubles with every consecutive opening.
         
         Args:
             key: API key value (may include Bearer prefix)
-            hours: Number of hours to disable
             
         Returns:
             Optional[str]: A new available key, or None if none available
         """
-        with self._lock:  # Protect temp-disable with lock
-            # Strip optional Bearer prefix
-            key_for_search = key.replace("Bearer ", "") if key.startswith("Bearer ") else key
-            
-            # If the key is currently working, skip disabling
-            if key_for_search in self._working_keys:
-                logger.warning(f"Attempted to disable a key that is currently in use (task ID: {self._working_keys[key_for_search]}), skipping disable")
-                # Return a new key without disabling the current one
-                new_key = self.get_key()
-                if new_key:
-                    logger.info(f"Returned a new key but did not disable the working key")
-                    return new_key
-                else:
-                    logger.warning("No backup keys available")
-                    return None
-            
-            # Find the matching key record
-            key_found = False
-            disabled_key_id = None
-            for key_info in self.keys:
-                stored_key = key_info.get("key", "").replace("Bearer ", "") if key_info.get("key", "").startswith("Bearer ") else key_info.get("key", "")
-                if stored_key == key_for_search:
-                    # Mark as temporarily disabled
-                    disabled_until = time.time() + (hours * 3600)  # Current time + hours
-                    key_info["available"] = False
-                    key_info["temp_disabled_until"] = disabled_until
-                    key_info["notes"] = (key_info.get("notes") or "") + f"\n[Auto] Temporarily disabled for {hours} hours at {time.strftime('%Y-%m-%d %H:%M:%S')}"
-                    key_found = True
-                    disabled_key_id = key_info.get("id")
-                    logger.warning(f"Key {key_info.get('name') or key_info.get('id')} temporarily disabled for {hours} hours")
-                    break
-            
-            if key_found:
-                # Persist changes
-                self._save_keys()
-                
-                # Get a new key
-                new_key = self.get_key()
-                if new_key:
-                    logger.info(f"Automatically switched to a new key")
-                    return new_key
-                else:
-                    logger.warning("No backup keys available")
-                    return None
-            else:
-                logger.warning(f"Key to temporarily disable not found")
+        with self._lock:
+            if not self.trip_key_circuit(key):
+                logger.warning(f"Key to mark invalid not found")
                 return None
             
+            new_key = self.get_key()
+            if new_key:
+                logger.info(f"Automatically switched to a new key")
+            else:
+                logger.warning("No backup keys available")
+            return new_key
+        
     def retry_request(self, original_key: str, request_func: Callable, max_retries: int = 1, 
                      max_key_switches: int = 3) -> Tuple[bool, Any, str]:
         """
@@ -686,6 +1628,9 @@ class KeyManager:
             
         Returns:
             Tuple[bool, Any, str]: (success, result, used_key)
+        
+        The slot get_key reserves on each switched-to key is given back once the
+        key's attempts are over; request_func must not keep using the key afterwards.
         """
         current_key = original_key
         current_key_switches = 0
@@ -709,7 +1654,8 @@ class KeyManager:
                 time.sleep(1)
                 
         # After exhausting retries with the original key, attempt to switch keys
-        tried_keys = set([current_key.replace("Bearer ", "") if current_key.startswith("Bearer ") else current_key])
+        tried_keys = set([self._normalize_key(current_key)])
+        skipped = 0
         
         while current_key_switches < max_key_switches:
             # Obtain a new key
@@ -720,8 +1666,14 @@ class KeyManager:
                 break
                 
             # Ensure we don't reuse tried keys
-            clean_new_key = new_key.replace("Bearer ", "") if new_key.startswith("Bearer ") else new_key
+            clean_new_key = self._normalize_key(new_key)
             if clean_new_key in tried_keys:
+                # Never used: give back the slot and the rate token
+                self.release_reservation(new_key, refund=True)
+                skipped += 1
+                if skipped > len(self.keys):
+                    logger.warning("Only already tried API keys are available")
+                    break
                 continue
                 
             tried_keys.add(clean_new_key)
@@ -738,6 +1690,7 @@ class KeyManager:
                         # Record success
                         with self._lock:
                             self.record_request_result(current_key, True)
+                        self.release_reservation(current_key)
                         return True, result, current_key
                     logger.warning(f"Request failed with new key (attempt {attempt+1}/{max_retries+1}): {result}")
                 except Exception as e:
@@ -746,6 +1699,9 @@ class KeyManager:
                 # If not the last attempt, wait one second before retrying
                 if attempt < max_retries:
                     time.sleep(1)
+            
+            # The key's requests were sent, so only the slot is given back
+            self.release_reservation(current_key)
         
         # All attempts failed; consider temporarily disabling the original key.
         # In concurrent environments, failures may be due to network/service issues rather than the key itself.
@@ -755,9 +1711,11 @@ class KeyManager:
         # TODO: Add heuristics to determine if disable is warranted
         
         if should_disable:
-            logger.error(f"All retries and key-switch attempts failed; temporarily disabling the original key")
+            logger.error(f"All retries and key-switch attempts failed; opening the circuit of the original key")
             with self._lock:
-                self.mark_key_temp_disabled(original_key, hours=6.0)  # Shorter window to avoid resource waste
+                key_info = self._find_key(original_key)
+                if key_info:
+                    self._trip_circuit(key_info)
         else:
             logger.warning(f"All retries and key-switch attempts failed, but likely a service issue; not disabling key")
         
@@ -765,11 +1723,39 @@ class KeyManager:
         return False, result, current_key
 
 # Create global key manager instance
-storage_file = os.getenv("KEYS_STORAGE_FILE", "api_keys.json")
+storage_file = Config.KEYS_STORAGE_FILE
 # Use absolute path if provided; otherwise resolve relative to base dir
 if not os.path.isabs(storage_file):
     base_dir = os.getenv("BASE_DIR", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     storage_file = os.path.join(base_dir, storage_file)
 
-key_manager = KeyManager(storage_file=storage_file)
+sqlite_file = Config.KEYS_SQLITE_FILE
+if not os.path.isabs(sqlite_file):
+    sqlite_file = os.path.join(os.path.dirname(storage_file), sqlite_file)
+
+coordination_file = Config.KEY_COORDINATION_FILE
+if not os.path.isabs(coordination_file):
+    coordination_file = os.path.join(os.path.dirname(storage_file), coordination_file)
+
+key_manager = KeyManager(
+    storage_file=storage_file,
+    storage=create_storage(Config.KEYS_STORAGE_BACKEND, storage_file, sqlite_file),
+    coordinator=create_coordinator(Config.KEY_COORDINATION, coordination_file, slot_ttl=Config.KEY_SLOT_TTL),
+    persist_mode=Config.KEYS_PERSIST_MODE,
+    flush_interval=Config.KEYS_FLUSH_INTERVAL,
+    flush_batch_size=Config.KEYS_FLUSH_BATCH_SIZE,
+    rate_burst_seconds=Config.KEY_RATE_BURST_SECONDS,
+    selection_strategy=Config.KEY_SELECTION_STRATEGY,
+    ewma_alpha=Config.KEY_EWMA_ALPHA,
+    snapshot_max_age=Config.KEY_SNAPSHOT_MAX_AGE,
+    breaker_options={
+        "failure_ratio": Config.KEY_BREAKER_FAILURE_RATIO,
+        "min_requests": Config.KEY_BREAKER_MIN_REQUESTS,
+        "window": Config.KEY_BREAKER_WINDOW,
+        "base_cooldown": Config.KEY_BREAKER_BASE_COOLDOWN,
+        "max_cooldown": Config.KEY_BREAKER_MAX_COOLDOWN,
+        "trial_timeout": Config.KEY_BREAKER_TRIAL_TIMEOUT
+    }
+)
+logger.info(f"Initialized global KeyManager, storage file: {storage_file}")
 logger.info(f"Initialized global KeyManager, storage file: {storage_file}")
\ No newline at end of file
@@ -0,0 +1,101 @@
+import asyncio
+import random
+import logging
+from typing import Optional
+
+from .config import Config
+from .key_manager import key_manager
+
+# Initialize logger
+logger = logging.getLogger("sora-api.key_prober")
+
+class KeyProber:
+    """
+    Background health prober for temporarily disabled keys.
+
+    Every `interval` seconds it runs the Sora connection test against each
+    temporarily disabled key, at most `concurrency` at a time and each after a
+    random delay of up to `jitter` seconds, so probes do not hit upstream in a
+    burst. Keys that pass are put back into the pool before their disable expires.
+    """
+
+    def __init__(self, interval: float = 300.0, concurrency: int = 3, jitter: float = 30.0):
+        self.interval = max(1.0, float(interval))
+        self.concurrency = max(1, int(concurrency))
+        self.jitter = max(0.0, float(jitter))
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start probing on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(f"Key health prober started (interval={self.interval}s, concurrency={self.concurrency}, jitter={self.jitter}s)")
+
+    async def stop(self) -> None:
+        """Cancel the probe loop and wait for it to finish."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.probe_once()
+            except Exception as e:
+                logger.error(f"Key health probe round failed: {str(e)}", exc_info=True)
+
+    async def probe_once(self) -> int:
+        """
+        Probe every temporarily disabled key once.
+
+        Returns:
+            Number of keys restored to the pool
+        """
+        candidates = key_manager.get_probe_candidates()
+        if not candidates:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def probe(key_value: str) -> bool:
+            await asyncio.sleep(random.uniform(0, self.jitter))
+            async with semaphore:
+                return await self._probe_key(key_value)
+
+        results = await asyncio.gather(*(probe(key) for key in candidates))
+        restored = sum(1 for ok in results if ok)
+        logger.info(f"Key health probe: {restored}/{len(candidates)} disabled keys restored")
+        return restored
+
+    async def _probe_key(self, key_value: str) -> bool:
+        """Test one key without switching keys on failure; restore it if the test passes."""
+        from .sora_integration import SoraClient
+
+        client = SoraClient(
+            proxy_host=Config.PROXY_HOST if Config.PROXY_HOST and Config.PROXY_HOST.strip() else None,
+            proxy_port=Config.PROXY_PORT if Config.PROXY_PORT and Config.PROXY_PORT.strip() else None,
+            proxy_user=Config.PROXY_USER if Config.PROXY_USER and Config.PROXY_USER.strip() else None,
+            proxy_pass=Config.PROXY_PASS if Config.PROXY_PASS and Config.PROXY_PASS.strip() else None,
+            auth_token=key_value if key_value.startswith("Bearer ") else f"Bearer {key_value}"
+        )
+        try:
+            result = await client.test_connection(switch_on_failure=False)
+        except Exception as e:
+            logger.debug(f"Key health probe failed: {str(e)}")
+            return False
+
+        if result.get("status") != "success":
+            return False
+        return key_manager.restore_key(key_value)
+
+# Global prober, started by the application when KEY_PROBE_ENABLED is set
+key_prober = KeyProber(
+    interval=Config.KEY_PROBE_INTERVAL,
+    concurrency=Config.KEY_PROBE_CONCURRENCY,
+    jitter=Config.KEY_PROBE_JITTER
+)
@@ -0,0 +1,109 @@
+import random
+from typing import Dict, List, Any, Optional, Callable
+
+# Selection strategies supported by KeyManager.get_key
+STRATEGY_WEIGHTED = "weighted"  # Weighted random over the static 'weight' field
+STRATEGY_P2C_EWMA = "p2c_ewma"  # Power of two choices over EWMA latency and failure rate
+
+# How strongly recent failures inflate a key's expected cost
+FAILURE_PENALTY = 5.0
+
+class KeyHealth:
+    """
+    Exponentially weighted moving averages of a key's end-to-end latency and failure rate.
+
+    Unlike a cumulative mean these track the key's recent behaviour, so a key that
+    slows down or starts failing loses traffic within a few requests.
+    """
+
+    __slots__ = ("alpha", "latency", "failure_rate", "samples")
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.latency: Optional[float] = None  # Seconds; None until the first sample
+        self.failure_rate = 0.0  # 0.0 - 1.0
+        self.samples = 0
+
+    def observe(self, success: bool, latency: float = 0) -> None:
+        """Fold one request outcome into the moving averages."""
+        self.samples += 1
+        self.failure_rate += self.alpha * ((0.0 if success else 1.0) - self.failure_rate)
+        if latency > 0:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self.alpha * (latency - self.latency)
+
+    def cost(self, weight: float = 1, in_flight: int = 0, default_latency: float = 0) -> float:
+        """
+        Expected cost of sending one more request to this key (lower is better).
+
+        Latency is scaled by the number of tasks already running on the key, inflated
+        by the failure rate and divided by the configured weight.
+        """
+        latency = self.latency if self.latency is not None else default_latency
+        return latency * (in_flight + 1) * (1 + FAILURE_PENALTY * self.failure_rate) / max(weight, 1e-6)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Summary used by the admin API."""
+        return {
+            "latency_ewma": round(self.latency, 3) if self.latency is not None else None,
+            "failure_rate_ewma": round(self.failure_rate, 4),
+            "samples": self.samples
+        }
+
+class EligibleKeys:
+    """
+    Set of key records with O(1) add, remove and random sampling.
+
+    Records live in a list with a key ID -> position index; removing a record
+    moves the last one into its place, so sampling never scans the pool.
+    """
+
+    __slots__ = ("_records", "_positions")
+
+    def __init__(self):
+        self._records: List[Dict[str, Any]] = []
+        self._positions: Dict[str, int] = {}
+
+    def add(self, key: Dict[str, Any]) -> None:
+        position = self._positions.get(key["id"])
+        if position is None:
+            self._positions[key["id"]] = len(self._records)
+            self._records.append(key)
+        else:
+            self._records[position] = key
+
+    def discard(self, key_id: str) -> None:
+        position = self._positions.pop(key_id, None)
+        if position is None:
+            return
+        last = self._records.pop()
+        if position < len(self._records):
+            self._records[position] = last
+            self._positions[last["id"]] = position
+
+    def sample(self, count: int) -> List[Dict[str, Any]]:
+        """Up to `count` distinct records chosen at random."""
+        return random.sample(self._records, min(count, len(self._records)))
+
+    def __contains__(self, key_id: str) -> bool:
+        return key_id in self._positions
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+def select_weighted(candidates: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Pick a key at random, proportionally to its 'weight'."""
+    weights = [k.get("weight", 1) for k in candidates]
+    return random.choices(candidates, weights=weights, k=1)[0]
+
+def select_p2c(candidates: List[Dict[str, Any]], cost: Callable[[Dict[str, Any]], float]) -> Dict[str, Any]:
+    """Pick two distinct keys at random and return the one with the lower cost."""
+    if len(candidates) == 1:
+        return candidates[0]
+    first, second = random.sample(candidates, 2)
+    return first if cost(first) <= cost(second) else second
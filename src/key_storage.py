@@ -0,0 +1,311 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Any, Optional, Tuple
+
+# Initialize logger
+logger = logging.getLogger("sora-api.key_storage")
+
+# Supported storage backends
+BACKEND_JSON = "json"  # Single JSON document, rewritten on every flush
+BACKEND_SQLITE = "sqlite"  # One row per key in a WAL-mode SQLite database
+
+# Usage counters stored as real columns so they can be updated per row
+COUNTER_FIELDS = ("total_requests", "successful_requests", "failed_requests", "average_response_time")
+
+class KeyStorage(ABC):
+    """
+    Storage backend of the KeyManager.
+
+    The manager hands over either the full state document
+    ({'keys': [...], 'usage_stats': {...}, 'usage_series': {...}}) or, for
+    incremental backends, only the rows of keys that changed since the last flush.
+    A row is {'id', 'key' (the key record), 'usage_stats', 'usage_series'}.
+    """
+
+    # Whether write_changes is supported; otherwise the manager always calls write_full
+    incremental = False
+
+    @abstractmethod
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Load the full state document, or None if the storage is empty."""
+
+    @abstractmethod
+    def write_full(self, data: Dict[str, Any]) -> int:
+        """
+        Replace the stored state with the given document.
+
+        Returns:
+            Version stamped on the written rows (0 if the backend is not versioned)
+        """
+
+    @abstractmethod
+    def write_changes(self, rows: List[Dict[str, Any]], deleted_ids: List[str]) -> int:
+        """Upsert the given rows and delete the given key IDs in one transaction; returns the version."""
+
+    def current_version(self) -> int:
+        """Latest version written by any process (0 if the backend is not versioned)."""
+        return 0
+
+    def load_changes(self, since: int) -> Tuple[List[Dict[str, Any]], List[str], int]:
+        """
+        Read rows changed by any process after the given version.
+
+        Returns:
+            (changed rows, deleted key IDs, new version watermark)
+        """
+        return [], [], since
+
+    def close(self) -> None:
+        """Release backend resources."""
+        pass
+
+class JsonKeyStorage(KeyStorage):
+    """The original single-file format, written atomically via a temp file and rename."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            logger.warning(f"Key storage file does not exist: {self.path}")
+            return None
+        logger.info(f"Attempting to load keys from file: {self.path}")
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def write_full(self, data: Dict[str, Any]) -> int:
+        payload = json.dumps(data, ensure_ascii=False)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(prefix=".api_keys.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return 0
+
+    def write_changes(self, rows: List[Dict[str, Any]], deleted_ids: List[str]) -> int:
+        # A JSON file can only be rewritten whole: merge the rows into the stored document
+        data = self.load() or {}
+        merged = {row["id"]: row for row in document_to_rows(data)}
+        for key_id in deleted_ids:
+            merged.pop(key_id, None)
+        for row in rows:
+            merged[row["id"]] = row
+        return self.write_full(rows_to_document(list(merged.values())))
+
+class SqliteKeyStorage(KeyStorage):
+    """
+    One row per key in a SQLite database running in WAL mode.
+
+    Flushes only touch the rows of keys that changed, inside a single transaction, so
+    there are no whole-file rewrites and readers in other processes never see a torn
+    state. Every write transaction bumps a global version stored on the rows it
+    touches, which lets other processes on the same host pull just what changed.
+    """
+
+    incremental = True
+
+    def __init__(self, path: str, busy_timeout: float = 5.0):
+        self.path = path
+        self._local = threading.local()
+        self._busy_timeout = busy_timeout
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Per-thread connection (sqlite3 connections must not be shared across threads)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self._busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _init_schema(self) -> None:
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS api_keys (
+                id TEXT PRIMARY KEY,
+                record TEXT NOT NULL,
+                total_requests INTEGER NOT NULL DEFAULT 0,
+                successful_requests INTEGER NOT NULL DEFAULT 0,
+                failed_requests INTEGER NOT NULL DEFAULT 0,
+                average_response_time REAL NOT NULL DEFAULT 0,
+                usage_series TEXT,
+                version INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_api_keys_version ON api_keys(version);
+            CREATE TABLE IF NOT EXISTS deleted_keys (
+                id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO meta (name, value) VALUES ('version', 0);
+        """)
+
+    def _begin(self, conn: sqlite3.Connection) -> int:
+        """Start a write transaction and return the version it will stamp on rows."""
+        # IMMEDIATE takes the write lock up front so concurrent writers queue on busy_timeout
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'version'")
+        return conn.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()[0]
+
+    def _upsert(self, conn: sqlite3.Connection, rows: List[Dict[str, Any]], version: int, now: float) -> None:
+        params = []
+        for row in rows:
+            stats = row.get("usage_stats") or {}
+            params.append((
+                row["id"],
+                json.dumps(row["key"], ensure_ascii=False),
+                *(stats.get(field, 0) for field in COUNTER_FIELDS),
+                json.dumps(row["usage_series"]) if row.get("usage_series") else None,
+                version,
+                now
+            ))
+        conn.executemany("""
+            INSERT INTO api_keys (id, record, total_requests, successful_requests, failed_requests,
+                                  average_response_time, usage_series, version, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                record = excluded.record,
+                total_requests = excluded.total_requests,
+                successful_requests = excluded.successful_requests,
+                failed_requests = excluded.failed_requests,
+                average_response_time = excluded.average_response_time,
+                usage_series = excluded.usage_series,
+                version = excluded.version,
+                updated_at = excluded.updated_at
+        """, params)
+        conn.executemany("DELETE FROM deleted_keys WHERE id = ?", [(row["id"],) for row in rows])
+
+    def _delete(self, conn: sqlite3.Connection, deleted_ids: List[str], version: int) -> None:
+        conn.executemany("DELETE FROM api_keys WHERE id = ?", [(key_id,) for key_id in deleted_ids])
+        conn.executemany("INSERT OR REPLACE INTO deleted_keys (id, version) VALUES (?, ?)",
+                         [(key_id, version) for key_id in deleted_ids])
+
+    @staticmethod
+    def _row_to_dict(row: Tuple) -> Dict[str, Any]:
+        key_id, record, total, successful, failed, avg_time, series, version = row
+        return {
+            "id": key_id,
+            "version": version,
+            "key": json.loads(record),
+            "usage_stats": {
+                "total_requests": total,
+                "successful_requests": successful,
+                "failed_requests": failed,
+                "average_response_time": avg_time
+            },
+            "usage_series": json.loads(series) if series else None
+        }
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        rows, _, _ = self.load_changes(-1)
+        if not rows:
+            return None
+        return rows_to_document(rows)
+
+    def write_full(self, data: Dict[str, Any]) -> int:
+        rows = document_to_rows(data)
+        conn = self._connect()
+        version = self._begin(conn)
+        try:
+            keep = {row["id"] for row in rows}
+            stale = [key_id for (key_id,) in conn.execute("SELECT id FROM api_keys") if key_id not in keep]
+            self._delete(conn, stale, version)
+            self._upsert(conn, rows, version, time.time())
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return version
+
+    def write_changes(self, rows: List[Dict[str, Any]], deleted_ids: List[str]) -> int:
+        if not rows and not deleted_ids:
+            return self.current_version()
+        conn = self._connect()
+        version = self._begin(conn)
+        try:
+            self._delete(conn, deleted_ids, version)
+            self._upsert(conn, rows, version, time.time())
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return version
+
+    def current_version(self) -> int:
+        return self._connect().execute("SELECT value FROM meta WHERE name = 'version'").fetchone()[0]
+
+    def load_changes(self, since: int) -> Tuple[List[Dict[str, Any]], List[str], int]:
+        conn = self._connect()
+        # Read everything in one snapshot so the watermark matches the rows returned
+        conn.execute("BEGIN")
+        try:
+            version = conn.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()[0]
+            rows = [self._row_to_dict(row) for row in conn.execute(
+                "SELECT id, record, total_requests, successful_requests, failed_requests, "
+                "average_response_time, usage_series, version FROM api_keys WHERE version > ? ORDER BY rowid", (since,))]
+            deleted = [key_id for (key_id,) in conn.execute(
+                "SELECT id FROM deleted_keys WHERE version > ?", (since,))]
+        finally:
+            conn.execute("COMMIT")
+        return rows, deleted, version
+
+    def close(self) -> None:
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.ProgrammingError:
+                    # Closed from a thread other than its owner; the process is exiting anyway
+                    pass
+            self._connections = []
+        self._local = threading.local()
+
+def document_to_rows(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Split a JSON state document into per-key rows."""
+    usage_stats = data.get("usage_stats", {})
+    usage_series = data.get("usage_series", {})
+    return [{
+        "id": key["id"],
+        "key": key,
+        "usage_stats": usage_stats.get(key["id"]),
+        "usage_series": usage_series.get(key["id"])
+    } for key in data.get("keys", []) if key.get("id")]
+
+def rows_to_document(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Assemble per-key rows into a JSON state document."""
+    return {
+        "keys": [row["key"] for row in rows],
+        "usage_stats": {row["id"]: row["usage_stats"] for row in rows if row.get("usage_stats")},
+        "usage_series": {row["id"]: row["usage_series"] for row in rows if row.get("usage_series")}
+    }
+
+def create_storage(backend: str, json_file: str, sqlite_file: str) -> KeyStorage:
+    """Create the configured storage backend."""
+    if backend == BACKEND_SQLITE:
+        return SqliteKeyStorage(sqlite_file)
+    if backend != BACKEND_JSON:
+        logger.warning(f"Unknown key storage backend '{backend}', falling back to '{BACKEND_JSON}'")
+    return JsonKeyStorage(json_file)
@@ -21,6 +21,24 @@ class ChatCompletionRequest(BaseModel):
     max_tokens: Optional[int] = None
     presence_penalty: Optional[float] = 0
     frequency_penalty: Optional[float] = 0
+    cache: Optional[bool] = Field(True, description="Allow answering from the result cache (false opts out)")
+
+# Batch generation models
+class BatchItemRequest(BaseModel):
+    prompt: str = Field(..., min_length=1, description="Prompt text")
+    n: Optional[int] = Field(None, ge=1, description="Number of images (defaults to the batch's n)")
+    width: Optional[int] = Field(None, description="Image width (defaults to the batch's width)")
+    height: Optional[int] = Field(None, description="Image height (defaults to the batch's height)")
+    custom_id: Optional[str] = Field(None, description="Caller-defined ID echoed back with the result")
+
+class BatchRequest(BaseModel):
+    prompts: Optional[List[str]] = Field(None, description="Plain prompts, generated with the batch-wide settings")
+    items: Optional[List[BatchItemRequest]] = Field(None, description="Prompts with individual settings")
+    n: int = Field(1, ge=1, description="Number of images per prompt")
+    width: int = Field(720, description="Image width")
+    height: int = Field(480, description="Image height")
+    concurrency: Optional[int] = Field(None, ge=1, description="Prompts generated at the same time")
+    cache: Optional[bool] = Field(True, description="Allow answering from the result cache (false opts out)")
 
 # API key creation model
 class ApiKeyCreate(BaseModel):
@@ -28,6 +46,7 @@ class ApiKeyCreate(BaseModel):
     key_value: str = Field(..., description="Key value")
     weight: int = Field(1, description="Weight")
     rate_limit: int = Field(60, description="Rate limit (requests per minute)")
+    max_concurrent: int = Field(1, ge=1, description="Max concurrent tasks")
     is_enabled: bool = Field(True, description="Enabled")
     notes: Optional[str] = Field(None, description="Notes")
 
@@ -37,6 +56,7 @@ class ApiKeyUpdate(BaseModel):
     key_value: Optional[str] = Field(None, description="Key value")
     weight: Optional[int] = Field(None, description="Weight")
     rate_limit: Optional[int] = Field(None, description="Rate limit (requests per minute)")
+    max_concurrent: Optional[int] = Field(None, ge=1, description="Max concurrent tasks")
     is_enabled: Optional[bool] = Field(None, description="Enabled")
     notes: Optional[str] = Field(None, description="Notes")
 
@@ -51,6 +71,7 @@ class ImportKeyItem(BaseModel):
     key: str = Field(..., description="Key value")
     weight: int = Field(1, description="Weight")
     rate_limit: int = Field(60, description="Rate limit (requests per minute)")
+    max_concurrent: int = Field(1, ge=1, description="Max concurrent tasks")
     enabled: bool = Field(True, description="Enabled")
     notes: Optional[str] = Field(None, description="Notes")
 
@@ -0,0 +1,143 @@
+import math
+import collections
+from typing import Dict, List, Any, Optional
+
+from .config import Config
+
+# Percentiles of the completion-time distribution at which a task is checked. The
+# points are densest around the median, where most tasks finish.
+CHECKPOINT_PERCENTILES = (10, 25, 35, 42, 48, 52, 58, 65, 75, 85, 92, 97, 99)
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Linearly interpolated percentile of pre-sorted values."""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    rank = q / 100.0 * (len(sorted_values) - 1)
+    lower = int(math.floor(rank))
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+class CompletionTimes:
+    """Recent completion times of one kind of task and the poll checkpoints derived from them."""
+
+    __slots__ = ("durations", "_checkpoints")
+
+    def __init__(self, history: int):
+        self.durations = collections.deque(maxlen=history)
+        self._checkpoints: Optional[List[float]] = None
+
+    def add(self, duration: float) -> None:
+        self.durations.append(duration)
+        self._checkpoints = None
+
+    def percentiles(self) -> Dict[str, float]:
+        values = sorted(self.durations)
+        return {f"p{q}": round(_percentile(values, q), 2) for q in (10, 50, 90, 99)}
+
+    def checkpoints(self, min_gap: float) -> List[float]:
+        """Seconds after submission at which to check the task, at least min_gap apart."""
+        if self._checkpoints is None:
+            values = sorted(self.durations)
+            points = []
+            for q in CHECKPOINT_PERCENTILES:
+                point = _percentile(values, q)
+                if not points or point - points[-1] >= min_gap:
+                    points.append(point)
+            self._checkpoints = points
+        return self._checkpoints
+
+class PollSchedule:
+    """
+    Poll schedule learned from observed task completion times.
+
+    Completion times are kept per operation and variant count (e.g. simple_compose
+    with 2 variants, remix with 1), since these finish at very different speeds.
+    Once an operation has min_samples completions, its tasks are first checked
+    near the 10th percentile and then at percentile checkpoints that are closest
+    together around the median. Past the last checkpoint, and for operations
+    without enough data yet, tasks fall back to the fixed base interval.
+    """
+
+    def __init__(self, base_interval: float = 5.0, min_gap: float = 1.0, max_gap: float = 10.0,
+                 min_samples: int = 10, history: int = 200):
+        """
+        Initialize the schedule.
+
+        Args:
+            base_interval: Seconds between checks without enough data, and after the last checkpoint
+            min_gap: Minimum seconds between two checks of a task
+            max_gap: Maximum seconds between two checks of a task
+            min_samples: Completions of an operation needed before its learned schedule is used
+            history: Completion times kept per operation
+        """
+        self.base_interval = base_interval
+        self.min_gap = min_gap
+        self.max_gap = max(max_gap, min_gap)
+        self.min_samples = max(1, min_samples)
+        self.history = history
+        self._times: Dict[str, CompletionTimes] = {}
+
+    @staticmethod
+    def operation_key(operation: str, n_variants: int) -> str:
+        """Key the completion times of a kind of task are grouped by."""
+        return f"{operation}:{n_variants}"
+
+    def record(self, operation_key: str, duration: float) -> None:
+        """Record how many seconds after submission a task completed."""
+        if not operation_key or duration <= 0:
+            return
+        times = self._times.get(operation_key)
+        if times is None:
+            times = CompletionTimes(self.history)
+            self._times[operation_key] = times
+        times.add(duration)
+
+    def next_delay(self, operation_key: str, elapsed: float) -> float:
+        """
+        Seconds to wait before the next check of a task.
+
+        Args:
+            operation_key: Key from operation_key()
+            elapsed: Seconds since the task was submitted
+
+        Returns:
+            Delay in seconds
+        """
+        times = self._times.get(operation_key)
+        if times is None or len(times.durations) < self.min_samples:
+            return self.base_interval
+        checkpoints = times.checkpoints(self.min_gap)
+        if elapsed < checkpoints[0]:
+            # Nothing to check before the fastest tasks finish, wait for the first checkpoint
+            return max(self.min_gap, checkpoints[0] - elapsed)
+        for point in checkpoints:
+            if point > elapsed:
+                return min(self.max_gap, max(self.min_gap, point - elapsed))
+        return self.base_interval
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Learned distributions and check times per operation, for the admin API."""
+        operations = {}
+        for key, times in sorted(self._times.items()):
+            learned = len(times.durations) >= self.min_samples
+            operations[key] = {
+                "samples": len(times.durations),
+                "learned": learned,
+                "completion_seconds": times.percentiles(),
+                "check_at_seconds": [round(p, 2) for p in times.checkpoints(self.min_gap)] if learned else []
+            }
+        return {
+            "base_interval": self.base_interval,
+            "min_gap": self.min_gap,
+            "max_gap": self.max_gap,
+            "min_samples": self.min_samples,
+            "operations": operations
+        }
+
+# Global schedule shared by all generators
+poll_schedule = PollSchedule(
+    base_interval=Config.TASK_POLL_INTERVAL,
+    min_gap=Config.TASK_POLL_MIN_GAP,
+    max_gap=Config.TASK_POLL_MAX_GAP,
+    min_samples=Config.TASK_POLL_MIN_SAMPLES
+)
@@ -0,0 +1,82 @@
+import time
+from typing import Optional
+
+class TokenBucket:
+    """
+    Token bucket rate limiter for a single API key.
+
+    Tokens refill continuously at rate_per_minute / 60 per second, up to `capacity`.
+    Unlike a fixed 60-second window this never allows a double burst at the window
+    edge, and it can tell exactly when the next token will be available.
+    """
+
+    __slots__ = ("rate_per_minute", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None, now: Optional[float] = None):
+        """
+        Initialize the bucket.
+
+        Args:
+            rate_per_minute: Sustained requests per minute
+            capacity: Maximum burst size (defaults to one minute worth of requests)
+            now: Current timestamp (defaults to time.time())
+        """
+        self.rate_per_minute = max(0.0, float(rate_per_minute))
+        self.capacity = max(1.0, float(capacity if capacity is not None else self.rate_per_minute))
+        self.tokens = self.capacity  # Start full
+        self.updated_at = time.time() if now is None else now
+
+    @property
+    def refill_rate(self) -> float:
+        """Tokens added per second."""
+        return self.rate_per_minute / 60.0
+
+    def _refill(self, now: float) -> None:
+        """Add tokens for the time elapsed since the last update."""
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
+            self.updated_at = now
+
+    def available(self, now: Optional[float] = None) -> float:
+        """Return the number of tokens currently in the bucket."""
+        self._refill(time.time() if now is None else now)
+        return self.tokens
+
+    def try_acquire(self, now: Optional[float] = None, tokens: float = 1.0) -> bool:
+        """
+        Consume tokens if enough are available.
+
+        Returns:
+            True if the tokens were consumed, False if the caller is rate-limited
+        """
+        self._refill(time.time() if now is None else now)
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def refund(self, tokens: float = 1.0) -> None:
+        """Return tokens consumed for a request that was never sent (capped at capacity)."""
+        self.tokens = min(self.capacity, self.tokens + tokens)
+
+    def time_until_available(self, now: Optional[float] = None, tokens: float = 1.0) -> float:
+        """
+        Seconds until `tokens` tokens will be available (0 if available now).
+
+        Returns float('inf') if the bucket never refills (rate of 0).
+        """
+        self._refill(time.time() if now is None else now)
+        missing = tokens - self.tokens
+        if missing <= 0:
+            return 0.0
+        if self.refill_rate <= 0:
+            return float("inf")
+        return missing / self.refill_rate
+
+    def reconfigure(self, rate_per_minute: float, capacity: Optional[float] = None, now: Optional[float] = None) -> None:
+        """Change the rate and capacity while keeping the accumulated tokens."""
+        self._refill(time.time() if now is None else now)
+        self.rate_per_minute = max(0.0, float(rate_per_minute))
+        self.capacity = max(1.0, float(capacity if capacity is not None else self.rate_per_minute))
+        self.tokens = min(self.tokens, self.capacity)
@@ -0,0 +1,145 @@
+import time
+import random
+import asyncio
+import threading
+import collections
+from typing import Dict, Any, Optional
+
+from .config import Config
+
+class RetryBudget:
+    """
+    Retry budget shared by all requests of the process.
+
+    Retries within the last `window` seconds may not exceed `ratio` times the
+    requests started in that window, plus a floor of `min_retries` so a quiet
+    service can still retry. When upstream is failing everywhere, retries stop
+    at a fixed share of the traffic instead of multiplying it.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 10, window: float = 60.0):
+        """
+        Initialize the budget.
+
+        Args:
+            ratio: Retries allowed per started request
+            min_retries: Retries allowed per window regardless of traffic
+            window: Seconds over which requests and retries are counted
+        """
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._requests = collections.deque()
+        self._retries = collections.deque()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float) -> None:
+        cutoff = now - self.window
+        while self._requests and self._requests[0] < cutoff:
+            self._requests.popleft()
+        while self._retries and self._retries[0] < cutoff:
+            self._retries.popleft()
+
+    def record_request(self, now: Optional[float] = None) -> None:
+        """Count a started request towards the budget."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            self._requests.append(now)
+
+    def try_withdraw(self, now: Optional[float] = None) -> bool:
+        """Take one retry from the budget; False if it is exhausted."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+                return False
+            self._retries.append(now)
+            return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            self._expire(time.time())
+            return {
+                "requests": len(self._requests),
+                "retries": len(self._retries),
+                "allowed": int(self.min_retries + self.ratio * len(self._requests))
+            }
+
+class RetryState:
+    """
+    Retries of one client request across all its upstream stages (upload, task submit, status
+    checks): at most max_attempts - 1 of them, each drawn from the shared budget.
+    """
+
+    __slots__ = ("policy", "retries", "exhausted_reason")
+
+    def __init__(self, policy: "RetryPolicy"):
+        self.policy = policy
+        self.retries = 0
+        self.exhausted_reason: Optional[str] = None
+
+    def allow(self) -> bool:
+        """Whether another attempt may be made; counts it if so."""
+        if self.retries >= self.policy.max_attempts - 1:
+            self.exhausted_reason = f"gave up after {self.policy.max_attempts} attempts"
+            return False
+        if self.policy.budget is not None and not self.policy.budget.try_withdraw():
+            self.exhausted_reason = "retry budget exhausted"
+            return False
+        self.retries += 1
+        return True
+
+    def backoff(self) -> float:
+        """Delay before the current retry: full-jitter exponential backoff."""
+        cap = min(self.policy.max_delay, self.policy.base_delay * (2 ** max(0, self.retries - 1)))
+        return random.uniform(0, cap)
+
+    async def wait(self) -> None:
+        """Sleep for the backoff of the current retry."""
+        await asyncio.sleep(self.backoff())
+
+class RetryPolicy:
+    """
+    Retry policy of the upstream operations (task submit, status polling, upload).
+
+    Each client request starts once and shares its RetryState between its
+    stages, so it may be attempted up to `max_attempts` times in total. Each retry waits a
+    random delay of up to base_delay * 2^(retry - 1) seconds (capped at
+    max_delay), so retries of requests that failed together do not arrive
+    together, and must also be granted by the global RetryBudget.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0,
+                 budget: Optional[RetryBudget] = None):
+        """
+        Initialize the policy.
+
+        Args:
+            max_attempts: Attempts per request, including the first
+            base_delay: Backoff cap of the first retry, in seconds
+            max_delay: Upper bound of the backoff cap, in seconds
+            budget: Global budget retries are drawn from; None for no global limit
+        """
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = base_delay
+        self.max_delay = max(base_delay, max_delay)
+        self.budget = budget
+
+    def start(self) -> RetryState:
+        """Begin a client request: count it towards the budget and return its retry state (call once per request)."""
+        if self.budget is not None:
+            self.budget.record_request()
+        return RetryState(self)
+
+# Global policy used by the generator
+retry_policy = RetryPolicy(
+    max_attempts=Config.RETRY_MAX_ATTEMPTS,
+    base_delay=Config.RETRY_BASE_DELAY,
+    max_delay=Config.RETRY_MAX_DELAY,
+    budget=RetryBudget(
+        ratio=Config.RETRY_BUDGET_RATIO,
+        min_retries=Config.RETRY_BUDGET_MIN,
+        window=Config.RETRY_BUDGET_WINDOW
+    )
+)
@@ -0,0 +1,246 @@
+import time
+import uuid
+import asyncio
+import logging
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional
+
+from ..config import Config
+from ..key_manager import key_manager
+from ..sora_integration import SoraClient
+from .single_flight import generate_image_shared
+from .result_cache import result_cache_key, get_cached_result, store_result
+
+logger = logging.getLogger("sora-api.batch_service")
+
+# Item states
+ITEM_QUEUED = "queued"
+ITEM_RUNNING = "running"
+ITEM_COMPLETED = "completed"
+ITEM_FAILED = "failed"
+
+class BatchItem:
+    """One prompt of a batch and its outcome."""
+
+    __slots__ = ("index", "custom_id", "prompt", "n", "width", "height", "status",
+                 "image_urls", "error", "cached", "started_at", "finished_at")
+
+    def __init__(self, index: int, prompt: str, n: int = 1, width: int = 720, height: int = 480,
+                 custom_id: Optional[str] = None):
+        self.index = index
+        self.custom_id = custom_id
+        self.prompt = prompt
+        self.n = n
+        self.width = width
+        self.height = height
+        self.status = ITEM_QUEUED
+        self.image_urls: List[str] = []
+        self.error: Optional[str] = None
+        self.cached = False
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (ITEM_COMPLETED, ITEM_FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "custom_id": self.custom_id,
+            "prompt": self.prompt,
+            "status": self.status,
+            "image_urls": self.image_urls,
+            "error": self.error,
+            "cached": self.cached,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+class Batch:
+    """A submitted batch: its items, progress and the order in which items finished."""
+
+    def __init__(self, items: List[BatchItem], concurrency: int, use_cache: bool):
+        self.id = f"batch_{uuid.uuid4().hex}"
+        self.items = items
+        self.concurrency = concurrency
+        self.use_cache = use_cache
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.finished_order: List[int] = []  # Item indexes in completion order, read by result streams
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def status(self) -> str:
+        if self.finished_at is not None:
+            return "completed"
+        return "in_progress" if any(item.status != ITEM_QUEUED for item in self.items) else "queued"
+
+    def counts(self) -> Dict[str, int]:
+        counts = {ITEM_QUEUED: 0, ITEM_RUNNING: 0, ITEM_COMPLETED: 0, ITEM_FAILED: 0}
+        for item in self.items:
+            counts[item.status] += 1
+        counts["total"] = len(self.items)
+        return counts
+
+    def summary(self) -> Dict[str, Any]:
+        """Batch status without the items."""
+        return {
+            "id": self.id,
+            "object": "batch",
+            "status": self.status,
+            "created_at": int(self.created_at),
+            "finished_at": int(self.finished_at) if self.finished_at else None,
+            "counts": self.counts()
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = self.summary()
+        result["items"] = [item.to_dict() for item in self.items]
+        return result
+
+    def _notify(self) -> None:
+        """Wake result streams; each waits on a fresh event afterwards."""
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def stream_results(self) -> AsyncGenerator[Dict[str, Any], None]:
+        """Yield every item as it finishes (already finished ones first), then the batch summary."""
+        cursor = 0
+        while True:
+            changed = self._changed
+            while cursor < len(self.finished_order):
+                yield {"object": "batch.item", "batch_id": self.id, **self.items[self.finished_order[cursor]].to_dict()}
+                cursor += 1
+            if self.finished_at is not None:
+                break
+            await changed.wait()
+        yield self.summary()
+
+class BatchService:
+    """
+    Runs batches of text-to-image prompts across the key pool.
+
+    Items of a batch run at most `concurrency` at a time. Each takes its key
+    from KeyManager.acquire_key, so it waits its turn in the same FIFO queue as
+    interactive requests and never exceeds a key's rate limit or concurrent
+    task limit; with many keys, items spread over all of them. Finished
+    batches are kept for `retention` seconds.
+    """
+
+    def __init__(self, max_items: int = 5000, concurrency: int = 8, key_wait: float = 300.0,
+                 retention: float = 21600.0):
+        """
+        Initialize the service.
+
+        Args:
+            max_items: Max prompts per batch
+            concurrency: Default number of items of a batch running at the same time
+            key_wait: Max seconds an item waits for a key before it fails
+            retention: Seconds a finished batch stays queryable
+        """
+        self.max_items = max_items
+        self.concurrency = max(1, concurrency)
+        self.key_wait = key_wait
+        self.retention = retention
+        self._batches: Dict[str, Batch] = {}
+
+    def submit(self, items: List[BatchItem], client_factory: Callable[[str], SoraClient],
+               concurrency: Optional[int] = None, use_cache: bool = False) -> Batch:
+        """
+        Create a batch and start running it on the current event loop.
+
+        Args:
+            items: Prompts to generate
+            client_factory: Returns the Sora client of a key
+            concurrency: Items running at the same time (defaults to the service setting)
+            use_cache: Answer from / store into the result cache
+
+        Returns:
+            The new batch
+
+        Raises:
+            ValueError: If the batch is empty or too large
+        """
+        if not items:
+            raise ValueError("A batch needs at least one prompt")
+        if len(items) > self.max_items:
+            raise ValueError(f"A batch can hold at most {self.max_items} prompts, got {len(items)}")
+        self._prune()
+        batch = Batch(items, max(1, min(concurrency or self.concurrency, len(items))), use_cache)
+        self._batches[batch.id] = batch
+        batch._task = asyncio.get_running_loop().create_task(self._run(batch, client_factory))
+        logger.info(f"Batch {batch.id} submitted: {len(items)} prompts, concurrency {batch.concurrency}")
+        return batch
+
+    def get(self, batch_id: str) -> Optional[Batch]:
+        return self._batches.get(batch_id)
+
+    def _prune(self) -> None:
+        """Forget batches that finished more than `retention` seconds ago."""
+        cutoff = time.time() - self.retention
+        for batch_id in [bid for bid, batch in self._batches.items()
+                         if batch.finished_at is not None and batch.finished_at < cutoff]:
+            del self._batches[batch_id]
+
+    async def _run(self, batch: Batch, client_factory: Callable[[str], SoraClient]) -> None:
+        semaphore = asyncio.Semaphore(batch.concurrency)
+
+        async def run_item(item: BatchItem) -> None:
+            async with semaphore:
+                await self._run_item(batch, item, client_factory)
+
+        try:
+            await asyncio.gather(*(run_item(item) for item in batch.items))
+        finally:
+            batch.finished_at = time.time()
+            batch._notify()
+            counts = batch.counts()
+            logger.info(f"Batch {batch.id} finished: {counts[ITEM_COMPLETED]} completed, {counts[ITEM_FAILED]} failed")
+
+    async def _run_item(self, batch: Batch, item: BatchItem, client_factory: Callable[[str], SoraClient]) -> None:
+        item.status = ITEM_RUNNING
+        item.started_at = time.time()
+        sora_auth_token = None  # Key the item acquired, if it did not join another generation
+        try:
+            cache_key = result_cache_key("generation", item.prompt, item.n, item.width, item.height) if batch.use_cache else None
+            image_urls = get_cached_result(cache_key)
+            if image_urls is not None:
+                item.cached = True
+            else:
+                async def acquire_client() -> SoraClient:
+                    nonlocal sora_auth_token
+                    sora_auth_token = await key_manager.acquire_key(timeout=self.key_wait)
+                    if not sora_auth_token:
+                        raise Exception("No API key became available")
+                    return client_factory(sora_auth_token)
+
+                # A key is only taken if no identical generation is in flight to join
+                image_urls = await generate_image_shared(
+                    None, item.prompt, item.n, item.width, item.height, acquire_client=acquire_client
+                )
+                if not image_urls:
+                    raise Exception("Image generation returned empty result")
+                store_result(cache_key, image_urls)
+            item.image_urls = image_urls
+            item.status = ITEM_COMPLETED
+        except Exception as e:
+            item.error = str(e)
+            item.status = ITEM_FAILED
+            logger.warning(f"Batch {batch.id} item {item.index} failed: {str(e)}")
+        finally:
+            item.finished_at = time.time()
+            if sora_auth_token:
+                key_manager.record_request_result(
+                    sora_auth_token, item.status == ITEM_COMPLETED, item.finished_at - item.started_at
+                )
+            batch.finished_order.append(item.index)
+            batch._notify()
+
+# Global batch service
+batch_service = BatchService(
+    max_items=Config.BATCH_MAX_ITEMS,
+    concurrency=Config.BATCH_CONCURRENCY,
+    key_wait=Config.BATCH_KEY_WAIT,
+    retention=Config.BATCH_RETENTION
+)
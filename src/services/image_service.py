@@ -1,16 +1,16 @@
 import asyncio
 import base64
 import os
-import tempfile
 import time
-import uuid 
 import logging
 import threading
-from typing import List, Dict, Any, Optional, Union, Tuple
+from typing import List, Dict, Any, Optional, Union, Tuple, Callable, Awaitable
 
 from ..sora_integration import SoraClient
 from ..config import Config
 from ..utils import localize_image_urls
+from .single_flight import generate_image_shared
+from .result_cache import result_cache_key, store_result
 
 logger = logging.getLogger("sora-api.image_service")
 
@@ -27,9 +27,12 @@ def format_think_block(message: str) -> str:
 
 async def process_image_task(
     request_id: str,
-    sora_client: SoraClient,
+    sora_client: Optional[SoraClient],
     task_type: str,
     prompt: str,
+    use_cache: bool = False,
+    cached_urls: Optional[List[str]] = None,
+    acquire_client: Optional[Callable[[], Awaitable[SoraClient]]] = None,
     **kwargs
 ) -> None:
     """
@@ -37,16 +40,37 @@ async def process_image_task(
     
     Args:
         request_id: Request ID
-        sora_client: Sora client instance
+        sora_client: Sora client instance, or None if cached_urls is given or a generation joins an identical one in flight
         task_type: Task type ("generation" or "remix")
         prompt: Prompt text
+        use_cache: Store the result into the result cache
+        cached_urls: Result found in the cache by the caller; completes the task right away
+        acquire_client: Acquires a client if a generation without one has to run itself
         **kwargs: Additional parameters depending on task type
     """
     try:
         # Save the API key used for this task to reuse consistently
-        current_api_key = sora_client.auth_token
+        current_api_key = sora_client.auth_token if sora_client else None
         task_to_api_key[request_id] = current_api_key
         
+        # A repeated request is answered from the result cache without contacting Sora
+        if cached_urls is not None:
+            generation_results[request_id] = {
+                "status": "completed",
+                "image_urls": cached_urls,
+                "cached": True,
+                "timestamp": int(time.time()),
+                "api_key": current_api_key
+            }
+            _schedule_cleanup(request_id)
+            return
+        cache_key = None
+        if use_cache:
+            cache_key = result_cache_key(
+                task_type, prompt, kwargs.get("num_images", 1),
+                kwargs.get("width"), kwargs.get("height"), kwargs.get("image_data")
+            )
+        
         # Update status to processing
         generation_results[request_id] = {
             "status": "processing",
@@ -70,13 +94,15 @@ async def process_image_task(
                 "api_key": current_api_key
             }
             
-            # Generate images
+            # Generate images (joins an identical request in flight if single-flight is enabled)
             logger.info(f"[{request_id}] Start generating images, prompt: {prompt}")
-            image_urls = await sora_client.generate_image(
+            image_urls = await generate_image_shared(
+                sora_client,
                 prompt=prompt,
                 num_images=num_images,
                 width=width,
-                height=height
+                height=height,
+                acquire_client=acquire_client
             )
             
         elif task_type == "remix":
@@ -95,49 +121,36 @@ async def process_image_task(
                 "api_key": current_api_key
             }
             
-            # Save base64 image to a temporary file
-            temp_dir = tempfile.mkdtemp()
-            temp_image_path = os.path.join(temp_dir, f"upload_{uuid.uuid4()}.png")
+            # Decode the image; it is uploaded straight from memory
+            image_bytes = base64.b64decode(image_data)
             
-            try:
-                # Decode and save image
-                with open(temp_image_path, "wb") as f:
-                    f.write(base64.b64decode(image_data))
-                
-                # Update status
-                generation_results[request_id] = {
-                    "status": "processing",
-                    "message": format_think_block("Uploading image to Sora service..."),
-                    "timestamp": int(time.time()),
-                    "api_key": current_api_key
-                }
-                
-                # Upload image - ensure the same API key as the initial request is used
-                upload_result = await sora_client.upload_image(temp_image_path)
-                media_id = upload_result['id']
-                
-                # Update status
-                generation_results[request_id] = {
-                    "status": "processing",
-                    "message": format_think_block("Generating new images based on the uploaded image..."),
-                    "timestamp": int(time.time()),
-                    "api_key": current_api_key
-                }
-                
-                # Execute remix generation
-                logger.info(f"[{request_id}] Start generating Remix images, prompt: {prompt}")
-                image_urls = await sora_client.generate_image_remix(
-                    prompt=prompt,
-                    media_id=media_id,
-                    num_images=num_images
-                )
-                
-            finally:
-                # Clean up temporary files
-                if os.path.exists(temp_image_path):
-                    os.remove(temp_image_path)
-                if os.path.exists(temp_dir):
-                    os.rmdir(temp_dir)
+            # Update status
+            generation_results[request_id] = {
+                "status": "processing",
+                "message": format_think_block("Uploading image to Sora service..."),
+                "timestamp": int(time.time()),
+                "api_key": current_api_key
+            }
+            
+            # Upload image - ensure the same API key as the initial request is used
+            upload_result = await sora_client.upload_image(image_bytes)
+            media_id = upload_result['id']
+            
+            # Update status
+            generation_results[request_id] = {
+                "status": "processing",
+                "message": format_think_block("Generating new images based on the uploaded image..."),
+                "timestamp": int(time.time()),
+                "api_key": current_api_key
+            }
+            
+            # Execute remix generation
+            logger.info(f"[{request_id}] Start generating Remix images, prompt: {prompt}")
+            image_urls = await sora_client.generate_image_remix(
+                prompt=prompt,
+                media_id=media_id,
+                num_images=num_images
+            )
         else:
             raise ValueError(f"Unknown task type: {task_type}")
         
@@ -194,6 +207,7 @@ async def process_image_task(
             logger.info(f"[{request_id}] Image localization feature is disabled, using original URLs")
         
         # Store results
+        store_result(cache_key, image_urls)
         generation_results[request_id] = {
             "status": "completed",
             "image_urls": image_urls,
@@ -201,12 +215,7 @@ async def process_image_task(
             "api_key": current_api_key
         }
         
-        # Auto-clean results after 30 minutes
-        def cleanup_task():
-            generation_results.pop(request_id, None)
-            task_to_api_key.pop(request_id, None)
-            
-        threading.Timer(1800, cleanup_task).start()
+        _schedule_cleanup(request_id)
         
     except Exception as e:
         error_message = f"Image generation failed: {str(e)}"
@@ -215,10 +224,18 @@ async def process_image_task(
             "error": error_message,
             "message": format_think_block(error_message),
             "timestamp": int(time.time()),
-            "api_key": sora_client.auth_token  # record current API key
+            "api_key": sora_client.auth_token if sora_client else None  # record current API key
         }
         logger.error(f"Image generation failed (ID: {request_id}): {str(e)}", exc_info=True)
 
+def _schedule_cleanup(request_id: str) -> None:
+    """Auto-clean a task's results after 30 minutes"""
+    def cleanup_task():
+        generation_results.pop(request_id, None)
+        task_to_api_key.pop(request_id, None)
+        
+    threading.Timer(1800, cleanup_task).start()
+
 def get_generation_result(request_id: str) -> Dict[str, Any]:
     """Get generation result by request ID"""
     if request_id not in generation_results:
@@ -0,0 +1,56 @@
+import hashlib
+import logging
+from typing import List, Optional, Tuple
+
+from ..cache import TTLCache
+from ..config import Config
+
+logger = logging.getLogger("sora-api.result_cache")
+
+# Normalized request -> final (localized) image URLs
+result_cache = TTLCache(max_entries=Config.RESULT_CACHE_MAX_ENTRIES, ttl=Config.RESULT_CACHE_TTL)
+
+def result_cache_key(operation: str, prompt: str, num_images: int, width: Optional[int] = None,
+                     height: Optional[int] = None, image_data: Optional[str] = None) -> Tuple:
+    """
+    Normalized identity of a generation request.
+
+    Args:
+        operation: "generation" or "remix"
+        prompt: Prompt text (whitespace-insensitive)
+        num_images: Number of images requested
+        width: Image width
+        height: Image height
+        image_data: Base64 source image of a remix, identified by its hash
+    """
+    image_hash = hashlib.sha256(image_data.encode()).hexdigest() if image_data else None
+    return (operation, " ".join(prompt.split()), num_images, width, height, image_hash)
+
+def get_cached_result(key: Optional[Tuple]) -> Optional[List[str]]:
+    """Cached image URLs of a request, None if caching is off for it or nothing is cached."""
+    if key is None or not Config.RESULT_CACHE_ENABLED:
+        return None
+    image_urls = result_cache.get(key)
+    if image_urls is None:
+        return None
+    logger.info(f"Result cache hit ({key[0]}), prompt: {key[1]}")
+    return list(image_urls)
+
+def store_result(key: Optional[Tuple], image_urls: List[str]) -> None:
+    """Cache the image URLs of a successful request."""
+    if key is None or not Config.RESULT_CACHE_ENABLED or not image_urls:
+        return
+    result_cache.set(key, list(image_urls))
+
+def cache_allowed(request_cache: Optional[bool], cache_control: Optional[str]) -> bool:
+    """
+    Whether a request may be answered from (and stored in) the result cache.
+
+    Args:
+        request_cache: The request's `cache` field; False opts out
+        cache_control: The Cache-Control header; no-cache or no-store opts out
+    """
+    if not Config.RESULT_CACHE_ENABLED or request_cache is False:
+        return False
+    directives = (cache_control or "").lower()
+    return "no-cache" not in directives and "no-store" not in directives
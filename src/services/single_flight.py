@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from ..sora_integration import SoraClient
+from ..config import Config
+from ..key_manager import key_manager
+
+logger = logging.getLogger("sora-api.single_flight")
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls into one.
+
+    The first caller for a key starts the call as a task of its own; callers
+    arriving while it runs wait for the same task instead of starting another.
+    The task is shielded, so a caller that goes away (e.g. a closed stream)
+    does not cancel it for the others. Once it finishes, the key is free again.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run func() for a key, or join the run already in flight.
+
+        Args:
+            key: Identity of the call; equal keys share one run
+            func: Coroutine function performing the call
+
+        Returns:
+            Tuple[Any, bool]: (result, True if the result came from another caller's run)
+        """
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            task = asyncio.get_running_loop().create_task(func())
+            self._calls[key] = task
+            self.started += 1
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task), shared
+
+    def in_flight(self, key: Hashable) -> bool:
+        """Whether a call for key is running, i.e. a caller arriving now would join it."""
+        return key in self._calls
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._calls), "started": self.started, "coalesced": self.coalesced}
+
+# Identical text-to-image requests in flight, shared by the streaming and async paths
+generation_flight = SingleFlight()
+
+def generation_key(prompt: str, num_images: int, width: int, height: int) -> Tuple:
+    """Normalized identity of a text-to-image request (whitespace-insensitive prompt)."""
+    return ("generation", " ".join(prompt.split()), num_images, width, height)
+
+async def generate_image_shared(sora_client: Optional[SoraClient], prompt: str, num_images: int = 1,
+                                width: int = 720, height: int = 480,
+                                acquire_client: Optional[Callable[[], Awaitable[SoraClient]]] = None) -> List[str]:
+    """
+    Generate images, joining an identical request already in flight
+    when SINGLE_FLIGHT_ENABLED is set.
+
+    Args:
+        sora_client: Client of a key already acquired for this request, or None to
+            acquire one with acquire_client only if this request has to run itself
+        prompt: Prompt text
+        num_images: Number of images to generate
+        width: Image width
+        height: Image height
+        acquire_client: Coroutine function acquiring a key and returning its client
+
+    Returns:
+        List of image URLs (raises like SoraClient.generate_image on failure)
+    """
+    async def generate():
+        client = sora_client if sora_client is not None else await acquire_client()
+        return await client.generate_image(prompt=prompt, num_images=num_images, width=width, height=height)
+
+    if not Config.SINGLE_FLIGHT_ENABLED:
+        return await generate()
+
+    image_urls, shared = await generation_flight.do(generation_key(prompt, num_images, width, height), generate)
+    if shared:
+        logger.info(f"Joined an identical generation already in flight, prompt: {prompt}")
+        if sora_client is not None:
+            # The key acquired for this request was never used: return its slot and rate token
+            key_manager.release_reservation(sora_client.auth_token, refund=True)
+    # Callers may modify their list (e.g. localization), so each gets its own copy
+    return list(image_urls)
@@ -2,27 +2,35 @@ import json
 import time
 import asyncio
 import logging
-from typing import AsyncGenerator, List, Dict, Any
+from typing import AsyncGenerator, List, Dict, Any, Optional, Callable, Awaitable
 
 from ..sora_integration import SoraClient
 from ..config import Config
 from ..utils import localize_image_urls
 from .image_service import format_think_block
+from .single_flight import generate_image_shared
+from .result_cache import result_cache_key, store_result
 
 logger = logging.getLogger("sora-api.streaming")
 
 async def generate_streaming_response(
-    sora_client: SoraClient,
+    sora_client: Optional[SoraClient],
     prompt: str,
-    n_images: int = 1
+    n_images: int = 1,
+    use_cache: bool = False,
+    cached_urls: Optional[List[str]] = None,
+    acquire_client: Optional[Callable[[], Awaitable[SoraClient]]] = None
 ) -> AsyncGenerator[str, None]:
     """
     Streaming response generator for text-to-image
     
     Args:
-        sora_client: Sora client
+        sora_client: Sora client, or None when answered from the cache or joining an identical generation in flight
         prompt: Prompt text
         n_images: Number of images to generate
+        use_cache: Store the result into the result cache
+        cached_urls: Result found in the cache by the caller; answered without contacting Sora
+        acquire_client: Acquires a client if a request without one has to run itself
     
     Yields:
         SSE-formatted response data
@@ -36,14 +44,22 @@ async def generate_streaming_response(
     start_msg = "```think\nGenerating images, please wait...\n"
     yield f"data: {json.dumps({'id': request_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': 'sora-1.0', 'choices': [{'index': 0, 'delta': {'content': start_msg}, 'finish_reason': None}]})}\n\n"
     
-    # Create a background task to generate images
-    logger.info(f"[Streaming {request_id}] Start generating images, prompt: {prompt}")
-    generation_task = asyncio.create_task(sora_client.generate_image(
-        prompt=prompt,
-        num_images=n_images,
-        width=720,
-        height=480
-    ))
+    # A repeated request is answered from the result cache without contacting Sora
+    cache_key = result_cache_key("generation", prompt, n_images, 720, 480) if use_cache else None
+    if cached_urls is not None:
+        generation_task = asyncio.get_running_loop().create_future()
+        generation_task.set_result(cached_urls)
+    else:
+        # Create a background task to generate images
+        logger.info(f"[Streaming {request_id}] Start generating images, prompt: {prompt}")
+        generation_task = asyncio.create_task(generate_image_shared(
+            sora_client,
+            prompt=prompt,
+            num_images=n_images,
+            width=720,
+            height=480,
+            acquire_client=acquire_client
+        ))
     
     # Send a "still generating" message every 5 seconds to prevent connection timeout
     progress_messages = [
@@ -68,8 +84,8 @@ async def generate_streaming_response(
         image_urls = await generation_task
         logger.info(f"[Streaming {request_id}] Image generation completed, obtained {len(image_urls) if isinstance(image_urls, list) else 'non-list'} URLs")
         
-        # Localize image URLs if enabled
-        if Config.IMAGE_LOCALIZATION and isinstance(image_urls, list) and image_urls:
+        # Localize image URLs if enabled (cached URLs already are)
+        if Config.IMAGE_LOCALIZATION and cached_urls is None and isinstance(image_urls, list) and image_urls:
             logger.info(f"[Streaming {request_id}] Preparing to localize image URLs")
             try:
                 localized_urls = await localize_image_urls(image_urls)
@@ -80,6 +96,8 @@ async def generate_streaming_response(
                 logger.info(f"[Streaming {request_id}] Using original URLs due to error")
         elif not Config.IMAGE_LOCALIZATION:
             logger.info(f"[Streaming {request_id}] Image localization feature is disabled")
+        if cached_urls is None:
+            store_result(cache_key, image_urls)
         
         # End the code block
         content_str = "\n```\n\n"
@@ -109,26 +127,27 @@ async def generate_streaming_response(
 
 
 async def generate_streaming_remix_response(
-    sora_client: SoraClient,
+    sora_client: Optional[SoraClient],
     prompt: str,
     image_data: str,
-    n_images: int = 1
+    n_images: int = 1,
+    use_cache: bool = False,
+    cached_urls: Optional[List[str]] = None
 ) -> AsyncGenerator[str, None]:
     """
     Streaming response generator for image-to-image (Remix)
     
     Args:
-        sora_client: Sora client
+        sora_client: Sora client (None when answered from the cache)
         prompt: Prompt text
         image_data: Base64-encoded image data
         n_images: Number of images to generate
+        use_cache: Store the result into the result cache
+        cached_urls: Result found in the cache by the caller; answered without contacting Sora
     
     Yields:
         SSE-formatted response data
     """
-    import os
-    import tempfile
-    import uuid
     import base64
     
     request_id = f"chatcmpl-stream-remix-{time.time()}-{hash(prompt) % 10000}"
@@ -137,27 +156,28 @@ async def generate_streaming_remix_response(
     yield f"data: {json.dumps({'id': request_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': 'sora-1.0', 'choices': [{'index': 0, 'delta': {'role': 'assistant'}, 'finish_reason': None}]})}\n\n"
     
     try:
-        # Save base64 image to a temporary file
-        temp_dir = tempfile.mkdtemp()
-        temp_image_path = os.path.join(temp_dir, f"upload_{uuid.uuid4()}.png")
-        
-        try:
-            # Decode and save image
-            with open(temp_image_path, "wb") as f:
-                f.write(base64.b64decode(image_data))
-            
+        # A repeated request is answered from the result cache without contacting Sora
+        cache_key = result_cache_key("remix", prompt, n_images, image_data=image_data) if use_cache else None
+        image_urls = cached_urls
+        if image_urls is not None:
+            cached_msg = "```think\nFound an identical earlier request, reusing its images...\n"
+            yield f"data: {json.dumps({'id': request_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': 'sora-1.0', 'choices': [{'index': 0, 'delta': {'content': cached_msg}, 'finish_reason': None}]})}\n\n"
+        else:
+            # Decode the image; it is uploaded straight from memory
+            image_bytes = base64.b64decode(image_data)
+        
             # Upload image
             upload_msg = "```think\nUploading image...\n"
             yield f"data: {json.dumps({'id': request_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': 'sora-1.0', 'choices': [{'index': 0, 'delta': {'content': upload_msg}, 'finish_reason': None}]})}\n\n"
-            
+        
             logger.info(f"[Streaming Remix {request_id}] Uploading image")
-            upload_result = await sora_client.upload_image(temp_image_path)
+            upload_result = await sora_client.upload_image(image_bytes)
             media_id = upload_result['id']
-            
+        
             # Send generating message
             generate_msg = "\nGenerating new images based on the uploaded image...\n"
             yield f"data: {json.dumps({'id': request_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': 'sora-1.0', 'choices': [{'index': 0, 'delta': {'content': generate_msg}, 'finish_reason': None}]})}\n\n"
-            
+        
             # Create a background task to generate images
             logger.info(f"[Streaming Remix {request_id}] Start generating images, prompt: {prompt}")
             generation_task = asyncio.create_task(sora_client.generate_image_remix(
@@ -165,7 +185,7 @@ async def generate_streaming_remix_response(
                 media_id=media_id,
                 num_images=n_images
             ))
-            
+        
             # Send a "still generating" message every 5 seconds
             progress_messages = [
                 "Processing your request...",
@@ -174,7 +194,7 @@ async def generate_streaming_remix_response(
                 "Image generation takes a bit of time, thanks for your patience...",
                 "Blending your style and prompt to craft tailored images..."
             ]
-            
+        
             i = 0
             while not generation_task.done():
                 await asyncio.sleep(5)
@@ -182,11 +202,11 @@ async def generate_streaming_remix_response(
                 i += 1
                 content = "\n" + progress_msg + "\n"
                 yield f"data: {json.dumps({'id': request_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': 'sora-1.0', 'choices': [{'index': 0, 'delta': {'content': content}, 'finish_reason': None}]})}\n\n"
-            
+        
             # Get generation results
             image_urls = await generation_task
             logger.info(f"[Streaming Remix {request_id}] Image generation completed")
-            
+        
             # Localize image URLs if enabled
             if Config.IMAGE_LOCALIZATION:
                 logger.info(f"[Streaming Remix {request_id}] Performing image URL localization")
@@ -195,33 +215,28 @@ async def generate_streaming_remix_response(
                 logger.info(f"[Streaming Remix {request_id}] Image URL localization completed")
             else:
                 logger.info(f"[Streaming Remix {request_id}] Image localization feature is disabled")
+        
+            store_result(cache_key, image_urls)
+        
+        # End the code block
+        content_str = "\n```\n\n"
+        yield f"data: {json.dumps({'id': request_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': 'sora-1.0', 'choices': [{'index': 0, 'delta': {'content': content_str}, 'finish_reason': None}]})}\n\n"
+        
+        # Send image URLs as Markdown
+        for i, url in enumerate(image_urls):
+            if i > 0:
+                newline_str = "\n\n"
+                yield f"data: {json.dumps({'id': request_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': 'sora-1.0', 'choices': [{'index': 0, 'delta': {'content': newline_str}, 'finish_reason': None}]})}\n\n"
             
-            # End the code block
-            content_str = "\n```\n\n"
-            yield f"data: {json.dumps({'id': request_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': 'sora-1.0', 'choices': [{'index': 0, 'delta': {'content': content_str}, 'finish_reason': None}]})}\n\n"
-            
-            # Send image URLs as Markdown
-            for i, url in enumerate(image_urls):
-                if i > 0:
-                    newline_str = "\n\n"
-                    yield f"data: {json.dumps({'id': request_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': 'sora-1.0', 'choices': [{'index': 0, 'delta': {'content': newline_str}, 'finish_reason': None}]})}\n\n"
-                
-                image_markdown = f"![Generated Image]({url})"
-                yield f"data: {json.dumps({'id': request_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': 'sora-1.0', 'choices': [{'index': 0, 'delta': {'content': image_markdown}, 'finish_reason': None}]})}\n\n"
-            
-            # Send completion event
-            yield f"data: {json.dumps({'id': request_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': 'sora-1.0', 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})}\n\n"
-            
-            # Send end marker
-            yield "data: [DONE]\n\n"
-            
-        finally:
-            # Clean up temporary files
-            if os.path.exists(temp_image_path):
-                os.remove(temp_image_path)
-            if os.path.exists(temp_dir):
-                os.rmdir(temp_dir)
-                
+            image_markdown = f"![Generated Image]({url})"
+            yield f"data: {json.dumps({'id': request_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': 'sora-1.0', 'choices': [{'index': 0, 'delta': {'content': image_markdown}, 'finish_reason': None}]})}\n\n"
+        
+        # Send completion event
+        yield f"data: {json.dumps({'id': request_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': 'sora-1.0', 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})}\n\n"
+        
+        # Send end marker
+        yield "data: [DONE]\n\n"
+
     except Exception as e:
         error_msg = f"Image remix failed: {str(e)}"
         logger.error(f"[Streaming Remix {request_id}] Error: {error_msg}", exc_info=True)
@@ -1,4 +1,3 @@
-import cloudscraper
 import time
 import json
 import random
@@ -8,6 +7,43 @@ import mimetypes # To guess file mime type
 import asyncio
 from .utils import localize_image_urls
 from .config import Config
+from .cf_session_pool import cf_session_pool
+from .task_poller import get_task_poller
+from .poll_schedule import poll_schedule, PollSchedule
+from .retry_policy import retry_policy
+
+# Leading bytes of the image formats Sora accepts
+IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+# Why an upstream request failed, deciding how the next attempt picks its key
+SUBMIT_KEY_REJECTED = "key_rejected"  # Credentials refused (HTTP 401/403): the key's circuit opens right away
+SUBMIT_KEY_BUSY = "key_busy"  # Key at its upstream concurrency limit: not the key's fault, nothing recorded
+SUBMIT_FAILED = "failed"  # Anything else: counts toward the key's failure rate
+
+# Why a submitted task produced no images, deciding whether it runs again on another key
+TASK_FAILED = "task_failed"  # Upstream failed the task: counts toward the key's failure rate, runs again
+TASK_REFUSED = "task_refused"  # Refused for its prompt or content: not the key's fault, another key would refuse it too
+TASK_CHECKS_FAILED = "checks_failed"  # Status checks kept failing: counts toward the key's failure rate, but the
+                                      # task may still run upstream, so it is not submitted again
+TASK_TIMED_OUT = "timed_out"  # No final status in time: the task may still run upstream, not submitted again
+
+# Words of an upstream failure reason that blame the prompt or the content rather than the key
+CONTENT_REFUSAL_MARKERS = ("policy", "moderation", "safety", "violat", "content", "prompt", "inappropriate", "prohibited")
+
+def _sniff_image_type(data):
+    """MIME type of in-memory image content, from its leading bytes; None if not a known image format"""
+    head = bytes(data[:12])
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    return None
 
 class SoraImageGenerator:
     def __init__(self, proxy_host=None, proxy_port=None, proxy_user=None, proxy_pass=None, auth_token=None):
@@ -36,14 +72,11 @@ class SoraImageGenerator:
             self.proxies = None
             if self.DEBUG:
                 print("Proxy not configured. Requests will be sent directly.")
-        # Create cloudscraper instance
-        self.scraper = cloudscraper.create_scraper(
-            browser={
-                'browser': 'chrome',
-                'platform': 'windows',
-                'mobile': False
-            }
-        )
+        # Cloudflare clearance is per egress proxy, so generators share the proxy's cloudscraper
+        # session and the async transport carrying its cookies (falls back to the scraper on a challenge)
+        cf_session = cf_session_pool.get(self.proxies)
+        self.scraper = cf_session.scraper
+        self.transport = cf_session.transport
         # Set common headers - Content-Type and openai-sentinel-token are set dynamically per request
         self.base_headers = {
             "accept": "*/*",
@@ -63,6 +96,8 @@ class SoraImageGenerator:
         self.auth_token = auth_token or "Bearer eyJhbGciOiJSUzI1NiIsImtpZCI6IjE5MzQ0ZTY1LWJiYzktNDRkMS1hOWQwLWY5NTdiMDc5YmQwZSIsInR5cCI6IkpXVCJ9.eyJhdWQiOlsiaHR0cHM6Ly9hcGkub3BlbmFpLmNvbS92MSJdLCJjbGllbnRfaWQiOiJhcHBfWDh6WTZ2VzJwUTl0UjNkRTduSzFqTDVnSCIsImV4cCI6MTc0Nzk3MDExMSwiaHR0cHM6Ly9hcGkub3BlbmFpLmNvbS9hdXRoIjp7InVzZXJfaWQiOiJ1c2VyLWdNeGM0QmVoVXhmTW1iTDdpeUtqengxYiJ9LCJodHRwczovL2FwaS5vcGVuYWkuY29tL3Byb2ZpbGUiOnsiZW1haWwiOiIzajVtOTFud3VtckBmcmVlLnViby5lZHUuZ24iLCJlbWFpbF92ZXJpZmllZCI6dHJ1ZX0sImlhdCI6MTc0NzEwNjExMSwiaXNzIjoiaHR0cHM6Ly9hdXRoLm9wZW5haS5jb20iLCJqdGkiOiIzMGM4ZDJhOS0yNzkxLTRhNjQtODI2OS0yMzU3OGFhMmI0MTEiLCJuYmYiOjE3NDcxMDYxMTEsInB3ZF9hdXRoX3RpbWUiOjE3NDcxMDYxMDkxMDksInNjcCI6WyJvcGVuaWQiLCJlbWFpbCIsInByb2ZpbGUiLCJvZmZsaW5lX2FjY2VzcyIsIm1vZGVsLnJlcXVlc3QiLCJtb2RlbC5yZWFkIiwib3JnYW5pemF0aW9uLnJlYWQiLCJvcmdhbml6YXRpb24ud3JpdGUiXSwic2Vzc2lvbl9pZCI6ImF1dGhzZXNzX21yWFRwZlVENU51TDFsV05xNUhSOW9lYiIsInN1YiI6ImF1dGgwfDY4MjFkYWYyNjhiYjgxMzFkMDRkYTAwNCJ9.V4ZqYJuf_f7F_DrMMRrt-ymul5HUrqENVkiFyEwfYmzMFWthEGS6Ryia100QRlprw8jjGscHZXlUFaOcRNIarcBig8fBY6n_AB3J34MlcBv6peS-3_EJlIiH_N7j_mu-8lNpJbxk9lSlFaGpKU1IOO7kBuaAmLH-iErM-wqBfSlnnAq8h4iqBDxi4CMTcAhVm2-qG7u7f0Ho1TCGa7wrdchWtZxyfHIqNWkC88qBlUwTH5g2vRL419_zIKEWKyAtV2WNI68vpyBLrRVhtnpDh0jcrm2WqCj2X2LQqNFkFKoui3wCdG9Vskpl39l9sV54HuV7w6stQIausR1F4Y9NbjsBAyLIimZOllCwYAefTC2BOpIHfOA3_D58G3SEiRADVK7pK7ip6QsEI__GteoeCuRvZA9b5jLmhVS0SUlDYSOoNwlJ_ejfEpPJcmHUchFa7bUkS-XVrEUgr1yP5FxPwWUyn7UWrW_dZ3lVW1EU4Bp6Kp6JuwyOFf2Mj-V3_9tc8qJRClI8WHUf6In0hiO_pGbFCI2opkF3XusAQKmTB12nPBsmSlwewigTPhAj3nf-8Ze3O-etnBrV5pz_woIwQsQ54T-wgEdrLWDE6dSqNDulfpldF6Cok62212kW8w3SY3V7VSq5Tr1KRyWXJEH-haVb6qmAE2ldDjeHvJossWg" # Replace with your valid token or read from environment variable
         if not self.auth_token or not self.auth_token.startswith("Bearer "):
             raise ValueError("Invalid or missing auth token (should start with 'Bearer ')")
+        # Retry state of the client request this generator serves, shared by all its stages (see _request_retry)
+        self._retry = None
         self.gen_url = "https://sora.chatgpt.com/backend/video_gen"
         self.check_url = "https://sora.chatgpt.com/backend/video_gen"
         self.upload_url = "https://sora.chatgpt.com/backend/uploads"
@@ -105,6 +140,22 @@ class SoraImageGenerator:
         base_token["c"] = "".join(c_chars)
         return json.dumps(base_token)
     
+    @staticmethod
+    def _is_content_refusal(failure_reason):
+        """Whether an upstream task failure reason blames the prompt or content rather than the key"""
+        reason = str(failure_reason).lower()
+        return any(marker in reason for marker in CONTENT_REFUSAL_MARKERS)
+    
+    def _request_retry(self):
+        """
+        Retry state of the client request this generator serves (generators are created per request).
+        Upload, task submission and status checks all draw from it, so the request counts once toward
+        the retry budget and RETRY_MAX_ATTEMPTS bounds the retries of the whole request.
+        """
+        if self._retry is None:
+            self._retry = retry_policy.start()
+        return self._retry
+    
     def _generate_random_id(self):
         """Generate a random ID similar to a UUID format"""
         return f"{self._random_hex(8)}-{self._random_hex(4)}-{self._random_hex(4)}-{self._random_hex(4)}-{self._random_hex(12)}"
@@ -113,7 +164,7 @@ class SoraImageGenerator:
         """Generate a random hexadecimal string of a specified length"""
         return ''.join(random.choice(string.hexdigits.lower()) for _ in range(length))
     
-    def generate_image(self, prompt, num_images=1, width=720, height=480):
+    async def generate_image(self, prompt, num_images=1, width=720, height=480):
         """
         Generate one or more images and return a list of image URLs.
         Args:
@@ -147,58 +198,11 @@ class SoraImageGenerator:
             "inpaint_items": []
         }
         try:
-            task_id = self._submit_task(payload, referer="https://sora.chatgpt.com/explore")
-            if not task_id:
-                # Task submission failed, attempt switching API key and retry
-                if self.DEBUG:
-                    print(f"Task submission failed, attempting to switch API key and retry")
-                
-                try:
-                    # Import here to avoid circular import
-                    from .key_manager import key_manager
-                    # Mark current key invalid and get a new one
-                    new_key = key_manager.mark_key_invalid(self.auth_token)
-                    if new_key:
-                        self.auth_token = new_key
-                        if self.DEBUG:
-                            print(f"Switched to a new API key, retrying task")
-                        # Retry task submission with the new key
-                        task_id = self._submit_task(payload, referer="https://sora.chatgpt.com/explore")
-                        if not task_id:
-                            return "Task submission failed (tried switching keys)"
-                    else:
-                        return "Task submission failed (no alternate keys available)"
-                except ImportError:
-                    if self.DEBUG:
-                        print(f"Failed to import key_manager, cannot switch keys automatically")
-                    return "Task submission failed"
-                except Exception as e:
-                    if self.DEBUG:
-                        print(f"Error switching API keys: {str(e)}")
-                    return f"Task submission failed: {str(e)}"
-            
-            if self.DEBUG:
-                print(f"Task submitted, ID: {task_id}")
-            # Poll task status until completion
-            image_urls = self._poll_task_status(task_id)
-            
-            # If polling returns an error message, try switching key and retry
-            if isinstance(image_urls, str) and any(k in image_urls.lower() for k in ["fail", "failed", "error"]):
-                if self.DEBUG:
-                    print(f"Task failed, attempting to switch API key and retry")
-                
-                try:
-                    from .key_manager import key_manager
-                    new_key = key_manager.mark_key_invalid(self.auth_token)
-                    if new_key:
-                        self.auth_token = new_key
-                        if self.DEBUG:
-                            print(f"Switched to a new API key, retrying the entire generation process")
-                        # Retry the entire generation process with the new key
-                        return self.generate_image(prompt, num_images, width, height)
-                except (ImportError, Exception) as e:
-                    if self.DEBUG:
-                        print(f"Failed to switch API keys or retry: {str(e)}")
+            # Submit and poll, retrying with other keys within the retry policy
+            image_urls = await self._run_task(
+                payload, "https://sora.chatgpt.com/explore",
+                PollSchedule.operation_key("simple_compose", num_images), label="Task"
+            )
             
             # Image localization
             if Config.IMAGE_LOCALIZATION and isinstance(image_urls, list) and image_urls:
@@ -211,16 +215,9 @@ class SoraImageGenerator:
                     print(f"================================\n")
                 
                 try:
-                    # Create an event loop and run image localization
-                    if self.DEBUG:
-                        print(f"Creating async event loop for image downloads...")
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    
                     if self.DEBUG:
                         print(f"Calling localize_image_urls()...")
-                    localized_urls = loop.run_until_complete(localize_image_urls(image_urls))
-                    loop.close()
+                    localized_urls = await localize_image_urls(image_urls)
                     
                     if self.DEBUG:
                         print(f"\n================================")
@@ -272,109 +269,99 @@ class SoraImageGenerator:
             traceback.print_exc()
             return f"Error generating images: {str(e)}"
     
-    def upload_image(self, file_path):
+    async def upload_image(self, image, file_name=None, mime_type=None):
         """
-        Upload a local image file to the Sora backend.
+        Upload an image to the Sora backend.
         Args:
-        file_path (str): Local image file path.
+        image (str | bytes | memoryview): Local image file path, or the image content in memory.
+        file_name (str, optional): File name sent with in-memory content. Defaults to a generated name.
+        mime_type (str, optional): MIME type of in-memory content. Detected from the content if omitted.
         Returns:
         dict or str: Dict with upload info on success, or an error message string on failure.
         """
-        if not os.path.exists(file_path):
-            return f"Error: File not found '{file_path}'"
-        file_name = os.path.basename(file_path)
-        mime_type, _ = mimetypes.guess_type(file_path)
-        if not mime_type or not mime_type.startswith('image/'):
-            return f"Error: Unable to determine file type or file is not an image '{file_path}' (Mime: {mime_type})"
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            # In-memory content is sent as is, without a temp-file round trip
+            file_content = image
+            # Unrecognized content is labelled PNG, as the former temp files were
+            mime_type = mime_type or _sniff_image_type(image) or "image/png"
+            file_name = file_name or f"upload_{self._generate_random_id()}{mimetypes.guess_extension(mime_type) or ''}"
+        else:
+            file_path = image
+            if not os.path.exists(file_path):
+                return f"Error: File not found '{file_path}'"
+            file_name = file_name or os.path.basename(file_path)
+            mime_type = mime_type or mimetypes.guess_type(file_path)[0]
+            if not mime_type or not mime_type.startswith('image/'):
+                return f"Error: Unable to determine file type or file is not an image '{file_path}' (Mime: {mime_type})"
+            try:
+                with open(file_path, 'rb') as f:
+                    file_content = f.read()
+            except Exception as e:
+                return f"Error uploading image: {str(e)}"
         if self.DEBUG:
             print(f"Starting image upload: {file_name} (Type: {mime_type})")
         # For multipart/form-data, Content-Type header is set automatically by requests
         headers = self._get_dynamic_headers(content_type=None, referer="https://sora.chatgpt.com/library") # Referer from example
         
         # Attempt upload
-        return self._try_upload_with_retry(file_path, file_name, mime_type, headers)
+        return await self._try_upload_with_retry(file_content, file_name, mime_type, headers)
     
-    def _try_upload_with_retry(self, file_path, file_name, mime_type, headers, is_retry=False):
-        """Attempt to upload an image, with optional API key switch and retry on failure"""
-        # Save the current API key to ensure the entire upload uses the same key
-        current_auth_token = self.auth_token
+    async def _try_upload_with_retry(self, file_content, file_name, mime_type, headers):
+        """Attempt to upload an image, switching keys and retrying within the retry policy on key-related failures"""
+        retry = self._request_retry()
         
-        files = {
-            'file': (file_name, open(file_path, 'rb'), mime_type),
-            'file_name': (None, file_name) # The second field is the file name
-        }
-        try:
-            response = self.scraper.post(
-                self.upload_url,
-                headers=headers,
-                files=files, # Use the 'files' parameter to upload
-                proxies=self.proxies,
-                timeout=60 # Upload may take longer
-            )
-            if response.status_code == 200:
-                result = response.json()
-                if self.DEBUG:
-                    print(f"Image uploaded successfully! Media ID: {result.get('id')}")
-                # Ensure the response includes the API key used for upload
-                result['used_auth_token'] = current_auth_token
-                # print(f"Upload response: {json.dumps(result, indent=2)}") # Optional: full response
-                return result # Dict containing id, url, etc.
-            else:
+        while True:
+            # Save the current API key to ensure the entire upload uses the same key
+            current_auth_token = self.auth_token
+            try:
+                files = {
+                    'file': (file_name, file_content, mime_type),
+                    'file_name': (None, file_name) # The second field is the file name
+                }
+                response = await self.transport.post(
+                    self.upload_url,
+                    headers=headers,
+                    files=files, # Use the 'files' parameter to upload
+                    timeout=60 # Upload may take longer
+                )
+                if response.status_code == 200:
+                    result = response.json()
+                    if self.DEBUG:
+                        print(f"Image uploaded successfully! Media ID: {result.get('id')}")
+                    # Ensure the response includes the API key used for upload
+                    result['used_auth_token'] = current_auth_token
+                    # print(f"Upload response: {json.dumps(result, indent=2)}") # Optional: full response
+                    return result # Dict containing id, url, etc.
+                
                 error_msg = f"Failed to upload image, status code: {response.status_code}, response: {response.text}"
                 if self.DEBUG:
                     print(error_msg)
-                
-                # If not already retrying and response suggests an API key issue, try switching keys
-                if not is_retry and (response.status_code in [401, 403] or "auth" in response.text.lower() or "token" in response.text.lower()):
-                    if self.DEBUG:
-                        print(f"Upload failure may be related to API key, attempting to switch key and retry")
-                    
-                    try:
-                        from .key_manager import key_manager
-                        new_key = key_manager.mark_key_invalid(self.auth_token)
-                        if new_key:
-                            self.auth_token = new_key
-                            if self.DEBUG:
-                                print(f"Switched to new API key, retrying upload")
-                            # Update headers and retry
-                            new_headers = self._get_dynamic_headers(content_type=None, referer="https://sora.chatgpt.com/library")
-                            return self._try_upload_with_retry(file_path, file_name, mime_type, new_headers, is_retry=True)
-                    except (ImportError, Exception) as e:
-                        if self.DEBUG:
-                            print(f"Failed to switch API key: {str(e)}")
-                
-                return error_msg
-        except Exception as e:
-            error_msg = f"Error uploading image: {str(e)}"
-            if self.DEBUG:
-                print(error_msg)
-            
-            # If not already retrying, try switching key and retry
-            if not is_retry:
+                # Only retry when the response suggests an API key issue
+                if not (response.status_code in [401, 403] or "auth" in response.text.lower() or "token" in response.text.lower()):
+                    return error_msg
+                failure_kind = SUBMIT_KEY_REJECTED if response.status_code in [401, 403] else SUBMIT_FAILED
+                if self.DEBUG:
+                    print(f"Upload failure may be related to API key, attempting to switch key and retry")
+            except Exception as e:
+                error_msg = f"Error uploading image: {str(e)}"
+                failure_kind = SUBMIT_FAILED
                 if self.DEBUG:
+                    print(error_msg)
                     print(f"Exception during upload, attempting to switch API key and retry")
-                
-                try:
-                    from .key_manager import key_manager
-                    new_key = key_manager.mark_key_invalid(self.auth_token)
-                    if new_key:
-                        self.auth_token = new_key
-                        if self.DEBUG:
-                            print(f"Switched to new API key, retrying upload")
-                        # Update headers and retry
-                        new_headers = self._get_dynamic_headers(content_type=None, referer="https://sora.chatgpt.com/library")
-                        return self._try_upload_with_retry(file_path, file_name, mime_type, new_headers, is_retry=True)
-                except (ImportError, Exception) as err:
-                    if self.DEBUG:
-                        print(f"Failed to switch API key: {str(err)}")
             
-            return error_msg
-        finally:
-            # Ensure file handles are closed
-            if 'file' in files and files['file'][1]:
-                files['file'][1].close()
+            if not await self._switch_key_for_retry(retry, failure_kind):
+                return error_msg
+            # No task will be submitted with the previous key; give back the slot reserved on it
+            try:
+                from .key_manager import key_manager
+                key_manager.release_reservation(current_auth_token)
+            except (ImportError, Exception) as e:
+                if self.DEBUG:
+                    print(f"Error releasing key: {str(e)}")
+            # Update headers for the new key and retry
+            headers = self._get_dynamic_headers(content_type=None, referer="https://sora.chatgpt.com/library")
     
-    def generate_image_remix(self, prompt, uploaded_media_id, num_images=1, width=None, height=None):
+    async def generate_image_remix(self, prompt, uploaded_media_id, num_images=1, width=None, height=None):
         """
         Generate new images by remixing an uploaded image.
         Args:
@@ -427,69 +414,17 @@ class SoraImageGenerator:
             payload["height"] = height
         try:
             # Use 'library' as referer when submitting task (consistent with examples)
-            task_id = self._submit_task(payload, referer="https://sora.chatgpt.com/library")
-            if not task_id:
-                # Task submission failed, try switching keys and retry
-                if self.DEBUG:
-                    print(f"Remix task submission failed, attempting to switch API key and retry")
-                
-                try:
-                    # Import here to avoid circular import
-                    from .key_manager import key_manager
-                    # Mark current key invalid and get a new key
-                    new_key = key_manager.mark_key_invalid(self.auth_token)
-                    if new_key:
-                        self.auth_token = new_key
-                        if self.DEBUG:
-                            print(f"Switched to new API key, retrying Remix task")
-                        # Retry submitting the task with new key
-                        task_id = self._submit_task(payload, referer="https://sora.chatgpt.com/library")
-                        if not task_id:
-                            return "Remix task submission failed (tried switching keys)"
-                    else:
-                        return "Remix task submission failed (no alternate keys available)"
-                except ImportError:
-                    if self.DEBUG:
-                        print(f"Failed to import key_manager, cannot switch keys automatically")
-                    return "Remix task submission failed"
-                except Exception as e:
-                    if self.DEBUG:
-                        print(f"Error switching API keys: {str(e)}")
-                    return f"Remix task submission failed: {str(e)}"
-            
-            if self.DEBUG:
-                print(f"Remix task submitted, ID: {task_id}")
-            # Poll task status
-            image_urls = self._poll_task_status(task_id)
-            
-            # If polling returns an error message, try switching keys and retry
-            if isinstance(image_urls, str) and any(k in image_urls.lower() for k in ["fail", "failed", "error"]):
-                if self.DEBUG:
-                    print(f"Remix task failed, attempting to switch API key and retry")
-                
-                try:
-                    from .key_manager import key_manager
-                    new_key = key_manager.mark_key_invalid(self.auth_token)
-                    if new_key:
-                        self.auth_token = new_key
-                        if self.DEBUG:
-                            print(f"Switched to new API key, retrying the entire Remix process")
-                        # Retry the entire process with the new key
-                        return self.generate_image_remix(prompt, uploaded_media_id, num_images, width, height)
-                except (ImportError, Exception) as e:
-                    if self.DEBUG:
-                        print(f"Failed to switch API keys or retry: {str(e)}")
+            image_urls = await self._run_task(
+                payload, "https://sora.chatgpt.com/library",
+                PollSchedule.operation_key("remix", num_images), label="Remix task"
+            )
             
             # Image localization support
             if image_urls and isinstance(image_urls, list):
                 if Config.IMAGE_LOCALIZATION:
                     if self.DEBUG:
                         print(f"Localizing {len(image_urls)} images generated by Remix...")
-                    # Create event loop and run image localization
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    localized_urls = loop.run_until_complete(localize_image_urls(image_urls))
-                    loop.close()
+                    localized_urls = await localize_image_urls(image_urls)
                     
                     if self.DEBUG:
                         print(f"Remix image localization completed")
@@ -497,38 +432,112 @@ class SoraImageGenerator:
             
             return image_urls
         except Exception as e:
-            # If an exception occurs, also try switching keys and retry
             if self.DEBUG:
-                print(f"Exception during Remix generation: {str(e)}, attempting to switch API key")
+                print(f"Exception during Remix generation: {str(e)}")
             
-            try:
-                from .key_manager import key_manager
-                new_key = key_manager.mark_key_invalid(self.auth_token)
-                if new_key:
-                    self.auth_token = new_key
-                    if self.DEBUG:
-                        print(f"Switched to new API key, retrying the entire Remix process")
-                    # Retry the entire generation process with the new key
-                    return self.generate_image_remix(prompt, uploaded_media_id, num_images, width, height)
-            except (ImportError, Exception) as err:
+            return f"Error generating Remix images: {str(e)}"
+    
+    async def _run_task(self, payload, referer, operation_key, label="Task"):
+        """
+        Submit a task and poll it until completion.
+        Every attempt's outcome is recorded for the key that ran it (latency-aware selection and its
+        circuit breaker). If submission fails or upstream fails the task, the task is run again on
+        another key, as long as the retry policy allows. A task refused for its prompt is neither
+        recorded against the key nor run again, and neither is a task whose final status could not
+        be obtained (it may still be running upstream).
+        Returns:
+        list[str] or str: List of image URLs on success, or an error message string on failure
+        """
+        retry = self._request_retry()
+        while True:
+            started = time.time()
+            task_id, failure_kind = await self._submit_task(payload, referer)
+            if task_id:
                 if self.DEBUG:
-                    print(f"Failed to switch API key or retry: {str(err)}")
+                    print(f"{label} submitted, ID: {task_id}")
+                image_urls, outcome = await self._poll_task_status(task_id, operation_key)
+                if outcome is None:
+                    if isinstance(image_urls, list):
+                        self._record_generation(True, time.time() - started)
+                    return image_urls
+                if outcome != TASK_FAILED:
+                    if outcome == TASK_CHECKS_FAILED:
+                        self._record_generation(False)
+                    return image_urls
+                failure = image_urls
+                failure_kind = SUBMIT_FAILED
+            else:
+                failure = f"{label} submission failed"
             
-            return f"Error generating Remix images: {str(e)}"
+            if self.DEBUG:
+                print(f"{failure}; attempting to switch API key and retry")
+            if not await self._switch_key_for_retry(retry, failure_kind):
+                return f"{failure} ({retry.exhausted_reason or 'no alternate keys available'})"
+    
+    def _record_generation(self, success, duration=0):
+        """Feed a task outcome on the current key into latency-aware selection and its circuit breaker"""
+        try:
+            from .key_manager import key_manager
+            key_manager.record_generation_result(self.auth_token, success, duration)
+        except (ImportError, Exception) as e:
+            if self.DEBUG:
+                print(f"Failed to record request result: {str(e)}")
     
-    def _submit_task(self, payload, referer="https://sora.chatgpt.com/explore"):
-        """Submit a generation task (generic, accepts payload dict)"""
+    async def _switch_key_for_retry(self, retry, failure_kind=SUBMIT_FAILED):
+        """
+        Record the failure of the current key and switch to another one, if the retry policy allows
+        another attempt. Waits for the retry backoff before returning.
+        Args:
+        retry (RetryState): Retry state of the operation
+        failure_kind (str): SUBMIT_KEY_REJECTED opens the key's circuit right away, SUBMIT_KEY_BUSY
+                            is not the key's fault and is not recorded, SUBMIT_FAILED counts toward the
+                            key's failure rate (its circuit opens once the rate crosses the threshold)
+        Returns:
+        bool: True if the caller should retry with the new key
+        """
+        try:
+            from .key_manager import key_manager
+            if failure_kind == SUBMIT_KEY_REJECTED:
+                key_manager.trip_key_circuit(self.auth_token)
+            elif failure_kind == SUBMIT_FAILED:
+                key_manager.record_generation_result(self.auth_token, False)
+            if not retry.allow():
+                if self.DEBUG:
+                    print(f"Not retrying: {retry.exhausted_reason}")
+                return False
+            new_key = key_manager.get_key()
+        except (ImportError, Exception) as e:
+            if self.DEBUG:
+                print(f"Failed to switch API keys: {str(e)}")
+            return False
+        if not new_key:
+            if self.DEBUG:
+                print(f"No alternate keys available")
+            return False
+        self.auth_token = new_key
+        if self.DEBUG:
+            print(f"Switched to a new API key, retrying (retry {retry.retries})")
+        await retry.wait()
+        return True
+    
+    async def _submit_task(self, payload, referer="https://sora.chatgpt.com/explore"):
+        """
+        Submit a generation task (generic, accepts payload dict) with the current key.
+        Returns:
+        tuple: (task_id or None, None on success or why the submission failed: SUBMIT_KEY_REJECTED,
+               SUBMIT_KEY_BUSY or SUBMIT_FAILED)
+        """
         headers = self._get_dynamic_headers(content_type="application/json", referer=referer)
         
         # Save current auth_token in case we need to release it later
         current_auth_token = self.auth_token
+        # Temporary task ID that holds the key's concurrency slot until the real ID is known
+        temp_task_id = f"pending_task_{self._generate_random_id()}"
         
         try:
             # Try importing key_manager and mark the key as working
             try:
                 from .key_manager import key_manager
-                # Generate a temporary task ID to mark key working status
-                temp_task_id = f"pending_task_{self._generate_random_id()}"
                 key_manager.mark_key_as_working(self.auth_token, temp_task_id)
             except ImportError:
                 if self.DEBUG:
@@ -537,11 +546,10 @@ class SoraImageGenerator:
                 if self.DEBUG:
                     print(f"Error marking key as working: {str(e)}")
                 
-            response = self.scraper.post(
+            response = await self.transport.post(
                 self.gen_url,
                 headers=headers,
                 json=payload,
-                proxies=self.proxies,
                 timeout=20 # Slightly increased timeout
             )
             if response.status_code == 200:
@@ -553,7 +561,7 @@ class SoraImageGenerator:
                         try:
                             from .key_manager import key_manager
                             # Update working status with the real task ID
-                            key_manager.release_key(self.auth_token)  # Release temporary ID first
+                            key_manager.release_key(self.auth_token, temp_task_id)  # Release temporary ID first
                             key_manager.mark_key_as_working(self.auth_token, task_id)  # Re-mark with the real ID
                             if self.DEBUG:
                                 print(f"Marked key as in use, task ID: {task_id}")
@@ -561,56 +569,26 @@ class SoraImageGenerator:
                             if self.DEBUG:
                                 print(f"Error updating key status: {str(e)}")
                         
-                        return task_id
+                        return task_id, None
                     else:
                         # Task submitted successfully but no ID returned, release the key
                         try:
                             from .key_manager import key_manager
-                            key_manager.release_key(self.auth_token)
+                            key_manager.release_key(self.auth_token, temp_task_id)
                             if self.DEBUG:
                                 print(f"Task submitted without returning ID, key released")
                         except (ImportError, Exception) as e:
                             if self.DEBUG:
                                 print(f"Error releasing key: {str(e)}")
                         
-                        # Check if response content indicates a possible API key issue
-                        response_text = response.text.lower()
-                        is_auth_issue = False
-                        auth_keywords = ["authorization", "auth", "token", "permission", "unauthorized", "credentials", "login"]
-                        
-                        for keyword in auth_keywords:
-                            if keyword in response_text:
-                                is_auth_issue = True
-                                break
-                        
-                        if is_auth_issue:
-                            if self.DEBUG:
-                                print(f"API response indicates a possible authentication issue, attempting to switch keys")
-                            
-                            try:
-                                from .key_manager import key_manager
-                                new_key = key_manager.mark_key_invalid(self.auth_token)
-                                if new_key:
-                                    self.auth_token = new_key
-                                    if self.DEBUG:
-                                        print(f"Switched to new API key, retrying request")
-                                    # Retry the request with the new key
-                                    return self._submit_task(payload, referer)
-                            except ImportError:
-                                if self.DEBUG:
-                                    print(f"Failed to import key_manager, cannot switch keys automatically")
-                            except Exception as e:
-                                if self.DEBUG:
-                                    print(f"Error switching API keys: {str(e)}")
-                        
                         if self.DEBUG:
                             print(f"Task submitted successfully, but task ID not found in response. Response: {response.text}")
-                        return None
+                        return None, SUBMIT_FAILED
                 except json.JSONDecodeError:
                     # Release the key
                     try:
                         from .key_manager import key_manager
-                        key_manager.release_key(self.auth_token)
+                        key_manager.release_key(self.auth_token, temp_task_id)
                         if self.DEBUG:
                             print(f"JSON decode failed, key released")
                     except (ImportError, Exception) as e:
@@ -619,12 +597,12 @@ class SoraImageGenerator:
                         
                     if self.DEBUG:
                         print(f"Task submitted successfully, but unable to parse response JSON. Status: {response.status_code}, Response: {response.text}")
-                    return None
+                    return None, SUBMIT_FAILED
             else:
                 # Release the key
                 try:
                     from .key_manager import key_manager
-                    key_manager.release_key(self.auth_token)
+                    key_manager.release_key(self.auth_token, temp_task_id)
                     if self.DEBUG:
                         print(f"Request failed, key released")
                 except (ImportError, Exception) as e:
@@ -650,73 +628,21 @@ class SoraImageGenerator:
                     
                     if is_concurrent_issue:
                         if self.DEBUG:
-                            print(f"Detected concurrency limit error; current key is processing other tasks. Getting a new key without disabling the current one")
-                        try:
-                            from .key_manager import key_manager
-                            # Get a new available key without marking current one invalid
-                            new_key = key_manager.get_key()
-                            if new_key:
-                                self.auth_token = new_key
-                                if self.DEBUG:
-                                    print(f"Acquired a new API key, retrying request")
-                                # Retry with the new key
-                                return self._submit_task(payload, referer)
-                            else:
-                                if self.DEBUG:
-                                    print(f"No alternate keys available")
-                        except (ImportError, Exception) as e:
-                            if self.DEBUG:
-                                print(f"Error getting new key: {str(e)}")
-                        return None
-                
-                # Check for authentication failure (401/403) or other API key issues
-                response_text = response.text.lower()
-                is_auth_issue = (
-                    response.status_code in [401, 403] or
-                    "authorization" in response_text or
-                    "auth" in response_text or
-                    "token" in response_text or
-                    "permission" in response_text or
-                    "unauthorized" in response_text or
-                    "credentials" in response_text or
-                    "login" in response_text or
-                    "invalid" in response_text
-                ) and not (
-                    # Exclude errors caused by concurrency limits
-                    "concurrent" in response_text or 
-                    "too many" in response_text or 
-                    "wait" in response_text or
-                    "progress" in response_text
-                )
+                            print(f"Detected concurrency limit error; current key is processing other tasks. Retrying on another key without counting a failure")
+                        return None, SUBMIT_KEY_BUSY
                 
-                if is_auth_issue:
+                # Only a rejection of the credentials themselves takes the key out right away;
+                # other failures (including auth-sounding messages) count toward its failure rate
+                if response.status_code in [401, 403]:
                     if self.DEBUG:
-                        print(f"API key may have expired, attempting to switch keys")
-                    
-                    try:
-                        # Import here to avoid circular import
-                        from .key_manager import key_manager
-                        # Mark current key invalid and get a new one
-                        new_key = key_manager.mark_key_invalid(self.auth_token)
-                        if new_key:
-                            self.auth_token = new_key
-                            if self.DEBUG:
-                                print(f"Switched to new API key, retrying request")
-                            # Retry the request with the new key
-                            return self._submit_task(payload, referer)
-                    except ImportError:
-                        if self.DEBUG:
-                            print(f"Failed to import key_manager, cannot switch keys automatically")
-                    except Exception as e:
-                        if self.DEBUG:
-                            print(f"Error switching API keys: {str(e)}")
-                            
-                return None
+                        print(f"API key was rejected (status {response.status_code}), switching keys")
+                    return None, SUBMIT_KEY_REJECTED
+                return None, SUBMIT_FAILED
         except Exception as e:
             # Ensure the key is released
             try:
                 from .key_manager import key_manager
-                key_manager.release_key(current_auth_token)
+                key_manager.release_key(current_auth_token, temp_task_id)
                 if self.DEBUG:
                     print(f"Exception occurred, key released")
             except (ImportError, Exception) as release_err:
@@ -725,253 +651,147 @@ class SoraImageGenerator:
                 
             if self.DEBUG:
                 print(f"Error submitting task: {str(e)}")
+            return None, SUBMIT_FAILED
             
-            # Check if the exception indicates a possible authentication issue
-            error_str = str(e).lower()
-            is_auth_issue = (
-                "authorization" in error_str or
-                "auth" in error_str or
-                "token" in error_str or
-                "permission" in error_str or
-                "unauthorized" in error_str or
-                "credentials" in error_str or
-                "login" in error_str
-            )
-            
-            if is_auth_issue:
-                if self.DEBUG:
-                    print(f"Exception suggests a possible API key issue, attempting to switch keys")
-                
-                try:
-                    from .key_manager import key_manager
-                    new_key = key_manager.mark_key_invalid(self.auth_token)
-                    if new_key:
-                        self.auth_token = new_key
-                        if self.DEBUG:
-                            print(f"Switched to new API key, retrying request")
-                        # Retry the request with the new key
-                        return self._submit_task(payload, referer)
-                except (ImportError, Exception) as err:
-                    if self.DEBUG:
-                        print(f"Failed to switch API key: {str(err)}")
-            
-            return None
-            
-    def _poll_task_status(self, task_id, max_attempts=40, interval=5):
+    async def _poll_task_status(self, task_id, operation_key=None, timeout=None):
         """
         Poll task status until completion and return all generated image URLs.
+        Tasks on the same key share one list request per tick (see KeyTaskPoller);
+        check times follow the completion times learned for the operation (see PollSchedule).
+        Returns:
+        tuple: (list of image URLs or an error message string, None if the task reached a final state
+               that needs no further action, or TASK_FAILED, TASK_REFUSED, TASK_CHECKS_FAILED or
+               TASK_TIMED_OUT)
         """
         # Save the current key so we can release it correctly at the end
         current_auth_token = self.auth_token
+        poller = get_task_poller(current_auth_token, self)
+        timeout = timeout or Config.TASK_POLL_TIMEOUT
+        started = time.time()
+        deadline = started + timeout
+        attempt = 0
+        # Failed status checks are retries of the request; polling gives up once the policy allows no more
+        retry = self._request_retry()
+        check_failure = None
         
         if self.DEBUG:
             print(f"Polling status for task {task_id}...")
         try:
-            for attempt in range(max_attempts):
+            while time.time() < deadline:
+                delay = poll_schedule.next_delay(operation_key, time.time() - started)
+                await asyncio.sleep(min(delay, max(0, deadline - time.time())))
+                attempt += 1
                 try:
-                    headers = self._get_dynamic_headers(referer="https://sora.chatgpt.com/library") # Polling often happens from library view
-                    query_url = f"{self.check_url}?limit=10" # Fetch recent tasks to reduce payload
-                    response = self.scraper.get(
-                        query_url,
-                        headers=headers,
-                        proxies=self.proxies,
-                        timeout=15
-                    )
+                    # One shared list request per key and tick answers every task waiting on it
+                    response = await poller.poll(task_id)
                     if response.status_code == 200:
-                        try:
-                            result = response.json()
-                            task_responses = result.get("task_responses", [])
-                            # Find the matching task
-                            for task in task_responses:
-                                if task.get("id") == task_id:
-                                    status = task.get("status")
+                        task = response.task
+                        if task is not None:
+                            status = task.get("status")
+                            if self.DEBUG:
+                                print(f"  Task {task_id} status: {status} (check {attempt}, {time.time() - started:.1f}s)")
+                            if status == "succeeded":
+                                # Feed the completion time back into the schedule
+                                poll_schedule.record(operation_key, time.time() - started)
+                                # Task succeeded; release the key
+                                try:
+                                    from .key_manager import key_manager
+                                    key_manager.release_key(current_auth_token, task_id)
+                                    if self.DEBUG:
+                                        print(f"Task succeeded, key released")
+                                except (ImportError, Exception) as e:
                                     if self.DEBUG:
-                                        print(f"  Task {task_id} status: {status} (attempt {attempt+1}/{max_attempts})")
-                                    if status == "succeeded":
-                                        # Task succeeded; release the key
-                                        try:
-                                            from .key_manager import key_manager
-                                            key_manager.release_key(current_auth_token)
-                                            if self.DEBUG:
-                                                print(f"Task succeeded, key released")
-                                        except (ImportError, Exception) as e:
-                                            if self.DEBUG:
-                                                print(f"Error releasing key: {str(e)}")
+                                        print(f"Error releasing key: {str(e)}")
                                                 
-                                        generations = task.get("generations", [])
-                                        image_urls = []
-                                        if generations:
-                                            for gen in generations:
-                                                url = gen.get("url")
-                                                if url:
-                                                    image_urls.append(url)
-                                        if image_urls:
-                                            if self.DEBUG:
-                                                print(f"Task {task_id} completed successfully! Found {len(image_urls)} images.")
-                                            return image_urls
-                                        else:
-                                            if self.DEBUG:
-                                                print(f"Task {task_id} is 'succeeded' but no valid image URLs were found in the response.")
-                                            if self.DEBUG:
-                                                print(f"Task details: {json.dumps(task, indent=2)}")
-                                            return "Task succeeded but no image URLs were found"
-                                    elif status == "failed":
-                                        # Task failed; release the key
-                                        try:
-                                            from .key_manager import key_manager
-                                            key_manager.release_key(current_auth_token)
-                                            if self.DEBUG:
-                                                print(f"Task failed, key released")
-                                        except (ImportError, Exception) as e:
-                                            if self.DEBUG:
-                                                print(f"Error releasing key: {str(e)}")
+                                generations = task.get("generations", [])
+                                image_urls = []
+                                if generations:
+                                    for gen in generations:
+                                        url = gen.get("url")
+                                        if url:
+                                            image_urls.append(url)
+                                if image_urls:
+                                    if self.DEBUG:
+                                        print(f"Task {task_id} completed successfully! Found {len(image_urls)} images.")
+                                    return image_urls, None
+                                else:
+                                    if self.DEBUG:
+                                        print(f"Task {task_id} is 'succeeded' but no valid image URLs were found in the response.")
+                                    if self.DEBUG:
+                                        print(f"Task details: {json.dumps(task, indent=2)}")
+                                    return "Task succeeded but no image URLs were found", None
+                            elif status == "failed":
+                                # Task failed; release the key
+                                try:
+                                    from .key_manager import key_manager
+                                    key_manager.release_key(current_auth_token, task_id)
+                                    if self.DEBUG:
+                                        print(f"Task failed, key released")
+                                except (ImportError, Exception) as e:
+                                    if self.DEBUG:
+                                        print(f"Error releasing key: {str(e)}")
                                                 
-                                        failure_reason = task.get("failure_reason", "unknown reason")
-                                        if self.DEBUG:
-                                            print(f"Task {task_id} failed: {failure_reason}")
-                                        # Check if the failure may be caused by API key issues
-                                        failure_reason_lower = failure_reason.lower()
-                                        auth_keywords = [
-                                            "authorization", "auth", "token", "permission", 
-                                            "unauthorized", "credentials", "login", "invalid"
-                                        ]
-                                        is_auth_issue = any(keyword in failure_reason_lower for keyword in auth_keywords)
-                                        
-                                        if is_auth_issue:
-                                            if self.DEBUG:
-                                                print(f"Detected possible API key issue; attempting to switch keys")
-                                            try:
-                                                # Import here to avoid circular import
-                                                from .key_manager import key_manager
-                                                # Mark current key invalid and get a new one
-                                                new_key = key_manager.mark_key_invalid(self.auth_token)
-                                                if new_key:
-                                                    self.auth_token = new_key
-                                                    if self.DEBUG:
-                                                        print(f"Switched to a new API key")
-                                            except ImportError:
-                                                if self.DEBUG:
-                                                    print(f"Failed to import key_manager, cannot switch keys automatically")
-                                            except Exception as e:
-                                                if self.DEBUG:
-                                                    print(f"Error switching API keys: {str(e)}")
-                                            return f"Task failed: {failure_reason}"
-                                    elif status in ["rejected", "needs_user_review"]:
-                                        # Task rejected; release the key
-                                        try:
-                                            from .key_manager import key_manager
-                                            key_manager.release_key(current_auth_token)
-                                            if self.DEBUG:
-                                                print(f"Task was rejected, key released")
-                                        except (ImportError, Exception) as e:
-                                            if self.DEBUG:
-                                                print(f"Error releasing key: {str(e)}")
+                                failure_reason = task.get("failure_reason", "unknown reason")
+                                if self.DEBUG:
+                                    print(f"Task {task_id} failed: {failure_reason}")
+                                # A refusal of the prompt is final; other failures may run again on another key
+                                if self._is_content_refusal(failure_reason):
+                                    return f"Task failed: {failure_reason}", TASK_REFUSED
+                                return f"Task failed: {failure_reason}", TASK_FAILED
+                            elif status in ["rejected", "needs_user_review"]:
+                                # Task rejected; release the key
+                                try:
+                                    from .key_manager import key_manager
+                                    key_manager.release_key(current_auth_token, task_id)
+                                    if self.DEBUG:
+                                        print(f"Task was rejected, key released")
+                                except (ImportError, Exception) as e:
+                                    if self.DEBUG:
+                                        print(f"Error releasing key: {str(e)}")
                                                 
-                                        if self.DEBUG:
-                                            print(f"Task {task_id} was rejected or needs review: {status}")
-                                        return f"Task rejected or needs review: {status}"
-                                    # else status is pending, processing, etc. - continue polling
-                                    break # Found the task, no need to check others in this response
-                            else:
-                                # Task ID not found in the recent list; continue waiting
                                 if self.DEBUG:
-                                    print(f"  Task {task_id} not found in recent list, waiting... (attempt {attempt+1}/{max_attempts})")
-                        except json.JSONDecodeError:
+                                    print(f"Task {task_id} was rejected or needs review: {status}")
+                                return f"Task rejected or needs review: {status}", TASK_REFUSED
+                            # else status is pending, processing, etc. - continue polling
+                        else:
+                            # Task ID not found in the recent pages; continue waiting
                             if self.DEBUG:
-                                print(f"Unable to parse JSON while checking task status. Status: {response.status_code}, Response: {response.text}")
+                                print(f"  Task {task_id} not found in recent pages, waiting... (check {attempt}, {time.time() - started:.1f}s)")
                     else:
                         if self.DEBUG:
                             print(f"Failed to check task status, status: {response.status_code}, response: {response.text}")
-                        
-                        # Check for authentication failure or other possible API key issues
-                        response_text = response.text.lower()
-                        is_auth_issue = (
-                            response.status_code in [401, 403, 429] or
-                            "authorization" in response_text or
-                            "auth" in response_text or
-                            "token" in response_text or
-                            "permission" in response_text or
-                            "unauthorized" in response_text or
-                            "credentials" in response_text or
-                            "login" in response_text or
-                            "invalid" in response_text
-                        )
-                        
-                        if is_auth_issue:
-                            if self.DEBUG:
-                                print(f"API key may have expired, attempting to switch keys")
-                            
-                            try:
-                                # Import here to avoid circular import
-                                from .key_manager import key_manager
-                                # Mark current key invalid and get a new one
-                                new_key = key_manager.mark_key_invalid(self.auth_token)
-                                if new_key:
-                                    self.auth_token = new_key
-                                    if self.DEBUG:
-                                        print(f"Switched to new API key, retrying request")
-                                    # Continue polling with the new key
-                                    continue
-                            except ImportError:
-                                if self.DEBUG:
-                                    print(f"Failed to import key_manager, cannot switch keys automatically")
-                            except Exception as e:
-                                if self.DEBUG:
-                                    print(f"Error switching API keys: {str(e)}")
-                                    
-                    time.sleep(interval)  # Wait before checking again
+                        if not retry.allow():
+                            check_failure = f"status {response.status_code}, {retry.exhausted_reason}"
+                            break
+                        # The task belongs to this key, so the check is retried with the same key
+                        # (even on auth errors); the retry policy decides when polling gives up
+                        await retry.wait()
                 except Exception as e:
                     if self.DEBUG:
                         print(f"Error while checking task status: {str(e)}")
-                    
-                    # Check if the exception suggests an authentication issue
-                    error_str = str(e).lower()
-                    is_auth_issue = (
-                        "authorization" in error_str or
-                        "auth" in error_str or
-                        "token" in error_str or
-                        "permission" in error_str or
-                        "unauthorized" in error_str or
-                        "credentials" in error_str or
-                        "login" in error_str
-                    )
-                    
-                    if is_auth_issue:
-                        if self.DEBUG:
-                            print(f"Exception suggests a possible API key issue, attempting to switch keys")
-                        
-                        try:
-                            from .key_manager import key_manager
-                            new_key = key_manager.mark_key_invalid(self.auth_token)
-                            if new_key:
-                                self.auth_token = new_key
-                                if self.DEBUG:
-                                    print(f"Switched to new API key, retrying request")
-                                # Reset current attempt and continue polling
-                                continue
-                        except (ImportError, Exception) as err:
-                            if self.DEBUG:
-                                print(f"Failed to switch API key: {str(err)}")
-                    
-                    # Add a slightly longer delay on error to avoid hammering the server
-                    time.sleep(interval * 1.5)
+                    if not retry.allow():
+                        check_failure = f"{str(e)}, {retry.exhausted_reason}"
+                        break
+                    await retry.wait()
             
-            # If we have reached the max number of attempts, release the key
+            # Polling timed out or gave up on failing status checks; release the key
             try:
                 from .key_manager import key_manager
-                key_manager.release_key(current_auth_token)
+                key_manager.release_key(current_auth_token, task_id)
                 if self.DEBUG:
-                    print(f"Polling timed out, key released")
+                    print(f"Polling stopped, key released")
             except (ImportError, Exception) as e:
                 if self.DEBUG:
                     print(f"Error releasing key: {str(e)}")
-                
-            return f"Task {task_id} timed out ({max_attempts * interval} seconds), final status not obtained"
+            
+            if check_failure:
+                return f"Task {task_id} status checks failed ({check_failure}), final status not obtained", TASK_CHECKS_FAILED
+            return f"Task {task_id} timed out ({int(timeout)} seconds), final status not obtained", TASK_TIMED_OUT
         except Exception as e:
             # Ensure the key is released on exception as well
             try:
                 from .key_manager import key_manager
-                key_manager.release_key(current_auth_token)
+                key_manager.release_key(current_auth_token, task_id)
                 if self.DEBUG:
                     print(f"Exception during polling, key released")
             except (ImportError, Exception) as release_err:
@@ -982,24 +802,52 @@ class SoraImageGenerator:
                 print(f"Unhandled exception while polling task status: {str(e)}")
             import traceback
             traceback.print_exc()
-            return f"Error while polling task status: {str(e)}"
+            return f"Error while polling task status: {str(e)}", TASK_CHECKS_FAILED
     
-    def test_connection(self):
+    async def test_connection(self, switch_on_failure=True):
         """
         Test if the API connection is valid by sending a lightweight request.
+        Args:
+        switch_on_failure (bool): On an auth failure, record it for the key and retry with another key,
+                                  as long as the retry policy allows. The background key prober passes
+                                  False to test one specific key.
         Returns:
         dict: A dict containing the connection status information.
         """
+        retry = self._request_retry()
+        while True:
+            result, failure_kind = await self._test_connection_once()
+            if failure_kind is None or not switch_on_failure:
+                return result
+            if self.DEBUG:
+                print(f"API key may have expired, attempting to switch keys")
+            if not await self._switch_key_for_retry(retry, failure_kind):
+                return result
+            # The test runs no task on the new key; give back the slot get_key reserved on it
+            try:
+                from .key_manager import key_manager
+                key_manager.release_reservation(self.auth_token)
+            except (ImportError, Exception) as e:
+                if self.DEBUG:
+                    print(f"Error releasing key: {str(e)}")
+            if self.DEBUG:
+                print(f"Switched to new API key, retrying connection test")
+    
+    async def _test_connection_once(self):
+        """
+        Run the connection test once with the current key.
+        Returns:
+        tuple: (result dict, None or why the key failed: SUBMIT_KEY_REJECTED or SUBMIT_FAILED)
+        """
         start_time = time.time()  # Record start time to compute response time
         success = False  # Initialize request result flag
         
         try:
             # Use a simple GET request to validate connectivity and authentication
             headers = self._get_dynamic_headers(referer="https://sora.chatgpt.com/explore")
-            response = self.scraper.get(
+            response = await self.transport.get(
                 "https://sora.chatgpt.com/backend/parameters",
                 headers=headers,
-                proxies=self.proxies,
                 timeout=10
             )
             
@@ -1007,41 +855,22 @@ class SoraImageGenerator:
                 result = response.json()
                 # Check for key fields in the response to confirm API is valid
                 api_valid = result.get("can_create_images") is not None or "limits_for_images" in result
+                success = api_valid
+                self._record_test_result(success, time.time() - start_time)
                 
                 if api_valid:
-                    success = True  # Mark success
-                    # Record the request result (success)
-                    try:
-                        from .key_manager import key_manager
-                        response_time = time.time() - start_time
-                        key_manager.record_request_result(self.auth_token, success, response_time)
-                    except (ImportError, Exception) as e:
-                        if self.DEBUG:
-                            print(f"Failed to record request result: {str(e)}")
-                    
                     return {
                         "status": "success",
                         "message": "API connection test succeeded",
                         "data": result
-                    }
+                    }, None
                 else:
                     # API returned 200 but data was not as expected
-                    success = False  # Mark failure
-                    
-                    # Record the request result (failure)
-                    try:
-                        from .key_manager import key_manager
-                        response_time = time.time() - start_time
-                        key_manager.record_request_result(self.auth_token, success, response_time)
-                    except (ImportError, Exception) as e:
-                        if self.DEBUG:
-                            print(f"Failed to record request result: {str(e)}")
-                    
                     return {
                         "status": "error",
                         "message": "API connection test failed: response data format not as expected",
                         "response": result
-                    }
+                    }, None
             else:
                 # Check for authentication failure or other API key issue
                 response_text = response.text.lower()
@@ -1057,55 +886,18 @@ class SoraImageGenerator:
                     "invalid" in response_text
                 )
                 
-                success = False  # Mark failure
-                
-                # Record the request result (failure)
-                try:
-                    from .key_manager import key_manager
-                    response_time = time.time() - start_time
-                    key_manager.record_request_result(self.auth_token, success, response_time)
-                except (ImportError, Exception) as e:
-                    if self.DEBUG:
-                        print(f"Failed to record request result: {str(e)}")
-                
-                if is_auth_issue:
-                    if self.DEBUG:
-                        print(f"API key may have expired, attempting to switch keys")
-                    
-                    try:
-                        # Import here to avoid circular import
-                        from .key_manager import key_manager
-                        # Mark current key invalid and get a new one
-                        new_key = key_manager.mark_key_invalid(self.auth_token)
-                        if new_key:
-                            self.auth_token = new_key
-                            if self.DEBUG:
-                                print(f"Switched to new API key, retrying connection test")
-                            # Retry with the new key
-                            return self.test_connection()
-                    except ImportError:
-                        if self.DEBUG:
-                            print(f"Failed to import key_manager, cannot switch keys automatically")
-                    except Exception as e:
-                        if self.DEBUG:
-                            print(f"Error switching API keys: {str(e)}")
+                self._record_test_result(success, time.time() - start_time)
                 
-                return {
+                result = {
                     "status": "error",
                     "message": f"API connection test failed, status code: {response.status_code}",
                     "response": response.text
                 }
+                if not is_auth_issue:
+                    return result, None
+                return result, SUBMIT_KEY_REJECTED if response.status_code in [401, 403] else SUBMIT_FAILED
         except Exception as e:
-            success = False  # Mark failure
-            
-            # Record the request result (exception/failure)
-            try:
-                from .key_manager import key_manager
-                response_time = time.time() - start_time
-                key_manager.record_request_result(self.auth_token, success, response_time)
-            except (ImportError, Exception) as err:
-                if self.DEBUG:
-                    print(f"Failed to record request result: {str(err)}")
+            self._record_test_result(success, time.time() - start_time)
             
             # Check if the exception suggests an authentication issue
             error_str = str(e).lower()
@@ -1119,21 +911,14 @@ class SoraImageGenerator:
                 "login" in error_str
             )
             
-            if is_auth_issue:
-                if self.DEBUG:
-                    print(f"Exception suggests a possible API key issue, attempting to switch keys")
-                
-                try:
-                    from .key_manager import key_manager
-                    new_key = key_manager.mark_key_invalid(self.auth_token)
-                    if new_key:
-                        self.auth_token = new_key
-                        if self.DEBUG:
-                            print(f"Switched to new API key, retrying connection test")
-                        # Retry with the new key
-                        return self.test_connection()
-                except (ImportError, Exception) as err:
-                    if self.DEBUG:
-                        print(f"Failed to switch API key: {str(err)}")
-            
-            raise Exception(f"API connection test failed: {str(e)}")
\ No newline at end of file
+            result = {"status": "error", "message": f"API connection test failed: {str(e)}"}
+            return result, SUBMIT_FAILED if is_auth_issue else None
+    
+    def _record_test_result(self, success, response_time):
+        """Record a connection test in the current key's usage statistics"""
+        try:
+            from .key_manager import key_manager
+            key_manager.record_request_result(self.auth_token, success, response_time)
+        except (ImportError, Exception) as e:
+            if self.DEBUG:
+                print(f"Failed to record request result: {str(e)}")
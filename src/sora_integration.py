@@ -1,5 +1,4 @@
-import asyncio
-import concurrent.futures
+import hashlib
 from typing import List, Dict, Any, Optional, Union
 import json
 import os
@@ -9,10 +8,21 @@ import uuid
  
 # Import the original SoraImageGenerator class
 from .sora_generator import SoraImageGenerator
+from .cache import TTLCache
+from .config import Config
+
+# (sha256 of image content, key) -> upload result; Sora media can only be remixed with the key that uploaded it
+upload_cache = TTLCache(max_entries=Config.UPLOAD_CACHE_MAX_ENTRIES, ttl=Config.UPLOAD_CACHE_TTL)
+
+def _clean_key(auth_token: Optional[str]) -> str:
+    return auth_token[7:] if auth_token and auth_token.startswith("Bearer ") else (auth_token or "")
 
 class SoraClient:
     def __init__(self, proxy_host=None, proxy_port=None, proxy_user=None, proxy_pass=None, auth_token=None):
-        """Initialize Sora client, using cloudscraper to bypass CF verification"""
+        """
+        Initialize the Sora client of one request (async transport shared per proxy, with cloudscraper
+        handling CF verification). Clients switch keys on retries, so they are not shared between requests.
+        """
         self.generator = SoraImageGenerator(
             proxy_host=proxy_host, 
             proxy_port=proxy_port,
@@ -22,18 +32,11 @@ class SoraClient:
         )
         # Save the original auth_token to detect if it has been updated
         self.auth_token = auth_token
-        # Create a thread pool executor
-        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=10)
         
     async def generate_image(self, prompt: str, num_images: int = 1, 
                            width: int = 720, height: int = 480) -> List[str]:
-        """Asynchronous wrapper for SoraImageGenerator.generate_image method"""
-        loop = asyncio.get_running_loop()
-        # Use thread pool to execute synchronous methods (since cloudscraper is not async)
-        result = await loop.run_in_executor(
-            self.executor, 
-            lambda: self.generator.generate_image(prompt, num_images, width, height)
-        )
+        """Wrapper for SoraImageGenerator.generate_image method"""
+        result = await self.generator.generate_image(prompt, num_images, width, height)
         
         # Check if the auth_token in the generator has been updated (by the automatic key switching mechanism)
         if self.generator.auth_token != self.auth_token:
@@ -44,61 +47,70 @@ class SoraClient:
         else:
             raise Exception(f"Image generation failed: {result}")
     
-    async def upload_image(self, image_path: str) -> Dict:
-        """Asynchronous wrapper for upload image method"""
-        loop = asyncio.get_running_loop()
-        result = await loop.run_in_executor(
-            self.executor,
-            lambda: self.generator.upload_image(image_path)
-        )
+    async def upload_image(self, image: Union[str, bytes, memoryview], file_name: Optional[str] = None,
+                           mime_type: Optional[str] = None) -> Dict:
+        """
+        Wrapper for upload image method (accepts a file path or the image content in memory).
+        In-memory content that this key already uploaded within UPLOAD_CACHE_TTL is not uploaded again.
+        """
+        content_hash = None
+        if Config.UPLOAD_CACHE_ENABLED and isinstance(image, (bytes, bytearray, memoryview)):
+            content_hash = hashlib.sha256(image).hexdigest()
+            cached = upload_cache.get((content_hash, _clean_key(self.auth_token)))
+            if cached is not None:
+                return dict(cached)
+        
+        result = await self.generator.upload_image(image, file_name, mime_type)
         
         # Check if the auth_token in the generator has been updated
         if self.generator.auth_token != self.auth_token:
             self.auth_token = self.generator.auth_token
         
         if isinstance(result, dict) and 'id' in result:
+            if content_hash is not None:
+                # Cache under the key that actually holds the media (the upload may have switched keys)
+                upload_cache.set((content_hash, _clean_key(result.get('used_auth_token'))), dict(result))
             return result
         else:
+            # The remix will not be submitted; give back the slot get_key reserved for it
+            self._release_reservation(self.auth_token)
             raise Exception(f"Image upload failed: {result}")
             
     async def generate_image_remix(self, prompt: str, media_id: str, 
                                  num_images: int = 1) -> List[str]:
-        """Asynchronous wrapper for remix method"""
-        loop = asyncio.get_running_loop()
-        
+        """Wrapper for remix method"""
         # Handle media_id object that might contain API key information
         if isinstance(media_id, dict) and 'id' in media_id:
             # If the key used for upload is different from the current one, switch keys first
             if 'used_auth_token' in media_id and media_id['used_auth_token'] != self.auth_token:
+                # The task runs on the uploading key, so the slot reserved on the current one is not used
+                self._release_reservation(self.auth_token)
                 self.auth_token = media_id['used_auth_token']
                 # Synchronize the generator's auth_token
                 self.generator.auth_token = self.auth_token
             # Extract the actual media_id
             media_id = media_id['id']
             
-        result = await loop.run_in_executor(
-            self.executor,
-            lambda: self.generator.generate_image_remix(prompt, media_id, num_images)
-        )
+        result = await self.generator.generate_image_remix(prompt, media_id, num_images)
         
         # Check if the auth_token in the generator has been updated
         if self.generator.auth_token != self.auth_token:
             self.auth_token = self.generator.auth_token
         
+        if not isinstance(result, list):
+            # The media may be gone upstream; upload it again next time
+            upload_cache.remove_if(lambda key, cached: cached.get('id') == media_id)
+        
         if isinstance(result, list):
             return result
         else:
             raise Exception(f"Remix generation failed: {result}")
             
-    async def test_connection(self) -> Dict:
-        """Test if the API connection is valid"""
+    async def test_connection(self, switch_on_failure: bool = True) -> Dict:
+        """Test if the API connection is valid (switch_on_failure=False tests only the current key)"""
         try:
             # Simple test of upload functionality, this method will call the API but won't actually upload files
-            loop = asyncio.get_running_loop()
-            result = await loop.run_in_executor(
-                self.executor,
-                lambda: self.generator.test_connection()
-            )
+            result = await self.generator.test_connection(switch_on_failure)
             
             # Check if the auth_token in the generator has been updated
             if self.generator.auth_token != self.auth_token:
@@ -109,6 +121,10 @@ class SoraClient:
         except Exception as e:
             return {"status": "error", "message": f"API connection test failed: {str(e)}"}
             
-    def close(self):
-        """Shut down the thread pool"""
-        self.executor.shutdown(wait=False) 
\ No newline at end of file
+    def _release_reservation(self, auth_token: Optional[str]) -> None:
+        """Give back a key slot reserved by get_key for a task this client will not submit"""
+        try:
+            from .key_manager import key_manager
+            key_manager.release_reservation(auth_token)
+        except Exception:
+            pass
\ No newline at end of file
@@ -0,0 +1,275 @@
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+import aiohttp
+from yarl import URL
+
+# Initialize logger
+logger = logging.getLogger("sora-api.sora_transport")
+
+# A Cloudflare challenge page is served with one of these statuses...
+CF_CHALLENGE_STATUSES = (403, 429, 503)
+# ...and contains one of these markers (checked in the first few KB of the body)
+CF_CHALLENGE_MARKERS = ("just a moment", "cf-chl", "cf_chl", "challenge-platform", "attention required")
+# Cookies set by Cloudflare; clearance belongs to the egress IP, so only these are shared between keys
+CF_COOKIE_PREFIXES = ("cf_", "__cf", "_cfuvid")
+
+class TransportResponse:
+    """The part of requests.Response the generator relies on: status_code, text, headers and json()."""
+
+    __slots__ = ("status_code", "text", "headers")
+
+    def __init__(self, status_code: int, text: str, headers: Dict[str, str]):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+def is_cloudflare_challenge(status_code: int, headers, text: str) -> bool:
+    """Whether a response is a Cloudflare challenge rather than an answer from the Sora backend."""
+    if status_code not in CF_CHALLENGE_STATUSES:
+        return False
+    if headers.get("cf-mitigated", "").lower() == "challenge":
+        return True
+    if "cloudflare" not in headers.get("server", "").lower():
+        return False
+    head = text[:4096].lower()
+    return any(marker in head for marker in CF_CHALLENGE_MARKERS)
+
+def is_cloudflare_cookie(name: str) -> bool:
+    """Whether a cookie belongs to the Cloudflare clearance rather than to a Sora account."""
+    return name.startswith(CF_COOKIE_PREFIXES)
+
+def _cookie_scope(headers: Dict[str, str]) -> str:
+    """Cookie jar a request uses: one per Sora account, identified by a hash of its Authorization header."""
+    for name, value in headers.items():
+        if name.lower() == "authorization":
+            return hashlib.sha256(value.encode()).hexdigest()[:16]
+    return "anonymous"
+
+def _morsel_expires(morsel) -> Optional[float]:
+    """Expiry timestamp of a Set-Cookie morsel, None for a session cookie."""
+    try:
+        if morsel["max-age"]:
+            return time.time() + int(morsel["max-age"])
+        if morsel["expires"]:
+            return parsedate_to_datetime(morsel["expires"]).timestamp()
+    except (TypeError, ValueError):
+        pass
+    return None
+
+class SoraTransport:
+    """
+    Non-blocking HTTP transport for the Sora backend.
+
+    Requests go out through aiohttp sessions that carry the Cloudflare
+    clearance cookies and User-Agent of the generator's cloudscraper session, so
+    waiting on upstream no longer holds an OS thread. Only when Cloudflare
+    answers with a challenge is the request repeated through cloudscraper (in a
+    worker thread).
+
+    Clearance belongs to the egress proxy, but other cookies belong to the Sora
+    account: every key gets its own session and cookie jar, all sharing one
+    connection pool. Cloudflare cookies flow both ways between the scraper and
+    the jars (a rotated __cf_bm reaches every key), while account cookies stay in
+    the jar of the key whose response set them.
+    """
+
+    def __init__(self, scraper, proxies: Optional[Dict[str, str]] = None):
+        """
+        Initialize the transport.
+
+        Args:
+            scraper: cloudscraper session that solves challenges and holds the clearance cookies
+            proxies: requests-style proxy mapping ({'http': url, 'https': url})
+        """
+        self.scraper = scraper
+        self.proxies = proxies
+        self.proxy = proxies.get("https") if proxies else None
+        self._connector: Optional[aiohttp.BaseConnector] = None  # Connection pool shared by the key sessions
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}  # Cookie scope -> session with the key's jar
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._synced_cookies: Dict[str, Dict[Tuple[str, str], str]] = {}  # Cookie scope -> clearance last copied in
+        self._fallback_lock: Optional[asyncio.Lock] = None
+        self._closing = set()  # Tasks closing the sessions of a previous event loop
+
+    def _get_session(self, scope: str) -> aiohttp.ClientSession:
+        """Session of a cookie scope on the running event loop, with the scraper's current clearance."""
+        loop = asyncio.get_running_loop()
+        if self._connector is None or self._connector.closed or self._session_loop is not loop:
+            self._close_stale()
+            self._connector = aiohttp.TCPConnector()
+            self._session_loop = loop
+            self._fallback_lock = asyncio.Lock()
+        session = self._sessions.get(scope)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(connector=self._connector, connector_owner=False,
+                                            cookie_jar=aiohttp.CookieJar())
+            self._sessions[scope] = session
+            self._synced_cookies.pop(scope, None)
+        self._sync_cookies(scope, session)
+        return session
+
+    def _close_stale(self) -> None:
+        """Close the sessions and connection pool of a previous event loop."""
+        sessions, connector, loop = list(self._sessions.values()), self._connector, self._session_loop
+        self._sessions = {}
+        self._synced_cookies = {}
+        self._connector = None
+        if connector is None or connector.closed:
+            return
+        if loop is not None and loop.is_running():
+            # The loop still runs in another thread: close them there
+            asyncio.run_coroutine_threadsafe(self._close_all(sessions, connector), loop)
+        else:
+            # The loop is gone, so closing only marks them closed; that can run on the current loop
+            task = asyncio.get_running_loop().create_task(self._close_all(sessions, connector))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close_all(sessions: List[aiohttp.ClientSession], connector: aiohttp.BaseConnector) -> None:
+        for session in sessions:
+            await session.close()
+        await connector.close()
+
+    def _clearance_cookies(self) -> Dict[Tuple[str, str], str]:
+        return {(cookie.domain, cookie.name): cookie.value
+                for cookie in self.scraper.cookies if is_cloudflare_cookie(cookie.name)}
+
+    def _sync_cookies(self, scope: str, session: aiohttp.ClientSession) -> None:
+        """Copy the scraper's Cloudflare cookies (cf_clearance, __cf_bm, ...) into a key's jar if they changed."""
+        cookies = self._clearance_cookies()
+        if cookies == self._synced_cookies.get(scope):
+            return
+        for (domain, name), value in cookies.items():
+            session.cookie_jar.update_cookies({name: value}, URL(f"https://{domain.lstrip('.')}/"))
+        self._synced_cookies[scope] = cookies
+
+    def _pull_cookies(self, resp: aiohttp.ClientResponse) -> None:
+        """Copy Cloudflare cookies an aiohttp response set back into the scraper, for the other keys and the fallback."""
+        for name, morsel in resp.cookies.items():
+            if not is_cloudflare_cookie(name):
+                continue
+            domain = morsel["domain"] or resp.url.host
+            # Replace the scraper's cookie of that name rather than adding one with a differently dotted domain
+            for cookie in self.scraper.cookies:
+                if cookie.name == name and cookie.domain.lstrip(".") == domain.lstrip("."):
+                    domain = cookie.domain
+                    break
+            self.scraper.cookies.set(name, morsel.value, domain=domain, path=morsel["path"] or "/",
+                                     expires=_morsel_expires(morsel), secure=bool(morsel["secure"]))
+
+    def _headers(self, headers: Optional[Dict[str, str]]) -> Dict[str, str]:
+        """Request headers plus the scraper's User-Agent, which the clearance cookie is bound to."""
+        merged = dict(headers or {})
+        user_agent = self.scraper.headers.get("User-Agent")
+        if user_agent and not any(name.lower() == "user-agent" for name in merged):
+            merged["User-Agent"] = user_agent
+        return merged
+
+    @staticmethod
+    def _form_data(files: Dict[str, Tuple]) -> aiohttp.FormData:
+        """Build a multipart body from a requests-style files mapping {field: (filename, content, mime)}."""
+        form = aiohttp.FormData()
+        for field, spec in files.items():
+            file_name, content = spec[0], spec[1]
+            if file_name is None:
+                form.add_field(field, content)
+            else:
+                form.add_field(field, content, filename=file_name,
+                               content_type=spec[2] if len(spec) > 2 else "application/octet-stream")
+        return form
+
+    async def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None,
+                      json: Any = None, files: Optional[Dict[str, Tuple]] = None, timeout: float = 30):
+        """
+        Send a request, falling back to cloudscraper if Cloudflare challenges it.
+
+        Args:
+            method: HTTP method
+            url: Request URL
+            headers: Request headers
+            json: JSON body
+            files: requests-style multipart files mapping; contents must be bytes or memoryview so they can be resent
+            timeout: Total timeout in seconds
+
+        Returns:
+            Response object with status_code, text, headers and json()
+        """
+        headers = self._headers(headers)
+        scope = _cookie_scope(headers)
+        session = self._get_session(scope)
+        kwargs = {"headers": headers, "timeout": aiohttp.ClientTimeout(total=timeout)}
+        if self.proxy:
+            kwargs["proxy"] = self.proxy
+        if json is not None:
+            kwargs["json"] = json
+        if files is not None:
+            kwargs["data"] = self._form_data(files)
+
+        async with session.request(method, url, **kwargs) as resp:
+            response = TransportResponse(resp.status, await resp.text(errors="replace"), resp.headers)
+            self._pull_cookies(resp)
+
+        if not is_cloudflare_challenge(response.status_code, response.headers, response.text):
+            return response
+
+        logger.info(f"Cloudflare challenge on {method} {url}, retrying through cloudscraper")
+        return await self._scraper_request(method, url, headers, json, files, timeout, scope)
+
+    async def _scraper_request(self, method: str, url: str, headers: Dict[str, str], json: Any,
+                               files: Optional[Dict[str, Tuple]], timeout: float, scope: str):
+        """
+        Send a request through cloudscraper in a worker thread (solves the challenge, refreshes cookies).
+
+        The key's own cookies are sent along, and the account cookies the response sets are
+        moved from the shared scraper into the key's jar so no other key picks them up.
+        """
+        if files is not None:
+            # requests cannot encode memoryview contents; copy them only on this rare path
+            files = {field: tuple(bytes(part) if isinstance(part, memoryview) else part for part in spec)
+                     for field, spec in files.items()}
+        # One challenge solve at a time; requests queued behind it usually pass with the new cookies
+        async with self._fallback_lock:
+            session = self._get_session(scope)
+            cookies = {name: morsel.value for name, morsel in session.cookie_jar.filter_cookies(URL(url)).items()
+                       if not is_cloudflare_cookie(name)}
+            loop = asyncio.get_running_loop()
+            try:
+                response = await loop.run_in_executor(None, lambda: self.scraper.request(
+                    method, url, headers=headers, json=json, files=files, cookies=cookies or None,
+                    proxies=self.proxies, timeout=timeout
+                ))
+            finally:
+                for cookie in list(self.scraper.cookies):
+                    if not is_cloudflare_cookie(cookie.name):
+                        session.cookie_jar.update_cookies({cookie.name: cookie.value},
+                                                          URL(f"https://{cookie.domain.lstrip('.')}/"))
+                        self.scraper.cookies.clear(cookie.domain, cookie.path, cookie.name)
+            self._sync_cookies(scope, session)
+            return response
+
+    async def get(self, url: str, **kwargs):
+        """Send a GET request (see request)."""
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs):
+        """Send a POST request (see request)."""
+        return await self.request("POST", url, **kwargs)
+
+    async def close(self) -> None:
+        """Close the aiohttp sessions and their connection pool."""
+        sessions, connector = list(self._sessions.values()), self._connector
+        self._sessions = {}
+        self._synced_cookies = {}
+        self._connector = None
+        if connector is not None and not connector.closed:
+            await self._close_all(sessions, connector)
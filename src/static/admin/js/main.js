@@ -587,7 +587,10 @@ function renderKeysTable(keys) {
                     </div>` : ''}
             </td>
             <td>${key.weight || 1}</td>
-            <td>${key.max_rpm || 60}/min</td>
+            <td>
+                ${key.max_rpm || 60}/min
+                <div class="small text-muted">${key.active_tasks || 0}/${key.max_concurrent || 1} tasks</div>
+            </td>
             <td>${createDate}</td>
             <td>${lastUsedDate}</td>
             <td>
@@ -711,6 +714,7 @@ async function loadKeyDetails(keyId) {
         document.getElementById('key-value').value = keyData.key || '';
         document.getElementById('key-weight').value = keyData.weight || 1;
         document.getElementById('key-rate-limit').value = keyData.max_rpm || 60;
+        document.getElementById('key-max-concurrent').value = keyData.max_concurrent || 1;
         document.getElementById('key-enabled').checked = keyData.is_enabled;
         document.getElementById('key-notes').value = keyData.notes || '';
     } catch (error) {
@@ -728,6 +732,7 @@ async function saveKey() {
             key_value: document.getElementById('key-value').value,
             weight: parseInt(document.getElementById('key-weight').value),
             rate_limit: parseInt(document.getElementById('key-rate-limit').value),
+            max_concurrent: parseInt(document.getElementById('key-max-concurrent').value) || 1,
             is_enabled: document.getElementById('key-enabled').checked,
             notes: document.getElementById('key-notes').value
         };
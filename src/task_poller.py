@@ -0,0 +1,169 @@
+import asyncio
+import logging
+from typing import Dict, List, Any, Optional, Set
+
+from .config import Config
+
+# Initialize logger
+logger = logging.getLogger("sora-api.task_poller")
+
+class PollResult:
+    """Outcome of one poll tick for a task: the upstream status code and the task, if it was found."""
+
+    __slots__ = ("status_code", "task", "text")
+
+    def __init__(self, status_code: int, task: Optional[Dict[str, Any]] = None, text: str = ""):
+        self.status_code = status_code
+        self.task = task  # Task record from the list response, None if not among the pages fetched
+        self.text = text  # Response body when the list request failed
+
+class KeyTaskPoller:
+    """
+    Shared task-status poller of one Sora key.
+
+    Tasks on the same key used to fetch the recent-task list independently. Here,
+    every task waiting on the key registers with poll(), and a single loop fetches
+    the list once per tick and hands each waiter its own task, looked up by ID.
+    When a waited-for task is not in the first page, older pages are fetched, up
+    to max_pages, so a task is still found when many newer tasks exist.
+
+    Waiters decide themselves when to check (see PollSchedule); a tick fetches as
+    soon as a task is waiting, but never sooner than `interval` after the last one,
+    so tasks whose checks fall close together share a request.
+    """
+
+    def __init__(self, auth_token: str, interval: float = 5.0, page_size: int = 20, max_pages: int = 5):
+        """
+        Initialize the poller.
+
+        Args:
+            auth_token: Sora key (with Bearer prefix) the polled tasks were submitted with
+            interval: Minimum seconds between two list requests of the key
+            page_size: Tasks requested per page
+            max_pages: Max pages fetched per tick while looking for waiting tasks
+        """
+        self.auth_token = auth_token
+        self.interval = interval
+        self.page_size = page_size
+        self.max_pages = max(1, max_pages)
+        self.generator = None  # Generator whose transport and headers are used; set by the latest caller
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._runner: Optional[asyncio.Task] = None
+        self._last_fetch: Optional[float] = None  # Loop time of the last list request
+
+    async def poll(self, task_id: str) -> PollResult:
+        """
+        Wait for the next tick and return what it found for a task.
+
+        Raises:
+            Exception: If the list request itself failed (network error, unparsable response)
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(task_id, []).append(future)
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.get_running_loop().create_task(self._run())
+        try:
+            return await future
+        finally:
+            # Drop the registration if the caller was cancelled before the tick
+            futures = self._waiters.get(task_id)
+            if futures and future in futures:
+                futures.remove(future)
+                if not futures:
+                    del self._waiters[task_id]
+
+    async def _run(self) -> None:
+        """Fetch once per tick while any task is waiting."""
+        loop = asyncio.get_running_loop()
+        while self._waiters:
+            if self._last_fetch is not None:
+                wait = self._last_fetch + self.interval - loop.time()
+                if wait > 0:
+                    # Tasks registering meanwhile join this tick
+                    await asyncio.sleep(wait)
+                    if not self._waiters:
+                        break
+            self._last_fetch = loop.time()
+            waiting, self._waiters = self._waiters, {}
+            try:
+                results = await self._fetch(set(waiting))
+                for task_id, futures in waiting.items():
+                    for future in futures:
+                        if not future.done():
+                            future.set_result(results.get(task_id) or PollResult(200))
+            except Exception as e:
+                for futures in waiting.values():
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(e)
+
+    async def _fetch(self, wanted: Set[str]) -> Dict[str, PollResult]:
+        """
+        Fetch the recent-task list, paging back until every wanted task is found.
+
+        Returns:
+            Task ID -> result; on a failed list request every wanted task maps to the error
+        """
+        generator = self.generator
+        found: Dict[str, PollResult] = {}
+        before = None
+        for page in range(self.max_pages):
+            headers = generator._get_dynamic_headers(referer="https://sora.chatgpt.com/library")
+            # The task belongs to this key even if the generator has since switched keys
+            headers["authorization"] = self.auth_token
+            query_url = f"{generator.check_url}?limit={self.page_size}"
+            if before:
+                query_url += f"&before={before}"
+            response = await generator.transport.get(query_url, headers=headers, timeout=15)
+
+            if response.status_code != 200:
+                if page == 0:
+                    error = PollResult(response.status_code, text=response.text)
+                    return {task_id: error for task_id in wanted}
+                # Older pages are best effort
+                break
+
+            data = response.json()
+            tasks = data.get("task_responses", [])
+            for task in tasks:
+                task_id = task.get("id")
+                if task_id in wanted:
+                    found[task_id] = PollResult(200, task)
+
+            if len(found) == len(wanted) or len(tasks) < self.page_size or data.get("has_more") is False:
+                break
+            oldest = data.get("last_id") or tasks[-1].get("id")
+            if not oldest or oldest == before:
+                break
+            before = oldest
+
+        if page > 0:
+            logger.debug(f"Fetched {page + 1} task pages for {len(wanted)} waiting tasks, found {len(found)}")
+        return found
+
+# Key (without Bearer prefix) -> shared poller
+_pollers: Dict[str, KeyTaskPoller] = {}
+
+def get_task_poller(auth_token: str, generator) -> KeyTaskPoller:
+    """
+    Get the shared poller of a key, creating it on first use.
+
+    Args:
+        auth_token: Sora key the task was submitted with (may include Bearer prefix)
+        generator: The calling SoraImageGenerator; provides transport and request headers
+
+    Returns:
+        The key's poller
+    """
+    clean_key = auth_token[7:] if auth_token.startswith("Bearer ") else auth_token
+    poller = _pollers.get(clean_key)
+    if poller is None:
+        poller = KeyTaskPoller(
+            f"Bearer {clean_key}",
+            interval=Config.TASK_POLL_MIN_GAP,
+            page_size=Config.TASK_POLL_PAGE_SIZE,
+            max_pages=Config.TASK_POLL_MAX_PAGES
+        )
+        _pollers[clean_key] = poller
+    poller.generator = generator
+    return poller
@@ -0,0 +1,226 @@
+import time
+import datetime
+from array import array
+from typing import Dict, List, Any, Optional, Iterable, Tuple, Callable
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 90, 120, 180, 300, float("inf"))
+
+MINUTE_SLOTS = 24 * 60  # One day at minute resolution
+DAY_SLOTS = 30  # Thirty days at day resolution
+
+# Column layout of a ring slot: success count, failure count, then one column per latency bucket
+COL_SUCCESS = 0
+COL_FAILED = 1
+COL_HIST = 2
+
+def _latency_bucket(latency: float) -> int:
+    """Index of the histogram bucket a latency falls into."""
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if latency <= bound:
+            return i
+    return len(LATENCY_BUCKETS) - 1
+
+def _day_index(now: float) -> int:
+    """Local calendar day of a timestamp, as a proleptic Gregorian ordinal."""
+    return datetime.date.fromtimestamp(now).toordinal()
+
+def percentile_from_histogram(hist: Iterable[int], q: float) -> Optional[float]:
+    """
+    Estimate a percentile from latency histogram counts.
+
+    Interpolates linearly inside the bucket that contains the requested rank.
+
+    Args:
+        hist: Counts per LATENCY_BUCKETS bucket
+        q: Percentile in the range 0-100
+
+    Returns:
+        Latency in seconds, or None if the histogram is empty
+    """
+    counts = list(hist)
+    total = sum(counts)
+    if total == 0:
+        return None
+    rank = q / 100.0 * total
+    cumulative = 0
+    for i, count in enumerate(counts):
+        if count and cumulative + count >= rank:
+            lower = LATENCY_BUCKETS[i - 1] if i > 0 else 0.0
+            upper = LATENCY_BUCKETS[i]
+            if upper == float("inf"):
+                return lower
+            return lower + (upper - lower) * (rank - cumulative) / count
+        cumulative += count
+    return LATENCY_BUCKETS[-2]
+
+class RingSeries:
+    """
+    Fixed-size, array-backed ring of counter rows at a fixed time resolution.
+
+    Each slot holds `width` unsigned counters for one period. A slot is reused when
+    its period falls out of the window, so memory and update cost are constant.
+    """
+
+    __slots__ = ("slots", "width", "periods", "data")
+
+    def __init__(self, slots: int, width: int):
+        self.slots = slots
+        self.width = width
+        self.periods = array("q", [-1]) * slots  # Period index held by each slot (-1 = empty)
+        self.data = array("L", [0]) * (slots * width)
+
+    def slot(self, period: int, on_evict: Optional[Callable[[int], None]] = None) -> int:
+        """
+        Return the data offset of a period's slot, claiming the slot if needed.
+
+        When the slot still holds an older period, `on_evict(offset)` is called before
+        its counters are zeroed.
+        """
+        index = period % self.slots
+        offset = index * self.width
+        if self.periods[index] != period:
+            if self.periods[index] != -1:
+                if on_evict is not None:
+                    on_evict(offset)
+                for i in range(offset, offset + self.width):
+                    self.data[i] = 0
+            self.periods[index] = period
+        return offset
+
+    def expire(self, period: int, on_evict: Optional[Callable[[int], None]] = None) -> None:
+        """Drop every slot holding a period that is no longer in the window ending at `period`."""
+        oldest = period - self.slots + 1
+        for index in range(self.slots):
+            held = self.periods[index]
+            if held != -1 and held < oldest:
+                offset = index * self.width
+                if on_evict is not None:
+                    on_evict(offset)
+                for i in range(offset, offset + self.width):
+                    self.data[i] = 0
+                self.periods[index] = -1
+
+    def row(self, period: int) -> Optional[array]:
+        """Counters of a period, or None if it is not in the window."""
+        slot = period % self.slots
+        if self.periods[slot] != period:
+            return None
+        offset = slot * self.width
+        return self.data[offset:offset + self.width]
+
+    def recent(self, period: int, count: int) -> List[Tuple[int, array]]:
+        """Rows of the `count` periods ending at `period` (oldest first), skipping empty ones."""
+        rows = []
+        for p in range(period - count + 1, period + 1):
+            row = self.row(p)
+            if row is not None:
+                rows.append((p, row))
+        return rows
+
+class UsageSeries:
+    """
+    Per-key usage time series.
+
+    Keeps request counts at minute resolution for the last day and counts plus
+    latency histograms at day resolution for the last 30 days. A running histogram
+    over the day window makes percentile queries O(number of buckets).
+    """
+
+    __slots__ = ("minutes", "days", "latency_total")
+
+    def __init__(self):
+        self.minutes = RingSeries(MINUTE_SLOTS, 2)
+        self.days = RingSeries(DAY_SLOTS, COL_HIST + len(LATENCY_BUCKETS))
+        self.latency_total = array("L", [0]) * len(LATENCY_BUCKETS)
+
+    def _retire_day(self, offset: int) -> None:
+        """Remove an evicted day from the running histogram."""
+        for i in range(len(LATENCY_BUCKETS)):
+            self.latency_total[i] -= self.days.data[offset + COL_HIST + i]
+
+    def _day_offset(self, day: int) -> int:
+        """Data offset of a day's slot in the day ring."""
+        return self.days.slot(day, self._retire_day)
+
+    def record(self, success: bool, latency: float = 0, now: Optional[float] = None) -> None:
+        """Record one request outcome."""
+        now = time.time() if now is None else now
+        column = COL_SUCCESS if success else COL_FAILED
+
+        offset = self.minutes.slot(int(now // 60))
+        self.minutes.data[offset + column] += 1
+
+        offset = self._day_offset(_day_index(now))
+        self.days.data[offset + column] += 1
+        if latency > 0:
+            bucket = _latency_bucket(latency)
+            self.days.data[offset + COL_HIST + bucket] += 1
+            self.latency_total[bucket] += 1
+
+    def daily_counts(self, days: int = 7, now: Optional[float] = None) -> Dict[str, Dict[str, int]]:
+        """Success/failure counts of the last `days` days keyed by YYYY-MM-DD."""
+        today = _day_index(time.time() if now is None else now)
+        result = {}
+        for day, row in self.days.recent(today, min(days, self.days.slots)):
+            date = datetime.date.fromordinal(day).strftime("%Y-%m-%d")
+            result[date] = {"successful": row[COL_SUCCESS], "failed": row[COL_FAILED]}
+        return result
+
+    def minute_counts(self, minutes: int = 60, now: Optional[float] = None) -> List[Tuple[int, int, int]]:
+        """(minute_index, successful, failed) of the last `minutes` minutes that saw traffic."""
+        current = int((time.time() if now is None else now) // 60)
+        return [(m, row[COL_SUCCESS], row[COL_FAILED]) for m, row in self.minutes.recent(current, min(minutes, self.minutes.slots))]
+
+    def latency_histogram(self, now: Optional[float] = None) -> array:
+        """Latency histogram over the day window."""
+        # Retire days that have fallen out of the window since the last write
+        self.days.expire(_day_index(time.time() if now is None else now), self._retire_day)
+        return self.latency_total
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Compact serializable form.
+
+        Only the day ring is persisted, as [day_ordinal, successful, failed, *histogram]
+        rows for non-empty days. Minute-level data is in-memory only.
+        """
+        rows = []
+        for slot in range(self.days.slots):
+            day = self.days.periods[slot]
+            if day == -1:
+                continue
+            offset = slot * self.days.width
+            row = self.days.data[offset:offset + self.days.width]
+            if any(row):
+                rows.append([day] + row.tolist())
+        rows.sort()
+        return {"days": rows}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "UsageSeries":
+        """Restore a series produced by to_dict."""
+        series = cls()
+        width = series.days.width
+        for row in data.get("days", []):
+            day, values = row[0], row[1:width + 1]
+            offset = series._day_offset(day)
+            for i, value in enumerate(values):
+                series.days.data[offset + i] = value
+            for i in range(len(LATENCY_BUCKETS)):
+                series.latency_total[i] += series.days.data[offset + COL_HIST + i]
+        return series
+
+    @classmethod
+    def from_daily_usage(cls, daily_usage: Dict[str, Dict[str, int]]) -> "UsageSeries":
+        """Migrate the legacy {date: {successful, failed}} dict."""
+        series = cls()
+        for date, counts in sorted(daily_usage.items()):
+            try:
+                day = datetime.datetime.strptime(date, "%Y-%m-%d").date().toordinal()
+            except ValueError:
+                continue
+            offset = series._day_offset(day)
+            series.days.data[offset + COL_SUCCESS] = counts.get("successful", 0)
+            series.days.data[offset + COL_FAILED] = counts.get("failed", 0)
+        return series
@@ -0,0 +1,56 @@
+import os
+import sys
+import tempfile
+
+# Keep the global singletons created on import (key manager, CF sessions) away from the working tree
+_state_dir = tempfile.mkdtemp(prefix="sora-api-tests-")
+os.environ.setdefault("KEYS_STORAGE_FILE", os.path.join(_state_dir, "api_keys.json"))
+os.environ.setdefault("CF_SESSION_PERSIST", "false")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from src.key_manager import KeyManager
+
+@pytest.fixture
+def make_key_manager(tmp_path):
+    """Build KeyManagers on a JSON file in tmp_path; they are closed after the test."""
+    managers = []
+
+    def make(**kwargs):
+        kwargs.setdefault("storage_file", str(tmp_path / "api_keys.json"))
+        manager = KeyManager(**kwargs)
+        managers.append(manager)
+        return manager
+
+    yield make
+    for manager in managers:
+        manager.close()
+
+@pytest.fixture
+def key_manager(make_key_manager, monkeypatch):
+    """A fresh KeyManager installed as the global one the generator and services use."""
+    import src.key_manager
+
+    manager = make_key_manager()
+    monkeypatch.setattr(src.key_manager, "key_manager", manager)
+    return manager
+
+@pytest.fixture
+def make_generator(monkeypatch):
+    """Build SoraImageGenerators sending through a fake transport, with no waits between status checks."""
+    from src import sora_generator, task_poller
+    from src.config import Config
+
+    monkeypatch.setattr(Config, "IMAGE_LOCALIZATION", False)
+    monkeypatch.setattr(Config, "TASK_POLL_MIN_GAP", 0)
+    monkeypatch.setattr(sora_generator.poll_schedule, "base_interval", 0)
+    monkeypatch.setattr(task_poller, "_pollers", {})
+
+    def make(transport, auth_token):
+        generator = sora_generator.SoraImageGenerator(auth_token=auth_token)
+        generator.transport = transport
+        return generator
+
+    return make
@@ -0,0 +1,43 @@
+import json
+
+# Smallest content recognised as a PNG upload
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"\x00" * 16
+
+class FakeResponse:
+    """Upstream response with the attributes the transport callers read."""
+
+    def __init__(self, status_code=200, data=None, text=""):
+        self.status_code = status_code
+        self._data = data
+        self.text = text or (json.dumps(data) if data is not None else "")
+
+    def json(self):
+        if self._data is None:
+            raise ValueError("Response has no JSON body")
+        return self._data
+
+class FakeTransport:
+    """
+    Transport answering from queues of responses, recording (method, url, authorization)
+    of each request. A queued exception is raised; a queued callable is called with
+    (url, headers, kwargs) and its result returned.
+    """
+
+    def __init__(self, post=None, get=None):
+        self.responses = {"POST": list(post or []), "GET": list(get or [])}
+        self.requests = []
+
+    async def _respond(self, method, url, headers, kwargs):
+        self.requests.append((method, url, (headers or {}).get("authorization")))
+        response = self.responses[method].pop(0)
+        if isinstance(response, Exception):
+            raise response
+        if callable(response):
+            return response(url, headers, kwargs)
+        return response
+
+    async def post(self, url, headers=None, **kwargs):
+        return await self._respond("POST", url, headers, kwargs)
+
+    async def get(self, url, headers=None, **kwargs):
+        return await self._respond("GET", url, headers, kwargs)
@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+def test_free_key_is_returned_immediately(make_key_manager):
+    manager = make_key_manager()
+    manager.add_key("sk-a", rate_limit=600)
+
+    key = asyncio.run(manager.acquire_key(timeout=0))
+    assert key.endswith("sk-a")
+
+def test_waiters_get_keys_in_arrival_order(make_key_manager):
+    manager = make_key_manager()
+    manager.add_key("sk-a", rate_limit=600)
+    order = []
+
+    async def run():
+        holder = await manager.acquire_key()
+
+        async def wait(name):
+            key = await manager.acquire_key(timeout=5)
+            order.append(name)
+            await asyncio.sleep(0.01)
+            manager.release_reservation(key)
+
+        waiters = []
+        for name in ("first", "second", "third"):
+            waiters.append(asyncio.ensure_future(wait(name)))
+            await asyncio.sleep(0.01)  # Queue them in this order
+        assert len(manager._waiters) == 3
+
+        manager.release_reservation(holder)
+        await asyncio.gather(*waiters)
+
+    asyncio.run(run())
+    assert order == ["first", "second", "third"]
+    assert not manager._waiters
+
+def test_wait_times_out_and_leaves_the_queue(make_key_manager):
+    manager = make_key_manager()
+    manager.add_key("sk-a", rate_limit=600)
+
+    async def run():
+        holder = await manager.acquire_key()
+        started = time.monotonic()
+        key = await manager.acquire_key(timeout=0.1)
+        return holder, key, time.monotonic() - started
+
+    holder, key, waited = asyncio.run(run())
+    assert holder and key is None
+    assert 0.1 <= waited < 1
+    assert not manager._waiters
+
+def test_timed_out_head_hands_over_to_the_next_waiter(make_key_manager):
+    manager = make_key_manager()
+    manager.add_key("sk-a", rate_limit=600)
+
+    async def run():
+        holder = await manager.acquire_key()
+        impatient = asyncio.ensure_future(manager.acquire_key(timeout=0.05))
+        await asyncio.sleep(0.01)
+        patient = asyncio.ensure_future(manager.acquire_key(timeout=5))
+        assert await impatient is None
+        manager.release_reservation(holder)
+        return await asyncio.wait_for(patient, 1)
+
+    assert asyncio.run(run()).endswith("sk-a")
+
+def test_head_waits_for_the_rate_limit_refill(make_key_manager):
+    manager = make_key_manager(rate_burst_seconds=0)  # A burst of one request
+    manager.add_key("sk-a", rate_limit=600, max_concurrent=2)  # One token every 0.1 seconds
+
+    async def run():
+        first = await manager.acquire_key(timeout=0)
+        started = time.monotonic()
+        second = await manager.acquire_key(timeout=2)
+        return first, second, time.monotonic() - started
+
+    first, second, waited = asyncio.run(run())
+    assert first and second
+    assert 0.05 <= waited < 1
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from src.services import batch_service as batch_module
+from src.services.batch_service import BatchItem, BatchService, ITEM_COMPLETED, ITEM_FAILED
+
+class FakeClient:
+    """Stands in for SoraClient; prompts containing "bad" fail."""
+
+    def __init__(self, manager, auth_token, calls):
+        self.manager = manager
+        self.auth_token = auth_token
+        self.calls = calls
+
+    async def generate_image(self, prompt, num_images=1, width=720, height=480):
+        self.calls.append((self.auth_token, prompt))
+        await asyncio.sleep(0)
+        # The generator's task takes the reserved slot over and releases it when done
+        self.manager.release_reservation(self.auth_token)
+        if "bad" in prompt:
+            raise Exception("Task failed: upstream error")
+        return [f"https://img/{prompt}.png"]
+
+@pytest.fixture
+def service(key_manager, monkeypatch):
+    monkeypatch.setattr(batch_module, "key_manager", key_manager)
+    return BatchService(concurrency=2, key_wait=1)
+
+def usage(manager, key_value):
+    return manager.usage_stats[manager._find_key(key_value)["id"]]
+
+def test_items_run_and_stream_in_completion_order(service, key_manager):
+    key_manager.add_key("sk-a", rate_limit=600, max_concurrent=2)
+    calls = []
+
+    async def run():
+        items = [BatchItem(i, prompt) for i, prompt in enumerate(["cat", "bad dog", "owl"])]
+        batch = service.submit(items, lambda token: FakeClient(key_manager, token, calls))
+        assert service.get(batch.id) is batch
+        return batch, [event async for event in batch.stream_results()]
+
+    batch, events = asyncio.run(run())
+    statuses = {item.prompt: item.status for item in batch.items}
+    assert statuses == {"cat": ITEM_COMPLETED, "bad dog": ITEM_FAILED, "owl": ITEM_COMPLETED}
+    assert batch.items[0].image_urls == ["https://img/cat.png"]
+    assert "upstream error" in batch.items[1].error
+    assert [event["index"] for event in events[:-1]] == batch.finished_order
+    assert events[-1]["status"] == "completed"
+    assert events[-1]["counts"] == {"queued": 0, "running": 0, "completed": 2, "failed": 1, "total": 3}
+    assert len(calls) == 3
+
+def test_item_outcomes_are_recorded_against_their_key(service, key_manager):
+    key_manager.add_key("sk-a", rate_limit=600, max_concurrent=3)
+
+    async def run():
+        items = [BatchItem(0, "cat"), BatchItem(1, "bad dog")]
+        batch = service.submit(items, lambda token: FakeClient(key_manager, token, []))
+        await batch._task
+
+    asyncio.run(run())
+    stats = usage(key_manager, "sk-a")
+    assert stats["total_requests"] == 2
+    assert stats["successful_requests"] == 1
+    assert stats["failed_requests"] == 1
+
+def test_item_fails_when_no_key_becomes_available(service, key_manager):
+    async def run():
+        batch = service.submit([BatchItem(0, "cat")], lambda token: FakeClient(key_manager, token, []))
+        await batch._task
+        return batch
+
+    service.key_wait = 0.05
+    batch = asyncio.run(run())
+    assert batch.items[0].status == ITEM_FAILED
+    assert "No API key" in batch.items[0].error
+
+def test_submit_validates_size(service):
+    service.max_items = 1
+    with pytest.raises(ValueError):
+        service.submit([], lambda token: None)
+    with pytest.raises(ValueError):
+        service.submit([BatchItem(0, "a"), BatchItem(1, "b")], lambda token: None)
@@ -0,0 +1,19 @@
+from src.cache import TTLCache
+
+def test_entries_expire_after_ttl():
+    cache = TTLCache(max_entries=10, ttl=5)
+    cache.set("a", 1, now=0)
+    assert cache.get("a", now=4.9) == 1
+    assert cache.get("a", now=5) is None
+    cache.set("b", 2, ttl=1, now=0)
+    assert cache.get("b", now=2) is None
+
+def test_least_recently_used_is_evicted():
+    cache = TTLCache(max_entries=2, ttl=60)
+    cache.set("a", 1, now=0)
+    cache.set("b", 2, now=0)
+    cache.get("a", now=1)
+    cache.set("c", 3, now=2)
+    assert cache.get("b", now=2) is None
+    assert cache.get("a", now=2) == 1
+    assert cache.get("c", now=2) == 3
@@ -0,0 +1,111 @@
+from src.circuit_breaker import CircuitBreaker, STATE_CLOSED, STATE_OPEN, STATE_HALF_OPEN
+
+def make_breaker(**kwargs):
+    options = dict(failure_ratio=0.5, min_requests=4, window=60, base_cooldown=10, max_cooldown=35, trial_timeout=30)
+    options.update(kwargs)
+    return CircuitBreaker(**options)
+
+def test_failure_rate_needs_min_requests():
+    breaker = make_breaker()
+    assert not any(breaker.record(False, now=t) for t in range(3))
+    assert breaker.state == STATE_CLOSED
+    assert breaker.record(False, now=3)
+    assert breaker.state == STATE_OPEN
+    assert not breaker.allows_request(now=3)
+    assert breaker.open_until == 13
+
+def test_stays_closed_below_failure_ratio():
+    breaker = make_breaker()
+    for t, success in enumerate([True, True, True, False, True, False]):
+        assert not breaker.record(success, now=t)
+    assert breaker.state == STATE_CLOSED
+
+def test_outcomes_outside_window_are_forgotten():
+    breaker = make_breaker()
+    for t in range(3):
+        breaker.record(False, now=t)
+    assert not breaker.record(False, now=100)  # The earlier failures left the window
+    assert breaker.state == STATE_CLOSED
+
+def test_cooldown_doubles_and_is_capped():
+    breaker = make_breaker()
+    assert breaker.trip(now=0) == 10
+    breaker.half_open()
+    assert breaker.record(False, now=10)
+    assert breaker.open_until == 30
+    breaker.half_open()
+    breaker.record(False, now=30)
+    assert breaker.open_until == 65  # 40 capped at 35
+
+def test_trip_while_open_does_not_escalate():
+    breaker = make_breaker()
+    breaker.trip(now=0)
+    assert breaker.trip(now=5) == 10
+    assert breaker.trips == 1
+    assert not breaker.record(False, now=6)  # Late result of an earlier request
+
+def test_half_open_allows_one_trial():
+    breaker = make_breaker()
+    breaker.trip(now=0)
+    breaker.half_open()
+    assert breaker.state == STATE_HALF_OPEN
+    assert breaker.allows_request(now=10)
+    breaker.on_dispatch(now=10)
+    assert not breaker.allows_request(now=20)
+    assert breaker.allows_request(now=40)  # Unreported trial timed out
+
+def test_successful_trial_closes_and_resets_cooldown():
+    breaker = make_breaker()
+    breaker.trip(now=0)
+    breaker.half_open()
+    breaker.record(False, now=10)
+    breaker.half_open()
+    assert not breaker.record(True, now=30)
+    assert breaker.state == STATE_CLOSED
+    assert breaker.trips == 0
+    assert breaker.trip(now=100) == 110
+
+def test_admin_disable_survives_circuit_cooldown(make_key_manager):
+    manager = make_key_manager()
+    key = manager.add_key("sk-breaker", name="k")
+    assert manager.trip_key_circuit("sk-breaker")
+    manager.update_key(key["id"], is_enabled=False)
+    assert manager.get_key_by_id(key["id"])["temp_disabled_until"] is None
+    assert manager.get_probe_candidates() == []
+
+    manager._lift_expired(now=float("inf"))
+    assert not manager.get_key_by_id(key["id"])["is_enabled"]
+    assert manager.get_key() is None
+
+def test_lifting_a_cooldown_keeps_an_admin_disable(make_key_manager):
+    manager = make_key_manager()
+    key = manager.add_key("sk-breaker", name="k")
+    manager.trip_key_circuit("sk-breaker")
+    # A record persisted with both flags (e.g. by an older version) stays disabled
+    manager.get_key_by_id(key["id"])["is_enabled"] = False
+    assert not manager.restore_key("sk-breaker")
+    assert manager._lift_expired(now=float("inf")) == []
+    record = manager.get_key_by_id(key["id"])
+    assert not record["is_enabled"] and not record["available"]
+    assert manager.get_key() is None
+
+def test_admin_enable_overrides_open_circuit(make_key_manager):
+    manager = make_key_manager()
+    key = manager.add_key("sk-breaker", name="k")
+    manager.trip_key_circuit("sk-breaker")
+    assert manager.get_key() is None
+    manager.update_key(key["id"], is_enabled=True)
+    assert manager.get_key() == "Bearer sk-breaker"
+
+def test_expired_cooldown_half_opens_the_circuit(make_key_manager):
+    manager = make_key_manager()
+    manager.add_key("sk-breaker", name="k")
+    manager.trip_key_circuit("sk-breaker")
+    assert manager.get_probe_candidates() == ["sk-breaker"]
+    manager._lift_expired(now=float("inf"))
+    assert manager.get_key() == "Bearer sk-breaker"
+
+def test_cooldown_survives_many_trips():
+    breaker = make_breaker(base_cooldown=10.0, max_cooldown=35.0)  # Config passes floats
+    breaker.trips = 5000
+    assert breaker.cooldown() == 35
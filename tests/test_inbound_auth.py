@@ -0,0 +1,29 @@
+def test_enabled_keys_authenticate(make_key_manager):
+    manager = make_key_manager()
+    manager.add_key("sk-a", name="a")
+
+    assert manager.is_valid_inbound_key("sk-a")
+    assert manager.is_valid_inbound_key("Bearer sk-a")
+    assert not manager.is_valid_inbound_key("sk-b")
+    assert not manager.is_valid_inbound_key("sk-")
+    assert not manager.is_valid_inbound_key("")
+
+def test_disabled_keys_do_not_authenticate(make_key_manager):
+    manager = make_key_manager()
+    manager.add_key("sk-off", name="off", is_enabled=False)
+    assert not manager.is_valid_inbound_key("sk-off")
+
+def test_index_follows_key_changes(make_key_manager):
+    manager = make_key_manager()
+    key = manager.add_key("sk-a", name="a")
+    assert manager.is_valid_inbound_key("sk-a")
+
+    manager.update_key(key["id"], is_enabled=False)
+    assert not manager.is_valid_inbound_key("sk-a")
+
+    manager.update_key(key["id"], is_enabled=True, key_value="sk-new")
+    assert not manager.is_valid_inbound_key("sk-a")
+    assert manager.is_valid_inbound_key("sk-new")
+
+    manager.delete_key(key["id"])
+    assert not manager.is_valid_inbound_key("sk-new")
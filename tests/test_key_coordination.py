@@ -0,0 +1,85 @@
+import multiprocessing
+
+from src.key_coordination import SLOT_RETRY_SECONDS, SqliteKeyCoordinator
+
+def _acquire_in_process(path, results):
+    coordinator = SqliteKeyCoordinator(path)
+    results.put(coordinator.acquire("key", 600, 100, max_concurrent=2, slot_id=multiprocessing.current_process().name))
+    coordinator.close()
+
+def test_slots_are_shared_between_processes(tmp_path):
+    path = str(tmp_path / "coordination.db")
+    SqliteKeyCoordinator(path).close()  # Create the schema before the workers race
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_acquire_in_process, args=(path, results)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=30)
+    waits = sorted(results.get(timeout=5) for _ in workers)
+    assert waits == [0, 0, SLOT_RETRY_SECONDS, SLOT_RETRY_SECONDS]
+
+def test_released_slots_are_free_for_other_processes(tmp_path):
+    path = str(tmp_path / "coordination.db")
+    first, second = SqliteKeyCoordinator(path), SqliteKeyCoordinator(path)
+    try:
+        assert first.acquire("key", 600, 100, max_concurrent=1, slot_id="a", now=0) == 0
+        assert second.acquire("key", 600, 100, max_concurrent=1, slot_id="b", now=0) == SLOT_RETRY_SECONDS
+        first.release_slot("key", "a")
+        assert second.acquire("key", 600, 100, max_concurrent=1, slot_id="b", now=0) == 0
+    finally:
+        first.close()
+        second.close()
+
+def test_slots_of_dead_workers_expire(tmp_path):
+    path = str(tmp_path / "coordination.db")
+    first, second = SqliteKeyCoordinator(path, slot_ttl=60), SqliteKeyCoordinator(path, slot_ttl=60)
+    try:
+        first.claim_slot("key", "task", now=0)
+        assert second.acquire("key", 600, 100, max_concurrent=1, now=30) == SLOT_RETRY_SECONDS
+        assert second.acquire("key", 600, 100, max_concurrent=1, now=61) == 0
+    finally:
+        first.close()
+        second.close()
+
+def test_rate_tokens_are_shared(tmp_path):
+    path = str(tmp_path / "coordination.db")
+    first, second = SqliteKeyCoordinator(path), SqliteKeyCoordinator(path)
+    try:
+        # 60 per minute with a burst of 2: the third request in the same second waits one second
+        assert first.acquire("key", 60, 2, max_concurrent=10, now=0) == 0
+        assert second.acquire("key", 60, 2, max_concurrent=10, now=0) == 0
+        assert first.acquire("key", 60, 2, max_concurrent=10, now=0) == 1
+        assert second.acquire("key", 60, 2, max_concurrent=10, now=1) == 0
+    finally:
+        first.close()
+        second.close()
+
+def test_disables_apply_to_every_process(tmp_path):
+    path = str(tmp_path / "coordination.db")
+    first, second = SqliteKeyCoordinator(path), SqliteKeyCoordinator(path)
+    try:
+        first.set_disabled("key", 100)
+        assert second.acquire("key", 600, 100, max_concurrent=1, now=40) == 60
+        first.set_disabled("key", None)
+        assert second.acquire("key", 600, 100, max_concurrent=1, now=40) == 0
+        first.forget("key")
+        assert second.acquire("key", 600, 100, max_concurrent=1, now=40) == 0
+    finally:
+        first.close()
+        second.close()
+
+def test_managers_on_one_coordinator_share_key_slots(make_key_manager, tmp_path):
+    path = str(tmp_path / "coordination.db")
+    first = make_key_manager(coordinator=SqliteKeyCoordinator(path))
+    key = first.add_key("sk-a", name="a", rate_limit=600)
+    second = make_key_manager(coordinator=SqliteKeyCoordinator(path))  # Loads the same key file
+    assert second.get_key_by_id(key["id"])
+
+    taken = first.get_key()
+    first.mark_key_as_working(taken, "task-1")
+    assert second.get_key() is None  # The slot is held by the other manager
+
+    first.release_key(taken, "task-1")
+    second._shared_wait_until.clear()  # Skip the recheck delay of a key busy elsewhere
+    assert second.get_key() is not None
@@ -0,0 +1,56 @@
+import pytest
+
+def test_keys_are_found_by_value_and_id(make_key_manager):
+    manager = make_key_manager()
+    key = manager.add_key("sk-a", name="a")
+
+    assert manager._find_key("sk-a") is key
+    assert manager._find_key("Bearer sk-a") is key
+    assert manager.get_key_by_id(key["id"]) is key
+    assert manager._find_key("sk-b") is None
+
+def test_adding_an_existing_value_returns_the_record(make_key_manager):
+    manager = make_key_manager()
+    key = manager.add_key("sk-a", name="a")
+    assert manager.add_key("Bearer sk-a", name="again") is key
+    assert len(manager.keys) == 1
+
+def test_changing_the_value_moves_the_index_entry(make_key_manager):
+    manager = make_key_manager()
+    key = manager.add_key("sk-a", name="a")
+    manager.add_key("sk-b", name="b")
+
+    manager.update_key(key["id"], key_value="sk-c")
+    assert manager._find_key("sk-a") is None
+    assert manager._find_key("sk-c") is key
+
+    with pytest.raises(ValueError):
+        manager.update_key(key["id"], key_value="sk-b")
+    assert manager._find_key("sk-c") is key  # A rejected change leaves the index alone
+
+def test_deleted_keys_leave_the_indexes(make_key_manager):
+    manager = make_key_manager()
+    first = manager.add_key("sk-a", name="a")
+    second = manager.add_key("sk-b", name="b")
+
+    assert manager.delete_key(first["id"])
+    assert manager._find_key("sk-a") is None
+    assert manager.get_key_by_id(first["id"]) is None
+    assert manager.delete_keys([second["id"], "missing"]) == 1
+    assert manager._find_key("sk-b") is None
+    assert manager.get_key() is None
+
+def test_imported_keys_are_indexed(make_key_manager):
+    manager = make_key_manager()
+    manager.add_key("sk-a", name="a")
+
+    result = manager.batch_import_keys([{"key": "sk-a"}, {"key": "sk-b", "name": "b"}, {"name": "no value"}])
+    assert result["skipped"] == 1
+    assert manager._find_key("Bearer sk-b")["name"] == "b"
+
+def test_indexes_survive_a_reload(make_key_manager):
+    key = make_key_manager().add_key("sk-a", name="a")
+
+    reloaded = make_key_manager()
+    assert reloaded._find_key("sk-a")["id"] == key["id"]
+    assert reloaded.get_key_by_id(key["id"])["name"] == "a"
@@ -0,0 +1,69 @@
+import json
+import time
+
+import pytest
+
+from src.key_manager import PERSIST_MODE_WRITE_BEHIND
+
+def stored_names(path):
+    with open(path, encoding="utf-8") as f:
+        return sorted(key["name"] for key in json.load(f)["keys"])
+
+def make_write_behind(make_key_manager):
+    # Long interval and batch so only explicit flushes write
+    return make_key_manager(persist_mode=PERSIST_MODE_WRITE_BEHIND, flush_interval=3600, flush_batch_size=1000)
+
+def test_write_behind_defers_writes_until_flush(make_key_manager, tmp_path):
+    manager = make_write_behind(make_key_manager)
+    manager.add_key("sk-a", name="a")
+    manager.add_key("sk-b", name="b")
+    assert not (tmp_path / "api_keys.json").exists()
+
+    assert manager.flush()
+    assert stored_names(tmp_path / "api_keys.json") == ["a", "b"]
+    assert not manager.flush()  # Nothing pending
+
+def test_batch_size_wakes_the_flusher(make_key_manager, tmp_path):
+    manager = make_key_manager(persist_mode=PERSIST_MODE_WRITE_BEHIND, flush_interval=3600, flush_batch_size=2)
+    manager.add_key("sk-a", name="a")
+    manager.add_key("sk-b", name="b")
+    deadline = time.monotonic() + 5
+    while not (tmp_path / "api_keys.json").exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert stored_names(tmp_path / "api_keys.json") == ["a", "b"]
+
+def test_failed_write_keeps_changes_pending(make_key_manager, tmp_path, monkeypatch):
+    manager = make_write_behind(make_key_manager)
+    manager.add_key("sk-a", name="a")
+
+    def broken_write(document):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(manager._storage, "write_full", broken_write)
+    assert not manager.flush()
+    monkeypatch.undo()
+
+    assert manager.flush()
+    assert stored_names(tmp_path / "api_keys.json") == ["a"]
+
+def test_failed_snapshot_releases_the_flush_lock(make_key_manager, tmp_path, monkeypatch):
+    manager = make_write_behind(make_key_manager)
+    manager.add_key("sk-a", name="a")
+
+    def broken_export():
+        raise RuntimeError("snapshot failed")
+
+    monkeypatch.setattr(manager, "export_state", broken_export)
+    with pytest.raises(RuntimeError):
+        manager.flush()
+    monkeypatch.undo()
+
+    assert not manager._flush_lock.locked()
+    assert manager.flush()  # The changes were not dropped either
+    assert stored_names(tmp_path / "api_keys.json") == ["a"]
+
+def test_close_flushes_pending_changes(make_key_manager, tmp_path):
+    manager = make_write_behind(make_key_manager)
+    manager.add_key("sk-a", name="a")
+    manager.close()
+    assert stored_names(tmp_path / "api_keys.json") == ["a"]
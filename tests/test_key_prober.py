@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from src import key_prober as prober_module
+from src.config import Config
+from src.key_prober import KeyProber
+from src.sora_integration import SoraClient
+
+@pytest.fixture
+def probes(key_manager, monkeypatch):
+    """Fake connection tests: keys whose value contains "good" pass. Records each probe."""
+    monkeypatch.setattr(prober_module, "key_manager", key_manager)
+    monkeypatch.setattr(Config, "IMAGE_LOCALIZATION", False)
+    state = {"calls": [], "running": 0, "peak": 0}
+
+    async def fake_test_connection(self, switch_on_failure=True):
+        state["calls"].append((self.generator.auth_token, switch_on_failure))
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        await asyncio.sleep(0.01)
+        state["running"] -= 1
+        return {"status": "success" if "good" in self.generator.auth_token else "error"}
+
+    monkeypatch.setattr(SoraClient, "test_connection", fake_test_connection)
+    return state
+
+def trip(manager, *values):
+    for value in values:
+        key = manager.add_key(value, name=value)
+        with manager._lock:
+            manager._trip_circuit(key)
+
+def test_passing_keys_are_restored(key_manager, probes):
+    trip(key_manager, "sk-good-1", "sk-bad-1", "sk-good-2")
+    key_manager.add_key("sk-good-healthy", name="healthy")  # Not disabled, so not probed
+
+    restored = asyncio.run(KeyProber(concurrency=3, jitter=0).probe_once())
+    assert restored == 2
+    assert sorted(token for token, _ in probes["calls"]) == ["Bearer sk-bad-1", "Bearer sk-good-1", "Bearer sk-good-2"]
+    assert all(switch is False for _, switch in probes["calls"])  # A probe never moves to another key
+    assert key_manager._find_key("sk-good-1")["available"]
+    assert not key_manager._find_key("sk-bad-1")["available"]
+    assert key_manager.get_probe_candidates() == ["sk-bad-1"]
+
+def test_probes_run_with_bounded_parallelism(key_manager, probes):
+    trip(key_manager, *(f"sk-bad-{i}" for i in range(6)))
+
+    assert asyncio.run(KeyProber(concurrency=2, jitter=0).probe_once()) == 0
+    assert len(probes["calls"]) == 6
+    assert probes["peak"] == 2
+
+def test_admin_disabled_keys_are_not_probed(key_manager, probes):
+    key = key_manager.add_key("sk-good-off", name="off")
+    with key_manager._lock:
+        key_manager._trip_circuit(key)
+    key_manager.update_key(key["id"], is_enabled=False)
+
+    assert asyncio.run(KeyProber(jitter=0).probe_once()) == 0
+    assert probes["calls"] == []
+    assert not key_manager._find_key("sk-good-off")["available"]
@@ -0,0 +1,62 @@
+def add_keys(manager, *values, **kwargs):
+    kwargs.setdefault("rate_limit", 600)
+    return [manager.add_key(value, name=value, **kwargs) for value in values]
+
+def test_get_key_reserves_a_slot(make_key_manager):
+    manager = make_key_manager()
+    add_keys(manager, "sk-a")
+    key = manager.get_key()
+    assert key.endswith("sk-a")
+    assert manager.is_key_working(key)
+    assert manager.get_key() is None  # max_concurrent=1 and the slot is reserved
+
+    manager.release_reservation(key)
+    assert not manager.is_key_working(key)
+    assert manager.get_key() is not None
+
+def test_max_concurrent_limits_in_flight_tasks(make_key_manager):
+    manager = make_key_manager()
+    add_keys(manager, "sk-a", max_concurrent=2)
+    first, second = manager.get_key(), manager.get_key()
+    assert first and second
+    assert manager.get_key() is None
+
+    manager.mark_key_as_working(first, "task-1")
+    manager.mark_key_as_working(second, "task-2")
+    assert manager.get_key() is None  # The tasks took the reserved slots over
+
+    manager.release_key(first, "task-1")
+    assert manager.get_key() is not None
+
+def test_reservation_refund_returns_the_rate_token(make_key_manager):
+    manager = make_key_manager(rate_burst_seconds=10)
+    add_keys(manager, "sk-a", rate_limit=6)  # A burst of one request
+
+    key = manager.get_key()
+    manager.release_reservation(key, refund=True)
+    assert manager.get_key() == key  # The refunded token is spent again
+
+    manager.release_reservation(key)
+    assert manager.get_key() is None  # Without a refund the bucket stays empty
+
+def test_retry_request_gives_back_switched_key_slots(make_key_manager):
+    manager = make_key_manager()
+    add_keys(manager, "sk-b")
+    used = []
+
+    def request(key):
+        used.append(manager._normalize_key(key))
+        return False, "upstream error"
+
+    success, _, _ = manager.retry_request("sk-a", request, max_retries=0)
+    assert not success
+    assert used == ["sk-a", "sk-b"]
+    assert not manager.is_key_working("sk-b")
+
+def test_retry_request_does_not_leak_tried_keys(make_key_manager):
+    manager = make_key_manager()
+    add_keys(manager, "sk-a")
+
+    success, _, _ = manager.retry_request("sk-a", lambda key: (False, "upstream error"), max_retries=0)
+    assert not success  # Only the original key exists, so there is nothing to switch to
+    assert not manager.is_key_working("sk-a")
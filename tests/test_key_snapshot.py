@@ -0,0 +1,39 @@
+def test_snapshot_masks_values_and_counts_keys(make_key_manager):
+    manager = make_key_manager()
+    manager.add_key("sk-abcdefghijklmnop", name="a")
+    manager.add_key("sk-disabled-0123456", name="b", is_enabled=False)
+
+    snap = manager.snapshot()
+    assert [key["key"] for key in snap.keys] == ["sk-abc...mnop", "sk-dis...3456"]
+    assert (snap.total_keys, snap.active_keys, snap.available_keys) == (2, 1, 1)
+    assert manager._find_key("sk-abcdefghijklmnop")["key"] == "sk-abcdefghijklmnop"  # Records stay unmasked
+
+def test_snapshot_is_reused_until_records_change(make_key_manager):
+    manager = make_key_manager()
+    key = manager.add_key("sk-a", name="a")
+
+    snap = manager.snapshot()
+    assert manager.snapshot() is snap
+    assert manager.get_all_keys() is snap.keys
+
+    manager.update_key(key["id"], name="renamed")
+    fresh = manager.snapshot()
+    assert fresh is not snap
+    assert fresh.keys[0]["name"] == "renamed"
+    assert snap.keys[0]["name"] == "a"  # Published snapshots never change
+
+def test_runtime_fields_refresh_after_max_age(make_key_manager):
+    manager = make_key_manager(snapshot_max_age=0)
+    manager.add_key("sk-a", name="a", rate_limit=600)
+    assert manager.snapshot().keys[0]["active_tasks"] == 0
+
+    manager.mark_key_as_working(manager.get_key(), "task-1")
+    assert manager.snapshot().keys[0]["active_tasks"] == 1
+
+def test_runtime_fields_may_lag_within_max_age(make_key_manager):
+    manager = make_key_manager(snapshot_max_age=60)
+    manager.add_key("sk-a", name="a", rate_limit=600)
+    snap = manager.snapshot()
+
+    manager.mark_key_as_working(manager.get_key(), "task-1")
+    assert manager.snapshot() is snap
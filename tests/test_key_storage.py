@@ -0,0 +1,76 @@
+import pytest
+
+from src.key_manager import KeyManager
+from src.key_storage import JsonKeyStorage, KeyStorage, SqliteKeyStorage
+
+def row(key_id, name, total=0):
+    return {
+        "id": key_id,
+        "key": {"id": key_id, "name": name, "key": f"sk-{key_id}"},
+        "usage_stats": {"total_requests": total, "successful_requests": total,
+                        "failed_requests": 0, "average_response_time": 0.5},
+        "usage_series": None
+    }
+
+def names(data):
+    return [key["name"] for key in data["keys"]]
+
+def test_storage_backends_must_implement_writes():
+    class ReadOnly(KeyStorage):
+        def load(self):
+            return None
+
+    with pytest.raises(TypeError):
+        ReadOnly()
+
+def test_json_write_changes_merges_into_the_file(tmp_path):
+    storage = JsonKeyStorage(str(tmp_path / "keys.json"))
+    storage.write_changes([row("a", "first"), row("b", "second")], [])
+    storage.write_changes([row("a", "renamed", total=3)], ["b"])
+
+    data = storage.load()
+    assert names(data) == ["renamed"]
+    assert data["usage_stats"]["a"]["total_requests"] == 3
+
+def test_sqlite_round_trips_the_full_document(tmp_path):
+    storage = SqliteKeyStorage(str(tmp_path / "keys.db"))
+    assert storage.load() is None
+
+    storage.write_full({"keys": [row("a", "first")["key"], row("b", "second")["key"]],
+                        "usage_stats": {"a": row("a", "first", total=2)["usage_stats"]}})
+    storage.write_full({"keys": [row("b", "second")["key"]]})  # Drops key a
+    data = storage.load()
+    assert names(data) == ["second"]
+    storage.close()
+
+def test_sqlite_changes_are_versioned(tmp_path):
+    storage = SqliteKeyStorage(str(tmp_path / "keys.db"))
+    first = storage.write_changes([row("a", "first"), row("b", "second")], [])
+    second = storage.write_changes([row("a", "renamed", total=4)], ["b"])
+    assert second > first == 1
+    assert storage.current_version() == second
+
+    rows, deleted, version = storage.load_changes(first)
+    assert [r["key"]["name"] for r in rows] == ["renamed"]
+    assert rows[0]["usage_stats"]["total_requests"] == 4
+    assert deleted == ["b"]
+    assert version == second
+    assert storage.load_changes(second) == ([], [], second)
+    assert storage.write_changes([], []) == second  # Empty flushes do not bump the version
+    storage.close()
+
+def test_managers_share_changes_through_sqlite(tmp_path):
+    path = str(tmp_path / "keys.db")
+    writer = KeyManager(storage_file=str(tmp_path / "a.json"), storage=SqliteKeyStorage(path))
+    reader = KeyManager(storage_file=str(tmp_path / "b.json"), storage=SqliteKeyStorage(path))
+    try:
+        key = writer.add_key("sk-shared", name="shared")
+        assert reader.refresh_from_storage() == 1
+        assert reader.get_key_by_id(key["id"])["name"] == "shared"
+
+        writer.delete_key(key["id"])
+        assert reader.refresh_from_storage() == 1
+        assert reader.get_key_by_id(key["id"]) is None
+    finally:
+        writer.close()
+        reader.close()
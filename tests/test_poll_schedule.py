@@ -0,0 +1,56 @@
+import pytest
+
+from src.poll_schedule import PollSchedule
+
+KEY = PollSchedule.operation_key("simple_compose", 1)
+
+def learned(durations, **kwargs):
+    options = dict(base_interval=5, min_gap=1, max_gap=10, min_samples=10)
+    options.update(kwargs)
+    schedule = PollSchedule(**options)
+    for duration in durations:
+        schedule.record(KEY, duration)
+    return schedule
+
+def test_base_interval_until_enough_samples():
+    schedule = learned(range(20, 29))  # 9 samples
+    assert schedule.next_delay(KEY, 0) == 5
+    schedule.record(KEY, 30)
+    assert schedule.next_delay(KEY, 0) != 5
+
+def test_first_check_waits_for_the_fastest_tasks():
+    schedule = learned(range(20, 41))  # p10 is 22 seconds
+    assert schedule.next_delay(KEY, 0) == pytest.approx(22)
+    assert schedule.next_delay(KEY, 21) == pytest.approx(1)
+
+def test_checkpoints_follow_the_percentiles_at_least_min_gap_apart():
+    schedule = learned(range(20, 41))  # Percentile q lies at 20 + q / 5 seconds
+    checkpoints = schedule._times[KEY].checkpoints(schedule.min_gap)
+    # p52 (30.4) is within min_gap of p48 (29.6) and is skipped
+    assert checkpoints[:7] == pytest.approx([22, 25, 27, 28.4, 29.6, 31.6, 33])
+    assert all(b - a >= 1 - 1e-9 for a, b in zip(checkpoints, checkpoints[1:]))
+
+def test_delays_stay_within_the_gap_bounds():
+    schedule = learned([10] * 5 + [100] * 5, max_gap=10)
+    for elapsed in range(10, 100, 7):
+        assert 1 <= schedule.next_delay(KEY, elapsed) <= 10
+
+def test_past_the_last_checkpoint_falls_back_to_the_base_interval():
+    schedule = learned(range(20, 41))
+    assert schedule.next_delay(KEY, 45) == 5
+
+def test_operations_are_learned_separately():
+    schedule = learned(range(20, 41))
+    other = PollSchedule.operation_key("simple_compose", 4)
+    assert schedule.next_delay(other, 0) == 5
+    assert schedule.to_dict()["operations"][KEY]["learned"]
+    assert other not in schedule.to_dict()["operations"]
+
+def test_history_is_bounded_and_bad_samples_ignored():
+    schedule = learned(range(1, 301), history=50)
+    schedule.record(KEY, 0)
+    schedule.record(KEY, -3)
+    schedule.record("", 10)
+    durations = schedule._times[KEY].durations
+    assert len(durations) == 50 and min(durations) == 251
+    assert list(schedule.to_dict()["operations"]) == [KEY]
@@ -0,0 +1,43 @@
+import math
+
+from src.rate_limiter import TokenBucket
+
+def test_starts_full_and_rejects_when_empty():
+    bucket = TokenBucket(60, capacity=3, now=0)
+    assert [bucket.try_acquire(now=0) for _ in range(4)] == [True, True, True, False]
+
+def test_refills_continuously():
+    bucket = TokenBucket(60, capacity=2, now=0)  # One token per second
+    bucket.try_acquire(now=0)
+    bucket.try_acquire(now=0)
+    assert bucket.available(now=0.5) == 0.5
+    assert not bucket.try_acquire(now=0.5)
+    assert bucket.try_acquire(now=1.0)
+    assert bucket.available(now=100) == 2  # Never above capacity
+
+def test_time_until_available():
+    bucket = TokenBucket(30, capacity=1, now=0)  # One token every two seconds
+    assert bucket.time_until_available(now=0) == 0
+    bucket.try_acquire(now=0)
+    assert bucket.time_until_available(now=0) == 2
+    assert bucket.time_until_available(now=1.5) == 0.5
+
+def test_zero_rate_never_refills():
+    bucket = TokenBucket(0, now=0)
+    assert bucket.try_acquire(now=0)
+    assert math.isinf(bucket.time_until_available(now=1000))
+
+def test_reconfigure_keeps_tokens_within_new_capacity():
+    bucket = TokenBucket(60, capacity=10, now=0)
+    bucket.reconfigure(60, capacity=4, now=0)
+    assert bucket.available(now=0) == 4
+    bucket.reconfigure(120, capacity=8, now=0)
+    assert bucket.available(now=0) == 4
+    assert bucket.available(now=1) == 6
+
+def test_refund_is_capped_at_capacity():
+    bucket = TokenBucket(60, capacity=2, now=0)
+    bucket.try_acquire(now=0)
+    bucket.refund()
+    bucket.refund()
+    assert bucket.available(now=0) == 2
@@ -0,0 +1,142 @@
+import asyncio
+
+from src.retry_policy import RetryBudget, RetryPolicy
+from tests.fakes import FakeResponse, FakeTransport, PNG_BYTES
+
+def test_budget_floor_and_ratio():
+    budget = RetryBudget(ratio=0.5, min_retries=2, window=60)
+    assert budget.try_withdraw(now=0)
+    assert budget.try_withdraw(now=0)
+    assert not budget.try_withdraw(now=0)
+    for _ in range(4):
+        budget.record_request(now=1)
+    # 2 + 0.5 * 4 retries are allowed in the window
+    assert budget.try_withdraw(now=1)
+    assert budget.try_withdraw(now=1)
+    assert not budget.try_withdraw(now=1)
+
+def test_budget_window_expires():
+    budget = RetryBudget(ratio=0, min_retries=1, window=10)
+    assert budget.try_withdraw(now=0)
+    assert not budget.try_withdraw(now=5)
+    assert budget.try_withdraw(now=11)
+
+def test_attempts_are_bounded_per_request():
+    policy = RetryPolicy(max_attempts=3, base_delay=0, max_delay=0)
+    retry = policy.start()
+    assert retry.allow()
+    assert retry.allow()
+    assert not retry.allow()
+    assert retry.exhausted_reason == "gave up after 3 attempts"
+
+def test_retries_draw_from_shared_budget():
+    policy = RetryPolicy(max_attempts=5, budget=RetryBudget(ratio=0, min_retries=1, window=60))
+    first, second = policy.start(), policy.start()
+    assert first.allow()
+    assert not second.allow()
+    assert second.exhausted_reason == "retry budget exhausted"
+    assert policy.budget.to_dict() == {"requests": 2, "retries": 1, "allowed": 1}
+
+def test_backoff_is_capped():
+    policy = RetryPolicy(max_attempts=10, base_delay=1, max_delay=4)
+    retry = policy.start()
+    for cap in (1, 2, 4, 4):
+        retry.allow()
+        assert 0 <= retry.backoff() <= cap
+
+def test_one_client_request_counts_once_across_stages(key_manager, make_generator, monkeypatch):
+    from src import sora_generator
+
+    budget = RetryBudget(ratio=0, min_retries=100, window=60)
+    monkeypatch.setattr(sora_generator, "retry_policy", RetryPolicy(max_attempts=3, base_delay=0, max_delay=0, budget=budget))
+    key_manager.add_key("sk-a", name="a", max_concurrent=5)
+    key_manager.add_key("sk-b", name="b", max_concurrent=5)
+    transport = FakeTransport(post=[
+        FakeResponse(401, text="unauthorized"),  # Upload rejected: retry 1 on the other key
+        FakeResponse(200, {"id": "media_1"}),
+        FakeResponse(500, text="boom"),  # Submit fails: retry 2
+        FakeResponse(500, text="boom"),  # Submit fails: no retries left for the request
+    ])
+    generator = make_generator(transport, key_manager.get_key())
+
+    async def run():
+        media = await generator.upload_image(PNG_BYTES)
+        return media, await generator.generate_image_remix("prompt", media)
+
+    media, result = asyncio.run(run())
+    assert media["id"] == "media_1"
+    assert result == "Remix task submission failed (gave up after 3 attempts)"
+    assert len(transport.requests) == 4
+    assert budget.to_dict()["requests"] == 1
+
+def test_successful_status_checks_do_not_reset_the_request_bound(key_manager, make_generator, monkeypatch):
+    from src import sora_generator
+
+    monkeypatch.setattr(sora_generator, "retry_policy", RetryPolicy(max_attempts=3, base_delay=0, max_delay=0))
+    key_manager.add_key("sk-a", name="a")
+    pending = FakeResponse(200, {"task_responses": [{"id": "task_1", "status": "pending"}]})
+    transport = FakeTransport(
+        post=[FakeResponse(200, {"id": "task_1"})],
+        get=[FakeResponse(502, text="bad gateway"), pending, FakeResponse(502, text="bad gateway"), FakeResponse(502, text="bad gateway")]
+    )
+    generator = make_generator(transport, key_manager.get_key())
+
+    result = asyncio.run(generator.generate_image("prompt"))
+    assert "status checks failed" in result
+    assert [method for method, _, _ in transport.requests] == ["POST", "GET", "GET", "GET", "GET"]
+
+def breaker_outcomes(manager, key_value):
+    breaker = manager._breakers.get(manager._find_key(key_value)["id"])
+    return [success for _, success in breaker.outcomes] if breaker else []
+
+def task_list(status, **fields):
+    return FakeResponse(200, {"task_responses": [dict(id="task_1", status=status, **fields)]})
+
+def test_content_refusal_is_final_and_not_held_against_the_key(key_manager, make_generator, monkeypatch):
+    from src import sora_generator
+
+    monkeypatch.setattr(sora_generator, "retry_policy", RetryPolicy(max_attempts=3, base_delay=0, max_delay=0))
+    key_manager.add_key("sk-a", name="a")
+    key_manager.add_key("sk-b", name="b")
+    transport = FakeTransport(
+        post=[FakeResponse(200, {"id": "task_1"})],
+        get=[task_list("failed", failure_reason="content_policy_violation")]
+    )
+    generator = make_generator(transport, key_manager.get_key())
+
+    assert asyncio.run(generator.generate_image("prompt")) == "Task failed: content_policy_violation"
+    assert len(transport.requests) == 2
+    assert breaker_outcomes(key_manager, "sk-a") == [] and breaker_outcomes(key_manager, "sk-b") == []
+
+def test_upstream_task_failure_runs_again_and_counts_against_the_key(key_manager, make_generator, monkeypatch):
+    from src import sora_generator
+
+    monkeypatch.setattr(sora_generator, "retry_policy", RetryPolicy(max_attempts=3, base_delay=0, max_delay=0))
+    key_manager.add_key("sk-a", name="a", max_concurrent=5)
+    transport = FakeTransport(
+        post=[FakeResponse(200, {"id": "task_1"}), FakeResponse(200, {"id": "task_1"})],
+        get=[task_list("failed", failure_reason="internal error"),
+             task_list("succeeded", generations=[{"url": "https://img/1.png"}])]
+    )
+    generator = make_generator(transport, key_manager.get_key())
+
+    assert asyncio.run(generator.generate_image("prompt")) == ["https://img/1.png"]
+    assert [method for method, _, _ in transport.requests] == ["POST", "GET", "POST", "GET"]
+    assert breaker_outcomes(key_manager, "sk-a") == [False, True]
+
+def test_failed_status_checks_do_not_resubmit(key_manager, make_generator, monkeypatch):
+    from src import sora_generator
+
+    monkeypatch.setattr(sora_generator, "retry_policy", RetryPolicy(max_attempts=2, base_delay=0, max_delay=0))
+    key_manager.add_key("sk-a", name="a")
+    key_manager.add_key("sk-b", name="b")
+    transport = FakeTransport(
+        post=[FakeResponse(200, {"id": "task_1"})],
+        get=[FakeResponse(502, text="bad gateway"), FakeResponse(502, text="bad gateway")]
+    )
+    generator = make_generator(transport, "Bearer sk-a")
+
+    result = asyncio.run(generator.generate_image("prompt"))
+    assert "status checks failed" in result
+    assert [method for method, _, _ in transport.requests] == ["POST", "GET", "GET"]
+    assert breaker_outcomes(key_manager, "sk-a") == [False]
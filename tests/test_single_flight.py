@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from src.services.single_flight import SingleFlight
+
+def test_concurrent_calls_share_one_run():
+    async def run():
+        flight = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "done"
+
+        results = await asyncio.gather(*(flight.do("k", work) for _ in range(3)))
+        assert results == [("done", False), ("done", True), ("done", True)]
+        assert len(calls) == 1
+        assert flight.stats() == {"in_flight": 0, "started": 1, "coalesced": 2}
+
+    asyncio.run(run())
+
+def test_leader_failure_reaches_joiners():
+    async def run():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream failed")
+
+        results = await asyncio.gather(*(flight.do("k", fail) for _ in range(3)), return_exceptions=True)
+        assert len(results) == 3
+        assert all(isinstance(r, RuntimeError) and str(r) == "upstream failed" for r in results)
+        assert not flight.in_flight("k")
+
+        # The failed run is not reused by the next caller
+        async def succeed():
+            return "ok"
+        assert await flight.do("k", succeed) == ("ok", False)
+
+    asyncio.run(run())
+
+def test_cancelled_caller_does_not_cancel_the_run():
+    async def run():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "done"
+
+        leader = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0)
+        assert flight.in_flight("k")
+        joiner = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        release.set()
+        assert await joiner == ("done", True)
+
+    asyncio.run(run())
+
+def test_different_keys_run_separately():
+    async def run():
+        flight = SingleFlight()
+
+        async def work():
+            return "done"
+
+        results = await asyncio.gather(flight.do("a", work), flight.do("b", work))
+        assert results == [("done", False), ("done", False)]
+
+    asyncio.run(run())
@@ -0,0 +1,125 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from requests.cookies import RequestsCookieJar
+
+from src.sora_transport import SoraTransport, is_cloudflare_challenge
+
+class FakeScraper:
+    """Stands in for the cloudscraper session: its fallback request solves the challenge."""
+
+    def __init__(self):
+        self.cookies = RequestsCookieJar()
+        self.headers = {"User-Agent": "test-agent"}
+        self.fallback_cookies = []
+
+    def request(self, method, url, headers=None, json=None, files=None, cookies=None, proxies=None, timeout=None):
+        self.fallback_cookies.append(dict(cookies or {}))
+        self.cookies.set("cf_clearance", "solved", domain="localhost", path="/")
+        self.cookies.set("account", f"set-for-{headers['Authorization']}", domain="localhost", path="/")
+        return "scraper response"
+
+def auth(name):
+    return {"Authorization": f"Bearer {name}"}
+
+async def serve():
+    async def set_cookie(request):
+        response = web.Response(text="ok")
+        response.set_cookie(request.query["name"], request.query["value"])
+        return response
+
+    async def echo(request):
+        return web.json_response(dict(request.cookies))
+
+    async def challenge(request):
+        return web.Response(status=403, text="Just a moment...", headers={"cf-mitigated": "challenge"})
+
+    app = web.Application()
+    app.router.add_get("/set", set_cookie)
+    app.router.add_get("/echo", echo)
+    app.router.add_get("/challenge", challenge)
+    server = TestServer(app, host="localhost")
+    await server.start_server()
+    return server, f"http://localhost:{server.port}"
+
+def test_account_cookies_stay_with_their_key():
+    async def run():
+        server, base = await serve()
+        transport = SoraTransport(FakeScraper())
+        try:
+            await transport.get(f"{base}/set?name=account&value=a", headers=auth("a"))
+            own = (await transport.get(f"{base}/echo", headers=auth("a"))).json()
+            other = (await transport.get(f"{base}/echo", headers=auth("b"))).json()
+            return own, other
+        finally:
+            await transport.close()
+            await server.close()
+
+    own, other = asyncio.run(run())
+    assert own == {"account": "a"}
+    assert other == {}
+
+def test_cloudflare_cookies_reach_every_key():
+    async def run():
+        server, base = await serve()
+        scraper = FakeScraper()
+        transport = SoraTransport(scraper)
+        try:
+            await transport.get(f"{base}/echo", headers=auth("b"))  # b's jar exists before the rotation
+            await transport.get(f"{base}/set?name=__cf_bm&value=rotated", headers=auth("a"))
+            other = (await transport.get(f"{base}/echo", headers=auth("b"))).json()
+            return scraper, other
+        finally:
+            await transport.close()
+            await server.close()
+
+    scraper, other = asyncio.run(run())
+    assert scraper.cookies.get("__cf_bm") == "rotated"
+    assert other == {"__cf_bm": "rotated"}
+
+def test_challenge_falls_back_to_the_scraper_without_sharing_account_cookies():
+    async def run():
+        server, base = await serve()
+        scraper = FakeScraper()
+        transport = SoraTransport(scraper)
+        try:
+            await transport.get(f"{base}/set?name=account&value=a", headers=auth("a"))
+            result = await transport.get(f"{base}/challenge", headers=auth("a"))
+            own = (await transport.get(f"{base}/echo", headers=auth("a"))).json()
+            other = (await transport.get(f"{base}/echo", headers=auth("b"))).json()
+            return scraper, result, own, other
+        finally:
+            await transport.close()
+            await server.close()
+
+    scraper, result, own, other = asyncio.run(run())
+    assert result == "scraper response"
+    assert scraper.fallback_cookies == [{"account": "a"}]  # The key's own cookies went along
+    assert [cookie.name for cookie in scraper.cookies] == ["cf_clearance"]
+    assert own == {"account": "set-for-Bearer a", "cf_clearance": "solved"}
+    assert other == {"cf_clearance": "solved"}
+
+def test_a_new_event_loop_closes_the_old_connections():
+    transport = SoraTransport(FakeScraper())
+
+    async def run():
+        server, base = await serve()
+        try:
+            await transport.get(f"{base}/echo", headers=auth("a"))
+            return transport._connector, next(iter(transport._sessions.values()))
+        finally:
+            await server.close()
+
+    first_connector, first_session = asyncio.run(run())
+    second_connector, _ = asyncio.run(run())
+    assert first_connector is not second_connector
+    assert first_connector.closed and first_session.closed
+    asyncio.run(transport.close())
+    assert second_connector.closed
+
+def test_challenge_detection():
+    assert is_cloudflare_challenge(403, {"cf-mitigated": "challenge"}, "")
+    assert is_cloudflare_challenge(503, {"server": "cloudflare"}, "<title>Just a moment...</title>")
+    assert not is_cloudflare_challenge(403, {"server": "cloudflare"}, '{"error": "forbidden"}')
+    assert not is_cloudflare_challenge(200, {"cf-mitigated": "challenge"}, "")
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from tests.fakes import FakeResponse, FakeTransport
+from src.task_poller import KeyTaskPoller, get_task_poller
+
+def page(*task_ids, has_more=True):
+    return FakeResponse(200, {"task_responses": [{"id": task_id, "status": "running"} for task_id in task_ids],
+                              "has_more": has_more, "last_id": task_ids[-1] if task_ids else None})
+
+@pytest.fixture
+def poller_for(make_generator):
+    def make(responses, page_size=2, max_pages=3):
+        transport = FakeTransport(get=responses)
+        poller = KeyTaskPoller("Bearer sk-a", interval=0, page_size=page_size, max_pages=max_pages)
+        poller.generator = make_generator(transport, "Bearer sk-a")
+        return poller, transport
+    return make
+
+def test_waiting_tasks_share_one_list_request(poller_for):
+    poller, transport = poller_for([page("t1", "t2")])
+
+    async def run():
+        return await asyncio.gather(poller.poll("t1"), poller.poll("t2"))
+
+    first, second = asyncio.run(run())
+    assert first.task["id"] == "t1" and second.task["id"] == "t2"
+    assert len(transport.requests) == 1
+
+def test_older_pages_are_fetched_until_the_task_is_found(poller_for):
+    poller, transport = poller_for([page("t5", "t4"), page("t3", "t2")])
+
+    result = asyncio.run(poller.poll("t2"))
+    assert result.task["id"] == "t2"
+    urls = [url for _, url, _ in transport.requests]
+    assert urls[0].endswith("?limit=2")
+    assert urls[1].endswith("?limit=2&before=t4")
+
+def test_paging_stops_at_max_pages(poller_for):
+    poller, transport = poller_for([page("t9", "t8"), page("t7", "t6")], max_pages=2)
+
+    result = asyncio.run(poller.poll("t1"))
+    assert result.status_code == 200 and result.task is None
+    assert len(transport.requests) == 2
+
+def test_paging_stops_at_the_last_page(poller_for):
+    poller, transport = poller_for([page("t9", "t8", has_more=False)])
+
+    assert asyncio.run(poller.poll("t1")).task is None
+    assert len(transport.requests) == 1
+
+def test_failed_list_request_reaches_every_waiter(poller_for):
+    poller, _ = poller_for([FakeResponse(429, text="slow down")])
+
+    async def run():
+        return await asyncio.gather(poller.poll("t1"), poller.poll("t2"))
+
+    results = asyncio.run(run())
+    assert [(r.status_code, r.text) for r in results] == [(429, "slow down"), (429, "slow down")]
+
+def test_list_requests_use_the_poller_key(poller_for):
+    poller, transport = poller_for([page("t1")])
+    poller.generator.auth_token = "Bearer sk-switched"  # The generator moved on to another key
+
+    asyncio.run(poller.poll("t1"))
+    assert transport.requests[0][2] == "Bearer sk-a"
+
+def test_one_poller_per_key(make_generator):
+    generator = make_generator(FakeTransport(), "Bearer sk-a")
+    poller = get_task_poller("Bearer sk-a", generator)
+    assert get_task_poller("sk-a", generator) is poller
+    assert get_task_poller("Bearer sk-b", generator) is not poller
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from tests.fakes import PNG_BYTES
+from src import sora_integration
+from src.cache import TTLCache
+from src.config import Config
+from src.sora_integration import SoraClient
+
+@pytest.fixture
+def uploads(monkeypatch):
+    """Fresh upload cache and a fake upstream; returns the list of uploads that reached it."""
+    monkeypatch.setattr(Config, "IMAGE_LOCALIZATION", False)
+    monkeypatch.setattr(Config, "UPLOAD_CACHE_ENABLED", True)
+    monkeypatch.setattr(sora_integration, "upload_cache", TTLCache(max_entries=10, ttl=60))
+    calls = []
+    return calls
+
+def make_client(uploads, monkeypatch, auth_token="Bearer sk-a", switch_to=None, remix_result="failed"):
+    client = SoraClient(auth_token=auth_token)
+    generator = client.generator
+
+    async def upload_image(image, file_name=None, mime_type=None):
+        if switch_to:
+            generator.auth_token = switch_to
+        uploads.append(generator.auth_token)
+        return {"id": f"media_{len(uploads)}", "used_auth_token": generator.auth_token}
+
+    async def generate_image_remix(prompt, media_id, num_images=1):
+        return remix_result
+
+    monkeypatch.setattr(generator, "upload_image", upload_image)
+    monkeypatch.setattr(generator, "generate_image_remix", generate_image_remix)
+    return client
+
+def test_same_image_on_the_same_key_is_uploaded_once(uploads, monkeypatch):
+    first = asyncio.run(make_client(uploads, monkeypatch).upload_image(PNG_BYTES))
+    second = asyncio.run(make_client(uploads, monkeypatch).upload_image(memoryview(PNG_BYTES)))
+    assert uploads == ["Bearer sk-a"]
+    assert second == first and second is not first
+
+def test_media_is_not_shared_between_keys(uploads, monkeypatch):
+    asyncio.run(make_client(uploads, monkeypatch).upload_image(PNG_BYTES))
+    asyncio.run(make_client(uploads, monkeypatch, auth_token="Bearer sk-b").upload_image(PNG_BYTES))
+    assert uploads == ["Bearer sk-a", "Bearer sk-b"]
+
+def test_upload_is_cached_under_the_key_that_holds_the_media(uploads, monkeypatch):
+    asyncio.run(make_client(uploads, monkeypatch, switch_to="Bearer sk-b").upload_image(PNG_BYTES))
+    result = asyncio.run(make_client(uploads, monkeypatch, auth_token="Bearer sk-b").upload_image(PNG_BYTES))
+    assert uploads == ["Bearer sk-b"]
+    assert result["used_auth_token"] == "Bearer sk-b"
+
+def test_failed_remix_forgets_the_media(uploads, monkeypatch):
+    client = make_client(uploads, monkeypatch)
+    media = asyncio.run(client.upload_image(PNG_BYTES))
+    with pytest.raises(Exception):
+        asyncio.run(client.generate_image_remix("prompt", media))
+
+    asyncio.run(make_client(uploads, monkeypatch).upload_image(PNG_BYTES))
+    assert len(uploads) == 2
+
+def test_cache_can_be_disabled(uploads, monkeypatch):
+    monkeypatch.setattr(Config, "UPLOAD_CACHE_ENABLED", False)
+    for _ in range(2):
+        asyncio.run(make_client(uploads, monkeypatch).upload_image(PNG_BYTES))
+    assert len(uploads) == 2
@@ -0,0 +1,82 @@
+import datetime
+
+from src.usage_stats import RingSeries, UsageSeries, LATENCY_BUCKETS, DAY_SLOTS, percentile_from_histogram
+
+DAY = 86400
+# Noon keeps day arithmetic on the same local calendar day across DST changes
+NOON = datetime.datetime(2026, 3, 1, 12, 0).timestamp()
+
+def date_of(timestamp):
+    return datetime.date.fromtimestamp(timestamp).strftime("%Y-%m-%d")
+
+def test_ring_slot_reuse_evicts_old_period():
+    ring = RingSeries(3, 2)
+    evicted = []
+    offset = ring.slot(1)
+    ring.data[offset] = 5
+    assert ring.slot(1) == offset  # Same period keeps its counters
+    assert ring.data[offset] == 5
+    assert ring.slot(4, on_evict=lambda o: evicted.append(ring.data[o])) == offset
+    assert evicted == [5]
+    assert ring.data[offset] == 0
+    assert ring.row(1) is None
+    assert list(ring.row(4)) == [0, 0]
+
+def test_ring_expire_and_recent():
+    ring = RingSeries(4, 1)
+    for period in (1, 2, 4):
+        ring.data[ring.slot(period)] = period
+    assert [(p, list(row)) for p, row in ring.recent(4, 4)] == [(1, [1]), (2, [2]), (4, [4])]
+    ring.expire(5)  # Window is now periods 2..5
+    assert ring.row(1) is None
+    assert [p for p, _ in ring.recent(5, 4)] == [2, 4]
+
+def test_daily_counts_roll_over_at_day_boundary():
+    series = UsageSeries()
+    series.record(True, 1.0, now=NOON)
+    series.record(False, 1.0, now=NOON)
+    series.record(True, 1.0, now=NOON + DAY)
+    assert series.daily_counts(7, now=NOON + DAY) == {
+        date_of(NOON): {"successful": 1, "failed": 1},
+        date_of(NOON + DAY): {"successful": 1, "failed": 0},
+    }
+
+def test_minute_counts():
+    series = UsageSeries()
+    series.record(True, now=NOON)
+    series.record(False, now=NOON + 60)
+    minute = int(NOON // 60)
+    assert series.minute_counts(5, now=NOON + 60) == [(minute, 1, 0), (minute + 1, 0, 1)]
+    assert series.minute_counts(5, now=NOON + DAY) == []
+
+def test_evicted_days_leave_latency_histogram():
+    series = UsageSeries()
+    series.record(True, 0.01, now=NOON)
+    series.record(True, 3.0, now=NOON + DAY)
+    assert sum(series.latency_histogram(now=NOON + DAY)) == 2
+    # Writing a day that reuses the first day's slot retires its latencies
+    series.record(True, 3.0, now=NOON + DAY_SLOTS * DAY)
+    histogram = series.latency_histogram(now=NOON + DAY_SLOTS * DAY)
+    assert histogram[0] == 0
+    assert sum(histogram) == 2
+    # Without writes, days that fall out of the window are retired on read
+    assert sum(series.latency_histogram(now=NOON + 3 * DAY_SLOTS * DAY)) == 0
+    assert date_of(NOON) not in series.daily_counts(DAY_SLOTS, now=NOON + DAY_SLOTS * DAY)
+
+def test_round_trip_and_legacy_migration():
+    series = UsageSeries()
+    series.record(True, 0.3, now=NOON)
+    series.record(False, 7.0, now=NOON + DAY)
+    restored = UsageSeries.from_dict(series.to_dict())
+    assert restored.daily_counts(7, now=NOON + DAY) == series.daily_counts(7, now=NOON + DAY)
+    assert list(restored.latency_histogram(now=NOON + DAY)) == list(series.latency_histogram(now=NOON + DAY))
+
+    legacy = UsageSeries.from_daily_usage({date_of(NOON): {"successful": 3, "failed": 1}, "bad-date": {}})
+    assert legacy.daily_counts(1, now=NOON) == {date_of(NOON): {"successful": 3, "failed": 1}}
+
+def test_percentile_from_histogram():
+    histogram = [0] * len(LATENCY_BUCKETS)
+    assert percentile_from_histogram(histogram, 50) is None
+    histogram[LATENCY_BUCKETS.index(1)] = 10  # All requests took 0.5-1s
+    assert percentile_from_histogram(histogram, 50) == 0.75
+    assert percentile_from_histogram(histogram, 100) == 1